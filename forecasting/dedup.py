@@ -1,7 +1,7 @@
 import hashlib
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 def file_checksum_sha256(path: str) -> str:
     p = Path(path)
@@ -37,3 +37,51 @@ def build_dedup_key(data_checksum: str, model_type: str, normalized_params: Dict
     normalized_params_str = json.dumps(normalized_params, sort_keys=True, separators=(",", ":"))
     raw = f"{data_checksum}|{model_type}|{normalized_params_str}|{horizon}"
     return "dd_" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# backtest stage keys: each stage is keyed by its own normalized inputs plus
+# the key of the stage it consumes, so equal keys mean equal outputs.
+
+def _stage_hash(prefix: str, parts: Dict[str, Any]) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return prefix + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def forecast_stage_key(data_checksum: Optional[str], model_type: str, params: Dict[str, Any], horizon: int, as_of: str) -> Optional[str]:
+    """
+    as_of is the forecast date: the MA baseline dates its predictions from
+    the day it runs, so a forecast is only reusable on the same day.
+    """
+    if not data_checksum:
+        return None
+    params = params or {}
+    if model_type == "MA":
+        params = {"window": int(params.get("window", 20))}
+    return build_dedup_key(data_checksum, model_type, {**params, "asOf": as_of}, int(horizon))
+
+def signal_stage_key(forecast_key: Optional[str], strategy_spec: Dict[str, Any]) -> Optional[str]:
+    if not forecast_key:
+        return None
+    spec = dict(strategy_spec or {})
+    for k in ("buyAbovePct", "sellBelowPct"):
+        spec[k] = float(spec.get(k, 0.0))
+    return _stage_hash("sg_", {"forecast": forecast_key, "strategy": spec})
+
+def sim_stage_key(
+    signal_key: Optional[str],
+    account_cfg: Dict[str, Any],
+    execution_model: str,
+    execution_cfg: Dict[str, Any],
+    risk_rules: Dict[str, Any],
+) -> Optional[str]:
+    if not signal_key:
+        return None
+    account_cfg = account_cfg or {}
+    return _stage_hash("sm_", {
+        "signal": signal_key,
+        "initialCash": float(account_cfg.get("initialCash", 100000)),
+        "baseCurrency": account_cfg.get("baseCurrency", "USD"),
+        "executionModel": execution_model,
+        "execution": execution_cfg or {},
+        # unset rules (None) are skipped, as RiskRules.from_json does
+        "riskRules": {k: float(v) for k, v in (risk_rules or {}).items() if v is not None},
+    })
@@ -1,46 +1,44 @@
-import json
 import time
+from datetime import timedelta
 from decimal import Decimal
-from pathlib import Path
 
+import numpy as np
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from forecasting.models import (
+    BacktestMode,
     BacktestRun,
     BacktestStatus,
     ForecastJob,
-    Report,
     SignalRun,
     SimAccount,
     TradeSimRun,
 )
+from forecasting.services.artifacts import load_sim_payload
+from forecasting.services.backtest_service import run_fused_backtest, run_walk_forward_backtest
+from forecasting.services.leases import (
+    CLAIM_BATCH,
+    DEFAULT_LEASE_SECONDS,
+    LeaseHeartbeat,
+    LeaseLost,
+    claimable,
+    new_worker_id,
+    release_lease,
+    save_leased,
+    try_claim,
+)
+from forecasting.services.metrics import compute_metrics, infer_periods_per_year
+from forecasting.services.redrive import stage_of
+from forecasting.services.report import write_backtest_output, write_backtest_report
+from forecasting.services.retry import StageFailed, is_retryable, recorded_exception, retry_policy
+from forecasting.services.scheduler import Queue, claim
+from forecasting.services.simulation import parse_timestamps
+from forecasting.services.stage_reuse import find_reusable, forecast_key_for, signal_key_for, sim_key_for
 from forecasting.tasks import run_signal_job, run_trade_sim
-
-
-def build_backtest_report_markdown(bt: BacktestRun, metrics: dict) -> str:
-    return f"""# Backtest Report
-
-## Run Summary
-- BacktestRunId: {bt.backtest_run_id}
-- DatasetVersionId: {bt.dataset_version.dataset_version_id}
-- StrategyId: {bt.strategy.strategy_id}
-- Forecast Config: {bt.forecast_config_snapshot_json}
-- Account Config: {bt.account_config_json}
-- Execution Config: {bt.execution_config_json}
-
-## Metrics
-- totalReturn: {metrics.get("totalReturn")}
-- maxDrawdown: {metrics.get("maxDrawdown")}
-- finalEquity: {metrics.get("finalEquity")}
-- tradeCount: {metrics.get("tradeCount")}
-
-## Interpretation
-- This is a template-generated report for this lesson.
-- Next step: replace this section with richer analysis/LLM output.
-"""
+from llm.pregeneration import enqueue_pregenerated
 
 
 class Command(BaseCommand):
@@ -57,42 +55,117 @@ class Command(BaseCommand):
         BacktestStatus.METRICS_DONE,
     ]
 
+    POLL_SECONDS = 0.5
+
+    # fair across tenants; max_running caps the runs a tenant has past CREATED
+    QUEUE = Queue(
+        name="backtest",
+        model=BacktestRun,
+        pending=lambda: claimable() & Q(status__in=Command.ACTIVE_STATUSES),
+        running=lambda: Q(status__in=Command.ACTIVE_STATUSES) & ~Q(status=BacktestStatus.CREATED),
+        admit=lambda: Q(status=BacktestStatus.CREATED),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS("Backtest worker started. Polling DB..."))
+        owner = new_worker_id()
+        lease_seconds = options["lease_seconds"]
+        self.stdout.write(self.style.SUCCESS(f"Backtest worker {owner} started. Polling DB..."))
 
         while True:
-            bt = (
-                BacktestRun.objects.filter(status__in=self.ACTIVE_STATUSES)
-                .order_by("created_at")
-                .first()
-            )
-            if not bt:
-                time.sleep(0.5)
-                continue
+            if not self.process_next(owner, lease_seconds):
+                time.sleep(self.POLL_SECONDS)
+
+    def process_next(self, owner: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """
+        Claims one backtest nobody else holds and advances it one step. The
+        claim is a short compare-and-set, the step runs with no lock held and
+        a heartbeat keeps the lease alive, so several orchestrators work on
+        disjoint runs side by side. The run's writes are fenced on the lease
+        (save_leased): if it expired and another worker took the run over,
+        the step is discarded. Which run is claimed is up to the fair
+        scheduler. Returns False when there was nothing to claim.
+        """
+        bt = claim(
+            self.QUEUE,
+            lambda pk: try_claim(BacktestRun, pk, owner, self.ACTIVE_STATUSES, lease_seconds),
+            CLAIM_BATCH,
+        )
+        if not bt:
+            return False
 
-            with transaction.atomic():
-                bt = BacktestRun.objects.select_for_update().get(id=bt.id)
+        status_before = bt.status
+        delay = None
+        try:
+            if bt.next_attempt_at:
+                bt.next_attempt_at = None
+                save_leased(bt, ["next_attempt_at"])
+            with LeaseHeartbeat(BacktestRun, bt.id, owner, lease_seconds):
                 try:
                     self._advance_one_step(bt)
+                except LeaseLost:
+                    raise
                 except Exception as e:
-                    bt.status = BacktestStatus.FAILED
-                    bt.retry_count = bt.retry_count + 1
-                    bt.last_error = f"{type(e).__name__}: {e}"
-                    bt.finished_at = timezone.now()
-                    bt.save(
-                        update_fields=[
-                            "status",
-                            "retry_count",
-                            "last_error",
-                            "finished_at",
-                        ]
-                    )
-                    self.stderr.write(
-                        f"FAILED: {bt.backtest_run_id} -> {bt.last_error}"
-                    )
+                    delay = self._on_step_failed(bt, status_before, e)
+        except LeaseLost as e:
+            # the new holder re-runs the step from the status it finds
+            self.stderr.write(f"{bt.backtest_run_id}: {e}, step discarded")
+        finally:
+            # a run still waiting on another worker is parked for one poll
+            # interval so the rest of the queue gets a turn; a run that is
+            # backing off stays unclaimable until its next attempt
+            if delay is None:
+                delay = self.POLL_SECONDS if bt.status == status_before else 0
+            release_lease(BacktestRun, bt.id, owner, delay)
+        return True
+
+    def _on_step_failed(self, bt: BacktestRun, status_before: str, exc: Exception) -> float:
+        """
+        Schedules a retry of the failed stage under its RetryPolicy, or marks
+        the run FAILED once the policy is exhausted or the error is not
+        transient. Returns the backoff in seconds (0 when FAILED).
+        """
+        stage = stage_of(bt)
+        attempts = dict(bt.stage_attempts_json or {})
+        attempts[stage] = attempts.get(stage, 0) + 1
+        policy = retry_policy(stage)
+
+        bt.stage_attempts_json = attempts
+        bt.last_error = f"{type(exc).__name__}: {exc}"
+        fields = ["forecast_job_id", "signal_run_id", "trade_sim_run_id", "stage_attempts_json", "last_error"]
+
+        if is_retryable(exc) and attempts[stage] < policy.max_attempts:
+            delay = policy.delay(attempts[stage])
+            # resume from the last completed status; outputs recorded so far are kept
+            bt.status = exc.rewind_to if isinstance(exc, StageFailed) else status_before
+            bt.retry_count = bt.retry_count + 1
+            bt.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            save_leased(bt, fields + ["status", "retry_count", "next_attempt_at"])
+            self.stderr.write(
+                f"RETRY {attempts[stage]}/{policy.max_attempts - 1} in {delay:.1f}s: "
+                f"{bt.backtest_run_id} [{stage}] -> {bt.last_error}"
+            )
+            return delay
+
+        bt.status = BacktestStatus.FAILED
+        bt.failed_stage = stage
+        bt.finished_at = timezone.now()
+        save_leased(bt, fields + ["status", "failed_stage", "finished_at"])
+        self.stderr.write(f"FAILED: {bt.backtest_run_id} [{stage}] -> {bt.last_error}")
+        return 0
 
     def _advance_one_step(self, bt: BacktestRun) -> None:
-        if bt.status == BacktestStatus.CREATED:
+        if bt.status == BacktestStatus.CREATED and bt.mode == BacktestMode.FUSED:
+            run_fused_backtest(bt)
+            self.stdout.write(f"{bt.backtest_run_id}: CREATED -> REPORT_DONE (fused)")
+            self._pregenerate(bt)
+        elif bt.status == BacktestStatus.CREATED and bt.mode == BacktestMode.WALK_FORWARD:
+            run_walk_forward_backtest(bt, settings.WALK_FORWARD_MAX_WORKERS)
+            self.stdout.write(f"{bt.backtest_run_id}: CREATED -> REPORT_DONE (walk-forward)")
+            self._pregenerate(bt)
+        elif bt.status == BacktestStatus.CREATED:
             self._on_created(bt)
         elif bt.status == BacktestStatus.FORECAST_PENDING:
             self._on_forecast_pending(bt)
@@ -110,38 +183,37 @@ class Command(BaseCommand):
             self._on_metrics_done(bt)
 
     def _on_created(self, bt: BacktestRun) -> None:
-        cfg = bt.forecast_config_snapshot_json or {}
-        params = cfg.get("params", {})
-        model_type = cfg.get("modelType", "MA")
-        horizon = int(cfg.get("horizon", 10))
-
-        job = ForecastJob.objects.create(
-            forecast_job_id=ForecastJob.new_job_id(),
-            tenant_id=bt.tenant_id,
-            dataset_version=bt.dataset_version,
-            model_type=model_type,
-            params_json=params,
-            horizon=horizon,
-            status="PENDING",
-        )
+        key = forecast_key_for(bt)
+        job = find_reusable(ForecastJob, bt.tenant_id, "dedup_key", key)
+        if job is None:
+            cfg = bt.forecast_config_snapshot_json or {}
+            job = ForecastJob.objects.create(
+                forecast_job_id=ForecastJob.new_job_id(),
+                tenant_id=bt.tenant_id,
+                dedup_key=key,
+                dataset_version=bt.dataset_version,
+                model_type=cfg.get("modelType", "MA"),
+                params_json=cfg.get("params", {}),
+                horizon=int(cfg.get("horizon", 10)),
+                priority=bt.priority,
+                status="PENDING",
+            )
+            reused = ""
+        else:
+            reused = f" (reused {job.forecast_job_id})"
 
         bt.forecast_job_id = job.forecast_job_id
-        bt.status = BacktestStatus.FORECAST_PENDING
+        bt.status = (
+            BacktestStatus.FORECAST_DONE if job.status == "SUCCEEDED" else BacktestStatus.FORECAST_PENDING
+        )
         bt.last_error = None
         if bt.started_at is None:
             bt.started_at = timezone.now()
-            bt.save(
-                update_fields=[
-                    "forecast_job_id",
-                    "status",
-                    "last_error",
-                    "started_at",
-                ]
-            )
+            save_leased(bt, ["forecast_job_id", "status", "last_error", "started_at"])
         else:
-            bt.save(update_fields=["forecast_job_id", "status", "last_error"])
+            save_leased(bt, ["forecast_job_id", "status", "last_error"])
 
-        self.stdout.write(f"{bt.backtest_run_id}: CREATED -> FORECAST_PENDING")
+        self.stdout.write(f"{bt.backtest_run_id}: CREATED -> {bt.status}{reused}")
 
     def _on_forecast_pending(self, bt: BacktestRun) -> None:
         if not bt.forecast_job_id:
@@ -156,33 +228,40 @@ class Command(BaseCommand):
         if job.status == "SUCCEEDED":
             bt.status = BacktestStatus.FORECAST_DONE
             bt.last_error = None
-            bt.save(update_fields=["status", "last_error"])
+            save_leased(bt, ["status", "last_error"])
             self.stdout.write(f"{bt.backtest_run_id}: FORECAST_PENDING -> FORECAST_DONE")
         elif job.status == "FAILED":
-            bt.status = BacktestStatus.FAILED
-            bt.last_error = f"Forecast failed: {job.error_message}"
-            bt.finished_at = timezone.now()
-            bt.save(update_fields=["status", "last_error", "finished_at"])
-            self.stderr.write(f"FAILED: {bt.backtest_run_id} -> {bt.last_error}")
+            raise StageFailed(
+                f"Forecast failed: {job.error_message}",
+                BacktestStatus.CREATED,
+                recorded_exception(job.error_message),
+            )
 
     def _on_forecast_done(self, bt: BacktestRun) -> None:
-        sr = SignalRun.objects.create(
-            tenant_id=bt.tenant_id,
-            forecast_job_id=bt.forecast_job_id,
-            strategy=bt.strategy,
-            status="PENDING",
-        )
+        job = ForecastJob.objects.get(tenant_id=bt.tenant_id, forecast_job_id=bt.forecast_job_id)
+        key = signal_key_for(bt, job.dedup_key)
+        sr = find_reusable(SignalRun, bt.tenant_id, "stage_key", key)
+        reused = f" (reused {sr.signal_run_id})" if sr else ""
+        if sr is None:
+            sr = SignalRun.objects.create(
+                tenant_id=bt.tenant_id,
+                forecast_job_id=bt.forecast_job_id,
+                strategy=bt.strategy,
+                stage_key=key,
+                priority=bt.priority,
+                status="PENDING",
+            )
+            try:
+                run_signal_job.delay(sr.signal_run_id)
+            except Exception:
+                pass
+
         bt.signal_run_id = sr.signal_run_id
-        bt.status = BacktestStatus.SIGNAL_PENDING
+        bt.status = BacktestStatus.SIGNAL_DONE if sr.status == "SUCCEEDED" else BacktestStatus.SIGNAL_PENDING
         bt.last_error = None
-        bt.save(update_fields=["signal_run_id", "status", "last_error"])
+        save_leased(bt, ["signal_run_id", "status", "last_error"])
 
-        try:
-            run_signal_job.delay(sr.signal_run_id)
-        except Exception:
-            pass
-
-        self.stdout.write(f"{bt.backtest_run_id}: FORECAST_DONE -> SIGNAL_PENDING")
+        self.stdout.write(f"{bt.backtest_run_id}: FORECAST_DONE -> {bt.status}{reused}")
 
     def _on_signal_pending(self, bt: BacktestRun) -> None:
         if not bt.signal_run_id:
@@ -197,45 +276,54 @@ class Command(BaseCommand):
         if sr.status == "SUCCEEDED":
             bt.status = BacktestStatus.SIGNAL_DONE
             bt.last_error = None
-            bt.save(update_fields=["status", "last_error"])
+            save_leased(bt, ["status", "last_error"])
             self.stdout.write(f"{bt.backtest_run_id}: SIGNAL_PENDING -> SIGNAL_DONE")
         elif sr.status == "FAILED":
-            bt.status = BacktestStatus.FAILED
-            bt.last_error = f"Signal failed: {sr.error_message}"
-            bt.finished_at = timezone.now()
-            bt.save(update_fields=["status", "last_error", "finished_at"])
-            self.stderr.write(f"FAILED: {bt.backtest_run_id} -> {bt.last_error}")
+            raise StageFailed(
+                f"Signal failed: {sr.error_message}",
+                BacktestStatus.FORECAST_DONE,
+                recorded_exception(sr.error_message),
+            )
 
     def _on_signal_done(self, bt: BacktestRun) -> None:
-        acct_cfg = bt.account_config_json or {}
-        base_currency = acct_cfg.get("baseCurrency", "USD")
-        initial_cash = Decimal(str(acct_cfg.get("initialCash", 100000)))
+        sr = SignalRun.objects.get(signal_run_id=bt.signal_run_id)
+        key = sim_key_for(bt, sr.stage_key)
+        sim_run = find_reusable(TradeSimRun, bt.tenant_id, "stage_key", key)
+        reused = f" (reused {sim_run.trade_sim_run_id})" if sim_run else ""
+        if sim_run is None:
+            acct_cfg = bt.account_config_json or {}
+            base_currency = acct_cfg.get("baseCurrency", "USD")
+            initial_cash = Decimal(str(acct_cfg.get("initialCash", 100000)))
+
+            account = SimAccount.objects.create(
+                tenant_id=bt.tenant_id,
+                base_currency=base_currency,
+                initial_cash=initial_cash,
+            )
 
-        account = SimAccount.objects.create(
-            tenant_id=bt.tenant_id,
-            base_currency=base_currency,
-            initial_cash=initial_cash,
-        )
+            execution_cfg = bt.execution_config_json or {}
+            sim_run = TradeSimRun.objects.create(
+                tenant_id=bt.tenant_id,
+                account=account,
+                signal_run=sr,
+                execution_model=execution_cfg.get("model", "NEXT_BAR_CLOSE"),
+                execution_config_json=execution_cfg,
+                risk_rules_json=bt.risk_rules_json or {},
+                stage_key=key,
+                priority=bt.priority,
+                status="PENDING",
+            )
+            try:
+                run_trade_sim.delay(sim_run.trade_sim_run_id)
+            except Exception:
+                pass
 
-        execution_cfg = bt.execution_config_json or {}
-        sim_run = TradeSimRun.objects.create(
-            tenant_id=bt.tenant_id,
-            account=account,
-            signal_run=SignalRun.objects.get(signal_run_id=bt.signal_run_id),
-            execution_model=execution_cfg.get("model", "NEXT_BAR_CLOSE"),
-            status="PENDING",
-        )
         bt.trade_sim_run_id = sim_run.trade_sim_run_id
-        bt.status = BacktestStatus.SIM_PENDING
+        bt.status = BacktestStatus.SIM_DONE if sim_run.status == "SUCCEEDED" else BacktestStatus.SIM_PENDING
         bt.last_error = None
-        bt.save(update_fields=["trade_sim_run_id", "status", "last_error"])
+        save_leased(bt, ["trade_sim_run_id", "status", "last_error"])
 
-        try:
-            run_trade_sim.delay(sim_run.trade_sim_run_id)
-        except Exception:
-            pass
-
-        self.stdout.write(f"{bt.backtest_run_id}: SIGNAL_DONE -> SIM_PENDING")
+        self.stdout.write(f"{bt.backtest_run_id}: SIGNAL_DONE -> {bt.status}{reused}")
 
     def _on_sim_pending(self, bt: BacktestRun) -> None:
         if not bt.trade_sim_run_id:
@@ -250,80 +338,62 @@ class Command(BaseCommand):
         if sim_run.status == "SUCCEEDED":
             bt.status = BacktestStatus.SIM_DONE
             bt.last_error = None
-            bt.save(update_fields=["status", "last_error"])
+            save_leased(bt, ["status", "last_error"])
             self.stdout.write(f"{bt.backtest_run_id}: SIM_PENDING -> SIM_DONE")
         elif sim_run.status == "FAILED":
-            bt.status = BacktestStatus.FAILED
-            bt.last_error = f"Simulation failed: {sim_run.error_message}"
-            bt.finished_at = timezone.now()
-            bt.save(update_fields=["status", "last_error", "finished_at"])
-            self.stderr.write(f"FAILED: {bt.backtest_run_id} -> {bt.last_error}")
+            raise StageFailed(
+                f"Simulation failed: {sim_run.error_message}",
+                BacktestStatus.SIGNAL_DONE,
+                recorded_exception(sim_run.error_message),
+            )
 
     def _on_sim_done(self, bt: BacktestRun) -> None:
         sim_run = TradeSimRun.objects.get(
             tenant_id=bt.tenant_id,
             trade_sim_run_id=bt.trade_sim_run_id,
         )
-        payload = sim_run.result
-        if not payload and sim_run.output_uri:
-            payload = json.loads(Path(sim_run.output_uri).read_text(encoding="utf-8"))
-        if not payload:
-            raise ValueError("missing simulation payload")
+        payload = load_sim_payload(sim_run.output_uri)
 
         equity_curve = payload.get("equityCurve", [])
         fills = payload.get("fills", [])
-        metrics = dict(payload.get("metrics", {}))
-        if equity_curve:
-            metrics["finalEquity"] = equity_curve[-1].get("equity")
-        metrics["tradeCount"] = len(fills)
-
-        result = {
-            "backtestRunId": bt.backtest_run_id,
-            "status": BacktestStatus.METRICS_DONE,
-            "forecastJobId": bt.forecast_job_id,
-            "signalRunId": bt.signal_run_id,
-            "tradeSimRunId": bt.trade_sim_run_id,
-            "metrics": metrics,
-            "equityCurve": equity_curve,
-            "reportUri": bt.report_uri,
-        }
-
-        out_dir = Path(settings.ARTIFACT_DIR) / bt.tenant_id / "backtests"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / f"{bt.backtest_run_id}.json"
-        out_path.write_text(
-            json.dumps(result, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        metrics = dict(sim_run.metrics_json or payload.get("metrics", {}))
+        if "sharpe" not in metrics:
+            # written before the metrics engine: recompute what the equity curve allows
+            equity = np.fromiter((p.get("equity") or 0.0 for p in equity_curve), dtype=np.float64)
+            bar_ts = parse_timestamps(p.get("timestamp") for p in equity_curve)
+            metrics.update(
+                compute_metrics(
+                    equity,
+                    float(sim_run.account.initial_cash),
+                    periods_per_year=infer_periods_per_year(bar_ts),
+                )
+            )
+            metrics["tradeCount"] = len(fills)
 
-        bt.metrics_json = metrics
-        bt.output_uri = str(out_path)
+        write_backtest_output(bt, metrics, equity_curve)
         bt.status = BacktestStatus.METRICS_DONE
         bt.last_error = None
-        bt.save(update_fields=["metrics_json", "output_uri", "status", "last_error"])
+        save_leased(bt, ["metrics_json", "output_uri", "output_checksum", "status", "last_error"])
         self.stdout.write(f"{bt.backtest_run_id}: SIM_DONE -> METRICS_DONE")
+        self._pregenerate(bt)
 
-    def _on_metrics_done(self, bt: BacktestRun) -> None:
-        reports_dir = Path(settings.ARTIFACT_DIR) / bt.tenant_id / "reports"
-        reports_dir.mkdir(parents=True, exist_ok=True)
-        report_path = reports_dir / f"{bt.backtest_run_id}.md"
-        report_path.write_text(
-            build_backtest_report_markdown(bt, bt.metrics_json or {}),
-            encoding="utf-8",
-        )
-
-        Report.objects.create(
-            report_id=Report.new_report_id(),
-            tenant_id=bt.tenant_id,
-            source_type="BACKTEST",
-            source_id=bt.backtest_run_id,
-            format="MARKDOWN",
-            uri=str(report_path),
-        )
+    def _pregenerate(self, bt: BacktestRun) -> None:
+        """
+        Queues the LLM reports the tenant opted into. Best effort: the
+        backtest itself is done, so a failure here is only logged.
+        """
+        try:
+            tasks = enqueue_pregenerated(bt)
+        except Exception as e:
+            self.stderr.write(f"{bt.backtest_run_id}: LLM pregeneration failed -> {type(e).__name__}: {e}")
+            return
+        for task in tasks:
+            self.stdout.write(f"{bt.backtest_run_id}: queued {task.task_type} {task.llm_task_id} (pregenerated)")
 
-        bt.report_uri = str(report_path)
+    def _on_metrics_done(self, bt: BacktestRun) -> None:
+        write_backtest_report(bt)
         bt.status = BacktestStatus.REPORT_DONE
         bt.finished_at = timezone.now()
         bt.last_error = None
-        bt.save(update_fields=["report_uri", "status", "finished_at", "last_error"])
+        save_leased(bt, ["report_uri", "status", "finished_at", "last_error"])
         self.stdout.write(f"{bt.backtest_run_id}: METRICS_DONE -> REPORT_DONE")
@@ -3,20 +3,30 @@ from pathlib import Path
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.conf import settings
 
 from forecasting.models import DatasetVersion, DatasetVersionStatus
 from forecasting.services.dataset_service import normalize_and_profile_csv
+from forecasting.services.scheduler import Queue, charge, next_candidate
 
 class Command(BaseCommand):
+    # versions stay VALIDATING while processed: fair order only, no caps
+    QUEUE = Queue(
+        name="dataset",
+        model=DatasetVersion,
+        pending=lambda: Q(status=DatasetVersionStatus.VALIDATING),
+        running=lambda: Q(pk__in=[]),
+    )
+
     help = "Run dataset worker loop (poll DB for VALIDATING dataset versions)"
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Dataset worker started. Polling DB..."))
 
         while True:
-            dsv = DatasetVersion.objects.filter(status=DatasetVersionStatus.VALIDATING).order_by("created_at").first()
+            dsv = next_candidate(self.QUEUE)
             if not dsv:
                 time.sleep(0.5)
                 continue
@@ -27,6 +37,7 @@ class Command(BaseCommand):
                     continue
                 dsv.error_message = None
                 dsv.save()
+            charge(self.QUEUE, dsv.tenant_id)
 
             try:
                 raw_path = Path(dsv.raw_uri)
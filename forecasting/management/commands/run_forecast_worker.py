@@ -10,27 +10,21 @@ from pathlib import Path
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from forecasting.models import ForecastJob, JobStatus
+from forecasting.services.forecast_service import MODEL_ARTIFACT_VERSION, build_ma_forecast
+from forecasting.services.scheduler import Queue, charge, next_candidate
 
 #MODEL_ARTIFACT_VERSION = "stub-model:v0.1"
 
 # Read from csv
 #MODEL_ARTIFACT_VERSION = "ma-model:v0.1"
 
-MODEL_ARTIFACT_VERSION = "ma-baseline:v0.1"
 def write_ma_artifact(job_id: str, processed_path: Path, window: int, horizon: int) -> Path:
     df = pd.read_csv(processed_path)
-    series = df["target"].dropna().tolist()
-    if len(series) < window:
-        raise ValueError(f"not enough data points: have={len(series)}, need window={window}")
-    ma = sum(series[-window:]) / window
-
-    start_date = timezone.now().date()
-    preds = [{"timestamp": (start_date + timedelta(days=i+1)).isoformat(), "yhat": round(float(ma), 4)} for i in range(horizon)]
-
-    payload = {"predictions": preds, "metrics": {"rmse": None}, "modelArtifactVersion": MODEL_ARTIFACT_VERSION}
+    payload = build_ma_forecast(df["target"].dropna().tolist(), window, horizon)
     out_path = processed_path.parent / f"{job_id}.json"
     out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
     return out_path
@@ -152,14 +146,21 @@ def write_artifact_for_job(job: ForecastJob) -> Path:
 
 
 class Command(BaseCommand):
+    QUEUE = Queue(
+        name="forecast",
+        model=ForecastJob,
+        pending=lambda: Q(status=JobStatus.PENDING),
+        running=lambda: Q(status=JobStatus.RUNNING),
+    )
+
     help = "Run forecast worker loop (poll DB for PENDING jobs)"
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Forecast worker started. Polling DB..."))
 
         while True:
-            # 1) 拉一个 PENDING job（最简实现：轮询）
-            job = ForecastJob.objects.filter(status=JobStatus.PENDING).order_by("created_at").first()
+            # 1) 拉一个 PENDING job（公平调度：按租户 / 优先级）
+            job = next_candidate(self.QUEUE)
 
             if not job:
                 time.sleep(0.5)
@@ -174,6 +175,7 @@ class Command(BaseCommand):
                 job.started_at = timezone.now()
                 job.error_message = None
                 job.save()
+            charge(self.QUEUE, job.tenant_id)
 
             try:
                 # 模拟耗时计算
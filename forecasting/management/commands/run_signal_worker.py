@@ -2,23 +2,28 @@ import time
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 
 from forecasting.models import SignalRun
+from forecasting.services.scheduler import Queue, charge, next_candidate
 from forecasting.tasks import run_signal_job
 
 
 class Command(BaseCommand):
+    QUEUE = Queue(
+        name="signal",
+        model=SignalRun,
+        pending=lambda: Q(status="PENDING"),
+        running=lambda: Q(status="RUNNING"),
+    )
+
     help = "Run signal worker loop (poll DB for PENDING signal runs)"
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Signal worker started. Polling DB..."))
 
         while True:
-            signal_run = (
-                SignalRun.objects.filter(status="PENDING")
-                .order_by("created_at")
-                .first()
-            )
+            signal_run = next_candidate(self.QUEUE)
             if not signal_run:
                 time.sleep(0.5)
                 continue
@@ -30,6 +35,7 @@ class Command(BaseCommand):
                 signal_run.status = "RUNNING"
                 signal_run.error_message = None
                 signal_run.save(update_fields=["status", "error_message", "updated_at"])
+            charge(self.QUEUE, signal_run.tenant_id)
 
             try:
                 # Run inline in this worker process.
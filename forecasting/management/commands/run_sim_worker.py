@@ -2,23 +2,28 @@ import time
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 
 from forecasting.models import TradeSimRun
+from forecasting.services.scheduler import Queue, charge, next_candidate
 from forecasting.tasks import run_trade_sim
 
 
 class Command(BaseCommand):
+    QUEUE = Queue(
+        name="sim",
+        model=TradeSimRun,
+        pending=lambda: Q(status="PENDING"),
+        running=lambda: Q(status="RUNNING"),
+    )
+
     help = "Run simulation worker loop (poll DB for PENDING simulation runs)"
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Simulation worker started. Polling DB..."))
 
         while True:
-            sim_run = (
-                TradeSimRun.objects.filter(status="PENDING")
-                .order_by("created_at")
-                .first()
-            )
+            sim_run = next_candidate(self.QUEUE)
             if not sim_run:
                 time.sleep(0.5)
                 continue
@@ -30,6 +35,7 @@ class Command(BaseCommand):
                 sim_run.status = "RUNNING"
                 sim_run.error_message = None
                 sim_run.save(update_fields=["status", "error_message", "updated_at"])
+            charge(self.QUEUE, sim_run.tenant_id)
 
             try:
                 run_trade_sim(sim_run.trade_sim_run_id)
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from forecasting.models import BacktestSweep, JobStatus
+from forecasting.services.scheduler import Queue, charge, next_candidate
+from forecasting.services.sweep_service import run_backtest_sweep
+
+
+class Command(BaseCommand):
+    QUEUE = Queue(
+        name="sweep",
+        model=BacktestSweep,
+        pending=lambda: Q(status=JobStatus.PENDING),
+        running=lambda: Q(status=JobStatus.RUNNING),
+    )
+
+    help = "Run backtest sweep worker loop (poll DB for PENDING sweeps)"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Sweep worker started. Polling DB..."))
+
+        while True:
+            sweep = next_candidate(self.QUEUE)
+            if not sweep:
+                time.sleep(0.5)
+                continue
+
+            with transaction.atomic():
+                sweep = BacktestSweep.objects.select_for_update().get(id=sweep.id)
+                if sweep.status != JobStatus.PENDING:
+                    continue
+                sweep.status = JobStatus.RUNNING
+                sweep.started_at = timezone.now()
+                sweep.error_message = None
+                sweep.save(update_fields=["status", "started_at", "error_message"])
+            charge(self.QUEUE, sweep.tenant_id)
+
+            try:
+                run_backtest_sweep(sweep, settings.SWEEP_MAX_WORKERS)
+                self.stdout.write(f"SUCCEEDED: {sweep.sweep_id} ({sweep.variant_count} variants)")
+            except Exception as e:
+                sweep.status = JobStatus.FAILED
+                sweep.error_message = f"{type(e).__name__}: {e}"
+                sweep.finished_at = timezone.now()
+                sweep.save(update_fields=["status", "error_message", "finished_at"])
+                self.stderr.write(f"FAILED: {sweep.sweep_id} -> {sweep.error_message}")
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0006_report_backtestrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="signalrun",
+            name="strategy_ids_json",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="signal_column",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
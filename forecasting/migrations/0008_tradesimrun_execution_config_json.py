@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0007_signalrun_strategy_ids_tradesimrun_signal_column"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="execution_config_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0008_tradesimrun_execution_config_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="risk_rules_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:12
+
+from django.db import migrations, models
+
+
+def copy_result_metrics(apps, schema_editor):
+    # payloads already live in the JSON artifact at output_uri; keep the metrics
+    TradeSimRun = apps.get_model("forecasting", "TradeSimRun")
+    for sim_run in TradeSimRun.objects.exclude(result=None).only("id", "result").iterator():
+        sim_run.metrics_json = (sim_run.result or {}).get("metrics", {})
+        sim_run.save(update_fields=["metrics_json"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0009_tradesimrun_risk_rules_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="metrics_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="output_checksum",
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+        migrations.RunPython(copy_result_metrics, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="tradesimrun",
+            name="result",
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0010_tradesimrun_artifact_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestrun",
+            name="mode",
+            field=models.CharField(
+                choices=[("STAGED", "Staged"), ("FUSED", "Fused")],
+                default="STAGED",
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0011_backtestrun_mode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestrun",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="backtestrun",
+            name="lease_owner",
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0012_backtestrun_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="signalrun",
+            name="stage_key",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=128, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="stage_key",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=128, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0013_stage_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BacktestSweep",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sweep_id",
+                    models.CharField(db_index=True, max_length=64, unique=True),
+                ),
+                ("tenant_id", models.CharField(db_index=True, max_length=64)),
+                ("forecast_config_json", models.JSONField(default=dict)),
+                ("account_config_json", models.JSONField(default=dict)),
+                ("execution_config_json", models.JSONField(default=dict)),
+                ("risk_rules_json", models.JSONField(default=dict)),
+                ("grid_json", models.JSONField(default=dict)),
+                ("samples", models.IntegerField(blank=True, null=True)),
+                ("seed", models.IntegerField(blank=True, null=True)),
+                ("rank_by", models.CharField(default="sharpe", max_length=32)),
+                ("persist_top", models.IntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("SUCCEEDED", "Succeeded"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=16,
+                    ),
+                ),
+                ("variant_count", models.IntegerField(default=0)),
+                ("leaderboard_json", models.JSONField(default=list)),
+                ("output_uri", models.TextField(blank=True, null=True)),
+                ("error_message", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "dataset_version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="forecasting.datasetversion",
+                    ),
+                ),
+                (
+                    "strategy",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="forecasting.strategy",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0014_backtestsweep"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestrun",
+            name="walk_forward_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name="backtestrun",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("STAGED", "Staged"),
+                    ("FUSED", "Fused"),
+                    ("WALK_FORWARD", "Walk Forward"),
+                ],
+                default="STAGED",
+                max_length=16,
+            ),
+        ),
+    ]
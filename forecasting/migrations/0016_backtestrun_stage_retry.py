@@ -0,0 +1,39 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0015_backtestrun_walk_forward"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestrun",
+            name="failed_stage",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("FORECAST", "Forecast"),
+                    ("SIGNAL", "Signal"),
+                    ("SIMULATION", "Simulation"),
+                    ("METRICS", "Metrics"),
+                    ("REPORT", "Report"),
+                ],
+                max_length=16,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="backtestrun",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="backtestrun",
+            name="stage_attempts_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
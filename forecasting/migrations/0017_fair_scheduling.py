@@ -0,0 +1,55 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0016_backtestrun_stage_retry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FairQueueState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("queue", models.CharField(max_length=32)),
+                ("tenant_id", models.CharField(blank=True, max_length=64)),
+                ("virtual_time", models.FloatField(default=0.0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="backtestrun",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="forecastjob",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="fairqueuestate",
+            constraint=models.UniqueConstraint(
+                fields=("queue", "tenant_id"), name="uq_fair_queue_tenant"
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.8 on 2026-10-19 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0017_fair_scheduling"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestsweep",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="datasetversion",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="signalrun",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="tradesimrun",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forecasting", "0018_queue_priorities"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backtestrun",
+            name="output_checksum",
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
@@ -16,6 +16,22 @@ class BacktestStatus(models.TextChoices):
     REPORT_DONE = "REPORT_DONE"
     FAILED = "FAILED"
 
+class BacktestStage(models.TextChoices):
+    FORECAST = "FORECAST"
+    SIGNAL = "SIGNAL"
+    SIMULATION = "SIMULATION"
+    METRICS = "METRICS"
+    REPORT = "REPORT"
+
+class JobPriority(models.TextChoices):
+    INTERACTIVE = "INTERACTIVE"  # always scheduled ahead of BATCH
+    BATCH = "BATCH"
+
+class BacktestMode(models.TextChoices):
+    STAGED = "STAGED"  # one worker hop per stage
+    FUSED = "FUSED"  # all stages in one process, in-memory hand-off
+    WALK_FORWARD = "WALK_FORWARD"  # rolling train/test folds, stitched out-of-sample curve
+
 class BacktestRun(models.Model):
     backtest_run_id = models.CharField(max_length=64, unique=True, db_index=True)
     tenant_id = models.CharField(max_length=64, db_index=True)
@@ -29,6 +45,10 @@ class BacktestRun(models.Model):
     risk_rules_json = models.JSONField(default=dict)
 
     status = models.CharField(max_length=32, choices=BacktestStatus.choices, default=BacktestStatus.CREATED)
+    mode = models.CharField(max_length=16, choices=BacktestMode.choices, default=BacktestMode.STAGED)
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
+    # WALK_FORWARD only: {"trainBars": 250, "testBars": 50, "anchored": false}
+    walk_forward_json = models.JSONField(default=dict, blank=True)
 
     forecast_job_id = models.CharField(max_length=64, null=True, blank=True)
     signal_run_id = models.CharField(max_length=64, null=True, blank=True)
@@ -36,10 +56,19 @@ class BacktestRun(models.Model):
 
     metrics_json = models.JSONField(default=dict)
     output_uri = models.TextField(null=True, blank=True)
+    output_checksum = models.CharField(max_length=128, null=True, blank=True)
     report_uri = models.TextField(null=True, blank=True)
 
     retry_count = models.IntegerField(default=0)
     last_error = models.TextField(null=True, blank=True)
+    # failures per BacktestStage since the last redrive, {"SIMULATION": 2}
+    stage_attempts_json = models.JSONField(default=dict, blank=True)
+    failed_stage = models.CharField(max_length=16, choices=BacktestStage.choices, null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    # set by the orchestrator that is currently advancing this run
+    lease_owner = models.CharField(max_length=128, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
@@ -87,7 +116,12 @@ class SignalRun(TimestampedModel):
     tenant_id = models.CharField(max_length=64)
     forecast_job_id = models.CharField(max_length=128)
     strategy = models.ForeignKey(Strategy, on_delete=models.CASCADE)
+    # fan-out runs: every strategy evaluated in one pass, one artifact column each
+    strategy_ids_json = JSONField(default=list, blank=True)
+    # content hash of the inputs (see dedup.signal_stage_key); set by backtests
+    stage_key = models.CharField(max_length=128, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=32, default="PENDING")
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
     output_uri = models.CharField(max_length=512, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
 
@@ -102,11 +136,19 @@ class TradeSimRun(TimestampedModel):
     tenant_id = models.CharField(max_length=64)
     account = models.ForeignKey(SimAccount, on_delete=models.CASCADE)
     signal_run = models.ForeignKey(SignalRun, on_delete=models.CASCADE)
+    signal_column = models.CharField(max_length=64, blank=True, null=True)
     execution_model = models.CharField(max_length=32, default="NEXT_BAR_CLOSE")
+    execution_config_json = JSONField(default=dict, blank=True)
+    risk_rules_json = JSONField(default=dict, blank=True)
+    # content hash of the inputs (see dedup.sim_stage_key); set by backtests
+    stage_key = models.CharField(max_length=128, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=32, default="PENDING")
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
+    # orders/fills/equity live in the .npz artifact; the row keeps the summary
     output_uri = models.CharField(max_length=512, blank=True, null=True)
+    output_checksum = models.CharField(max_length=128, blank=True, null=True)
+    metrics_json = JSONField(default=dict, blank=True)
     error_message = models.TextField(blank=True, null=True)
-    result = JSONField(blank=True, null=True)
 
 class JobStatus(models.TextChoices):
     PENDING = "PENDING"
@@ -142,6 +184,7 @@ class DatasetVersion(models.Model):
     profile_json = models.JSONField(default=dict)
 
     status = models.CharField(max_length=16, choices=DatasetVersionStatus.choices, default=DatasetVersionStatus.VALIDATING)
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
     error_message = models.TextField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -173,6 +216,7 @@ class ForecastJob(models.Model):
     horizon = models.IntegerField()
 
     status = models.CharField(max_length=16, choices=JobStatus.choices, default=JobStatus.PENDING)
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
 
     output_uri = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
@@ -192,3 +236,59 @@ class ForecastJob(models.Model):
     @staticmethod
     def new_job_id() -> str:
         return f"fc_{uuid.uuid4().hex[:12]}"
+
+class BacktestSweep(models.Model):
+    """
+    One parameter study: a grid (or a random sample of it) over forecast
+    params, strategy spec fields and execution config, evaluated in bulk.
+    Variants only get a BacktestRun when persist_top asks for it.
+    """
+    sweep_id = models.CharField(max_length=64, unique=True, db_index=True)
+    tenant_id = models.CharField(max_length=64, db_index=True)
+
+    dataset_version = models.ForeignKey(DatasetVersion, on_delete=models.PROTECT)
+    strategy = models.ForeignKey(Strategy, on_delete=models.PROTECT)
+
+    forecast_config_json = models.JSONField(default=dict)
+    account_config_json = models.JSONField(default=dict)
+    execution_config_json = models.JSONField(default=dict)
+    risk_rules_json = models.JSONField(default=dict)
+
+    # {"forecast.params.window": [5, 10], "strategy.buyAbovePct": [0.0, 0.01], ...}
+    grid_json = models.JSONField(default=dict)
+    samples = models.IntegerField(null=True, blank=True)
+    seed = models.IntegerField(null=True, blank=True)
+    rank_by = models.CharField(max_length=32, default="sharpe")
+    persist_top = models.IntegerField(default=0)
+
+    status = models.CharField(max_length=16, choices=JobStatus.choices, default=JobStatus.PENDING)
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
+    variant_count = models.IntegerField(default=0)
+    # top of the leaderboard; the full one is in output_uri
+    leaderboard_json = models.JSONField(default=list)
+    output_uri = models.TextField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def new_sweep_id() -> str:
+        return f"sw_{uuid.uuid4().hex[:12]}"
+
+class FairQueueState(models.Model):
+    """
+    Virtual clocks of the fair scheduler (services.scheduler), per worker
+    queue: one row per tenant holding its finish tag, plus the queue's own
+    clock in the row with tenant_id="".
+    """
+    queue = models.CharField(max_length=32)
+    tenant_id = models.CharField(max_length=64, blank=True)
+    virtual_time = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["queue", "tenant_id"], name="uq_fair_queue_tenant")
+        ]
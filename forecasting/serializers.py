@@ -1,14 +1,72 @@
 import json
+from django.conf import settings
 from rest_framework import serializers
-from .models import Strategy, SimAccount
+from .models import BacktestMode, BacktestStage, JobPriority, Strategy, SimAccount
+from .services.execution_models import DEFAULT_EXECUTION_MODEL, validate_execution_config
+from .services.risk_rules import RiskRules
+from .services.simulation import ASOF_DIRECTIONS, DEFAULT_SIZING, SIZING_MODES, parse_tolerance
+from .services.sweep import RANK_METRICS, count_variants, validate_sweep_grid
+from .services.walk_forward import validate_walk_forward
+
+def validate_risk_rules(v):
+    try:
+        RiskRules.from_json(v)
+    except (TypeError, ValueError) as e:
+        raise serializers.ValidationError(f"invalid risk rules: {e}")
+    return v
+
+def validate_asof_and_sizing(v):
+    """
+    "sizing" defaults to cashFraction, the original rule, which sizes each
+    BUY from the cash left and runs one fill at a time; clients simulating
+    long histories should send "fixedFraction", the vectorized path.
+    """
+    direction = v.get("asofDirection", "backward")
+    if direction not in ASOF_DIRECTIONS:
+        raise serializers.ValidationError(f"asofDirection must be one of {ASOF_DIRECTIONS}")
+    try:
+        parse_tolerance(v.get("asofTolerance"))
+    except ValueError as e:
+        raise serializers.ValidationError(f"invalid asofTolerance: {e}")
+    if v.get("sizing", DEFAULT_SIZING) not in SIZING_MODES:
+        raise serializers.ValidationError(f"sizing must be one of {SIZING_MODES}")
+    return v
+
+def validate_backtest_execution(v):
+    """
+    A backtest's execution config: the simulation's as-of and sizing
+    settings plus its execution "model", checked like a TradeSimRun's.
+    """
+    validate_asof_and_sizing(v)
+    try:
+        validate_execution_config(v.get("model", DEFAULT_EXECUTION_MODEL), v)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+    return v
+
 
 class BacktestCreateSerializer(serializers.Serializer):
     datasetVersionId = serializers.CharField()
     forecast = serializers.DictField()
     strategyId = serializers.CharField()
     account = serializers.DictField()
-    execution = serializers.DictField(required=False)
-    riskRules = serializers.DictField(required=False)
+    execution = serializers.DictField(required=False, validators=[validate_backtest_execution])
+    riskRules = serializers.DictField(required=False, validators=[validate_risk_rules])
+    mode = serializers.ChoiceField(choices=BacktestMode.choices, required=False, default=BacktestMode.STAGED)
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
+    walkForward = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["mode"] != BacktestMode.WALK_FORWARD:
+            attrs.pop("walkForward", None)
+            return attrs
+        if "walkForward" not in attrs:
+            raise serializers.ValidationError({"walkForward": "required when mode is WALK_FORWARD"})
+        try:
+            attrs["walkForward"] = validate_walk_forward(attrs["walkForward"])
+        except ValueError as e:
+            raise serializers.ValidationError({"walkForward": str(e)})
+        return attrs
 
 class BacktestCreateResponseSerializer(serializers.Serializer):
     backtestRunId = serializers.CharField()
@@ -17,6 +75,8 @@ class BacktestCreateResponseSerializer(serializers.Serializer):
 class BacktestDetailSerializer(serializers.Serializer):
     backtestRunId = serializers.CharField()
     status = serializers.CharField()
+    mode = serializers.CharField()
+    priority = serializers.CharField()
     datasetVersionId = serializers.CharField()
     forecastJobId = serializers.CharField(allow_null=True)
     signalRunId = serializers.CharField(allow_null=True)
@@ -24,6 +84,14 @@ class BacktestDetailSerializer(serializers.Serializer):
     metrics = serializers.DictField()
     reportUri = serializers.CharField(allow_null=True)
     lastError = serializers.CharField(allow_null=True)
+    retryCount = serializers.IntegerField()
+    stageAttempts = serializers.DictField()
+    failedStage = serializers.CharField(allow_null=True)
+    nextAttemptAt = serializers.DateTimeField(allow_null=True)
+
+class BacktestRedriveSerializer(serializers.Serializer):
+    # default: the first stage without a recorded output
+    fromStage = serializers.ChoiceField(choices=BacktestStage.choices, required=False)
 
 class BacktestResultSerializer(serializers.Serializer):
     backtestRunId = serializers.CharField()
@@ -35,6 +103,47 @@ class BacktestResultSerializer(serializers.Serializer):
     equityCurve = serializers.ListField(child=serializers.DictField())
     reportUri = serializers.CharField(allow_null=True)
 
+class BacktestSweepCreateSerializer(serializers.Serializer):
+    datasetVersionId = serializers.CharField()
+    strategyId = serializers.CharField()
+    forecast = serializers.DictField()
+    account = serializers.DictField()
+    execution = serializers.DictField(required=False, default=dict, validators=[validate_backtest_execution])
+    riskRules = serializers.DictField(required=False, default=dict, validators=[validate_risk_rules])
+    grid = serializers.DictField()
+    samples = serializers.IntegerField(required=False, min_value=1)
+    seed = serializers.IntegerField(required=False)
+    rankBy = serializers.ChoiceField(choices=RANK_METRICS, required=False, default="sharpe")
+    persistTop = serializers.IntegerField(required=False, min_value=0, default=0)
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
+
+    def validate_grid(self, v):
+        try:
+            validate_sweep_grid(v)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return v
+
+    def validate(self, attrs):
+        n = count_variants(attrs["grid"], attrs.get("samples"))
+        if n > settings.SWEEP_MAX_VARIANTS:
+            raise serializers.ValidationError(
+                {"grid": f"{n} variants, at most {settings.SWEEP_MAX_VARIANTS} allowed (use samples)"}
+            )
+        return attrs
+
+class BacktestSweepSerializer(serializers.Serializer):
+    sweepId = serializers.CharField()
+    status = serializers.CharField()
+    priority = serializers.CharField()
+    datasetVersionId = serializers.CharField()
+    strategyId = serializers.CharField()
+    variantCount = serializers.IntegerField()
+    rankBy = serializers.CharField()
+    leaderboard = serializers.ListField(child=serializers.DictField())
+    outputUri = serializers.CharField(allow_null=True)
+    errorMessage = serializers.CharField(allow_null=True)
+
 class ReportCreateSerializer(serializers.Serializer):
     sourceType = serializers.CharField()
     sourceId = serializers.CharField()
@@ -64,6 +173,7 @@ class DatasetUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
     # multipart can't reliably send nested dicts, so send JSON string
     columnMapping = serializers.CharField()  # e.g. {"timestamp":"Date","target":"Close"}
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
 
     def validate_columnMapping(self, v):
         try:
@@ -88,6 +198,7 @@ class DatasetCreateResponseSerializer(serializers.Serializer):
 class DatasetCommitSerializer(serializers.Serializer):
     localPath = serializers.CharField()
     columnMapping = serializers.DictField()  # {"timestamp":"Date","target":"Close"}
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
 
 class DatasetCommitResponseSerializer(serializers.Serializer):
     datasetVersionId = serializers.CharField()
@@ -96,6 +207,7 @@ class DatasetCommitResponseSerializer(serializers.Serializer):
 class DatasetVersionSerializer(serializers.Serializer):
     datasetVersionId = serializers.CharField()
     status = serializers.CharField()
+    priority = serializers.CharField()
     checksum = serializers.CharField(allow_null=True)
     schema = serializers.DictField()
     profile = serializers.DictField()
@@ -108,6 +220,7 @@ class ForecastCreateSerializer(serializers.Serializer):
     modelType = serializers.CharField()
     params = serializers.DictField(required=False)
     horizon = serializers.IntegerField(min_value=1, max_value=365)
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
 
 class ForecastCreateResponseSerializer(serializers.Serializer):
     forecastJobId = serializers.CharField()
@@ -134,6 +247,20 @@ class TradeSimRunCreateSerializer(serializers.Serializer):
     account_id = serializers.CharField()
     signal_run_id = serializers.CharField()
     execution_model = serializers.CharField(required=False, default="NEXT_BAR_CLOSE")
+    signal_column = serializers.CharField(required=False, allow_null=True, default=None)
+    execution_config = serializers.DictField(required=False, default=dict)
+    risk_rules = serializers.DictField(required=False, default=dict, validators=[validate_risk_rules])
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
+
+    def validate_execution_config(self, v):
+        return validate_asof_and_sizing(v)
+
+    def validate(self, attrs):
+        try:
+            validate_execution_config(attrs.get("execution_model"), attrs.get("execution_config"))
+        except ValueError as e:
+            raise serializers.ValidationError({"execution_model": str(e)})
+        return attrs
 
 
 class TradeSimRunCreateResponseSerializer(serializers.Serializer):
@@ -144,9 +271,13 @@ class TradeSimRunCreateResponseSerializer(serializers.Serializer):
 class TradeSimRunSerializer(serializers.Serializer):
     tradeSimRunId = serializers.CharField()
     status = serializers.CharField()
+    priority = serializers.CharField()
     executionModel = serializers.CharField()
+    signalColumn = serializers.CharField(allow_null=True)
     createdAt = serializers.CharField()
     outputUri = serializers.CharField(allow_null=True)
+    outputChecksum = serializers.CharField(allow_null=True)
+    metrics = serializers.DictField()
     errorMessage = serializers.CharField(allow_null=True)
 
 
@@ -154,14 +285,17 @@ class TradeSimResultSerializer(serializers.Serializer):
     orders = serializers.ListField(child=serializers.DictField())
     fills = serializers.ListField(child=serializers.DictField())
     equityCurve = serializers.ListField(child=serializers.DictField())
+    riskEvents = serializers.ListField(child=serializers.DictField(), required=False)
     metrics = serializers.DictField()
 
 
 class SignalRunSerializer(serializers.Serializer):
     signalRunId = serializers.CharField()
     status = serializers.CharField()
+    priority = serializers.CharField()
     forecastJobId = serializers.CharField()
     strategyId = serializers.CharField()
+    strategyIds = serializers.ListField(child=serializers.CharField())
     createdAt = serializers.CharField()
     outputUri = serializers.CharField(allow_null=True)
     errorMessage = serializers.CharField(allow_null=True)
@@ -0,0 +1,146 @@
+import io
+import json
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .dataset_service import compute_sha256_bytes
+from .downsample import curve_indices, downsample_equity_curve
+from .simulation import SimResult, result_to_payload
+
+SIM_ARTIFACT_VERSION = 1
+BACKTEST_CURVE_VERSION = 1
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_sim_artifact(path: Path, result: SimResult, timestamps, metrics: dict) -> str:
+    """
+    Stores a simulation as a compressed .npz of its arrays (orders and fills
+    keep their structured dtypes, no pickling). Returns the sha256 checksum
+    of the written file.
+    """
+    events = result.risk_events
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        version=np.int64(SIM_ARTIFACT_VERSION),
+        timestamps=np.asarray(timestamps).astype(str),
+        orders=result.orders,
+        fills=result.fills,
+        position=result.position,
+        cash=result.cash,
+        equity=result.equity,
+        initial_cash=np.float64(result.initial_cash),
+        risk_bar=np.array([e["bar"] for e in events], dtype=np.int64),
+        risk_fill_bar=np.array(
+            [-1 if e["fillBar"] is None else e["fillBar"] for e in events], dtype=np.int64
+        ),
+        risk_rule=np.array([e["rule"] for e in events], dtype=str),
+        metrics=np.array(json.dumps(metrics)),
+    )
+    data = buf.getvalue()
+    write_bytes_atomic(Path(path), data)
+    return compute_sha256_bytes(data)
+
+
+def load_sim_result(path) -> Tuple[SimResult, np.ndarray, dict]:
+    """
+    (SimResult, bar timestamps, metrics) from a .npz written by
+    write_sim_artifact.
+    """
+    with np.load(path, allow_pickle=False) as z:
+        version = int(z["version"])
+        if version != SIM_ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported simulation artifact version: {version}")
+        risk_events = [
+            {"bar": b, "fillBar": f if f >= 0 else None, "rule": r}
+            for b, f, r in zip(z["risk_bar"].tolist(), z["risk_fill_bar"].tolist(), z["risk_rule"].tolist())
+        ]
+        result = SimResult(
+            orders=z["orders"],
+            fills=z["fills"],
+            position=z["position"],
+            cash=z["cash"],
+            equity=z["equity"],
+            initial_cash=float(z["initial_cash"]),
+            risk_events=risk_events,
+        )
+        return result, z["timestamps"], json.loads(str(z["metrics"]))
+
+
+def load_sim_payload(uri: Optional[str], query: Optional[dict] = None) -> dict:
+    """
+    The API payload (orders, fills, equityCurve, riskEvents, metrics) for a
+    simulation artifact. Older runs wrote the payload as JSON; those are
+    returned as stored. With a parse_curve_query `query`, the equity curve
+    is restricted and thinned on the stored arrays before its points are
+    built.
+    """
+    if not uri:
+        raise ValueError("simulation has no output artifact")
+    if str(uri).endswith(".json"):
+        with open(uri, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if query:
+            payload["equityCurve"] = downsample_equity_curve(
+                payload.get("equityCurve", []), query["points"], query["from"], query["to"]
+            )
+        return payload
+    result, timestamps, metrics = load_sim_result(uri)
+    index = None
+    if query:
+        index = curve_indices(timestamps, result.equity, query["points"], query["from"], query["to"])
+    return result_to_payload(result, timestamps, metrics=metrics, curve_index=index)
+
+
+def backtest_curve_path(output_uri) -> Path:
+    """
+    The .npz next to a backtest's JSON result holding its equity curve.
+    """
+    return Path(output_uri).with_suffix(".npz")
+
+
+def write_backtest_curve(path: Path, result: dict) -> None:
+    """
+    Stores a backtest result's equityCurve as arrays, plus the rest of the
+    result as JSON, so a thinned curve can be served without parsing every
+    point of the JSON artifact.
+    """
+    curve = result.get("equityCurve", [])
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        version=np.int64(BACKTEST_CURVE_VERSION),
+        timestamps=np.array(["" if p.get("timestamp") is None else str(p["timestamp"]) for p in curve], dtype=str),
+        equity=np.array([np.nan if p.get("equity") is None else p["equity"] for p in curve], dtype=np.float64),
+        result=np.array(json.dumps({**result, "equityCurve": []}, ensure_ascii=False)),
+    )
+    write_bytes_atomic(Path(path), buf.getvalue())
+
+
+def load_backtest_curve_payload(path, query: dict) -> dict:
+    """
+    The backtest result from write_backtest_curve with its equity curve
+    restricted and thinned per a parse_curve_query `query` on the arrays.
+    """
+    with np.load(path, allow_pickle=False) as z:
+        version = int(z["version"])
+        if version != BACKTEST_CURVE_VERSION:
+            raise ValueError(f"Unsupported backtest curve version: {version}")
+        timestamps, equity = z["timestamps"], z["equity"]
+        payload = json.loads(str(z["result"]))
+    # missing values rank as 0 when thinning, as downsample_equity_curve does
+    index = curve_indices(timestamps, np.nan_to_num(equity), query["points"], query["from"], query["to"])
+    payload["equityCurve"] = [
+        {"timestamp": t or None, "equity": None if e != e else e}
+        for t, e in zip(timestamps[index].tolist(), equity[index].tolist())
+    ]
+    return payload
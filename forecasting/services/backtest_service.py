@@ -0,0 +1,320 @@
+import json
+import traceback
+from decimal import Decimal
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from forecasting.models import BacktestRun, BacktestStatus, ForecastJob, JobStatus, SignalRun, SimAccount, TradeSimRun
+
+from .artifacts import load_sim_result
+from .execution_models import DEFAULT_EXECUTION_MODEL
+from .forecast_service import build_ma_forecast, ma_forecast
+from .leases import save_leased
+from .metrics import infer_periods_per_year
+from .report import write_backtest_output, write_backtest_report
+from .signal_service import build_signal_list, evaluate_strategies, select_signal_column, signal_inputs
+from .simulation import (
+    SimResult,
+    action_codes,
+    bar_days,
+    equity_curve_points,
+    parse_timestamps,
+    simulation_metrics,
+)
+from .stage_reuse import find_reusable, forecast_key_for, signal_key_for, sim_key_for
+from .stages import load_price_history, simulate_signals, store_sim_result
+from .sweep import simulate_tasks
+from .walk_forward import stitch_folds, walk_forward_folds
+
+
+# fused mode ----------------------------------------------------------------
+
+def _fail(record) -> None:
+    record.status = "FAILED"
+    record.error_message = traceback.format_exc()
+    if hasattr(record, "finished_at"):
+        record.finished_at = timezone.now()
+    record.save()
+
+
+def _fused_forecast(bt: BacktestRun, df_hist: pd.DataFrame, key: Optional[str]) -> Tuple[ForecastJob, dict]:
+    job = find_reusable(ForecastJob, bt.tenant_id, "dedup_key", key, in_flight=False)
+    if job:
+        bt.forecast_job_id = job.forecast_job_id
+        return job, json.loads(Path(job.output_uri).read_text(encoding="utf-8"))
+
+    cfg = bt.forecast_config_snapshot_json or {}
+    params = cfg.get("params", {})
+    job = ForecastJob.objects.create(
+        forecast_job_id=ForecastJob.new_job_id(),
+        tenant_id=bt.tenant_id,
+        dedup_key=key,
+        dataset_version=bt.dataset_version,
+        model_type=cfg.get("modelType", "MA"),
+        params_json=params,
+        horizon=int(cfg.get("horizon", 10)),
+        priority=bt.priority,
+        status=JobStatus.RUNNING,
+        started_at=timezone.now(),
+    )
+    bt.forecast_job_id = job.forecast_job_id
+    try:
+        series = df_hist["target"].dropna().tolist() if "target" in df_hist.columns else []
+        forecast = build_ma_forecast(series, int(params.get("window", 20)), job.horizon)
+        forecast_path = Path(bt.dataset_version.processed_uri).parent / f"{job.forecast_job_id}.json"
+        forecast_path.write_text(json.dumps(forecast, ensure_ascii=False, indent=2), encoding="utf-8")
+    except Exception:
+        _fail(job)
+        raise
+    job.output_uri = str(forecast_path)
+    job.status = JobStatus.SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save()
+    return job, forecast
+
+
+def _fused_signals(
+    bt: BacktestRun, job: ForecastJob, forecast: dict, df_hist: pd.DataFrame, key: Optional[str]
+) -> Tuple[SignalRun, List[dict]]:
+    sr = find_reusable(SignalRun, bt.tenant_id, "stage_key", key, in_flight=False)
+    if sr:
+        bt.signal_run_id = str(sr.signal_run_id)
+        with open(sr.output_uri, "r", encoding="utf-8") as f:
+            return sr, select_signal_column(json.load(f))
+
+    sr = SignalRun.objects.create(
+        tenant_id=bt.tenant_id,
+        forecast_job_id=job.forecast_job_id,
+        strategy=bt.strategy,
+        stage_key=key,
+        priority=bt.priority,
+        status="RUNNING",
+    )
+    bt.signal_run_id = str(sr.signal_run_id)
+    try:
+        timestamps, yhat, last_price = signal_inputs(forecast, df_hist)
+        actions, reasons = evaluate_strategies(yhat, last_price, [bt.strategy.spec_json or {}])
+        signals = build_signal_list(timestamps, actions[:, 0], reasons[:, 0])
+
+        signal_dir = Path(settings.ARTIFACT_DIR) / bt.tenant_id / "signals"
+        signal_dir.mkdir(parents=True, exist_ok=True)
+        signal_path = signal_dir / f"{sr.signal_run_id}.json"
+        with open(signal_path, "w", encoding="utf-8") as f:
+            json.dump({"signalRunId": str(sr.signal_run_id), "signals": signals}, f, ensure_ascii=False)
+    except Exception:
+        _fail(sr)
+        raise
+    sr.output_uri = str(signal_path)
+    sr.status = "SUCCEEDED"
+    sr.save(update_fields=["output_uri", "status", "updated_at"])
+    return sr, signals
+
+
+def _fused_simulation(
+    bt: BacktestRun, sr: SignalRun, signals: List[dict], df_hist: pd.DataFrame, price_col: str, key: Optional[str]
+) -> Tuple[SimResult, np.ndarray, dict]:
+    sim_run = find_reusable(TradeSimRun, bt.tenant_id, "stage_key", key, in_flight=False)
+    if sim_run and sim_run.output_uri.endswith(".npz"):
+        bt.trade_sim_run_id = str(sim_run.trade_sim_run_id)
+        sim, bar_timestamps, _ = load_sim_result(sim_run.output_uri)
+        return sim, bar_timestamps, sim_run.metrics_json
+
+    acct_cfg = bt.account_config_json or {}
+    account = SimAccount.objects.create(
+        tenant_id=bt.tenant_id,
+        base_currency=acct_cfg.get("baseCurrency", "USD"),
+        initial_cash=Decimal(str(acct_cfg.get("initialCash", 100000))),
+    )
+    execution_cfg = bt.execution_config_json or {}
+    sim_run = TradeSimRun.objects.create(
+        tenant_id=bt.tenant_id,
+        account=account,
+        signal_run=sr,
+        execution_model=execution_cfg.get("model", DEFAULT_EXECUTION_MODEL),
+        execution_config_json=execution_cfg,
+        risk_rules_json=bt.risk_rules_json or {},
+        stage_key=key,
+        priority=bt.priority,
+        status="RUNNING",
+    )
+    bt.trade_sim_run_id = str(sim_run.trade_sim_run_id)
+    try:
+        sim, bar_timestamps, metrics = simulate_signals(
+            df_hist,
+            price_col,
+            signals,
+            sim_run.execution_model,
+            execution_cfg,
+            sim_run.risk_rules_json,
+            float(account.initial_cash),
+        )
+        store_sim_result(sim_run, sim, bar_timestamps, metrics)
+    except Exception:
+        _fail(sim_run)
+        raise
+    return sim, bar_timestamps, metrics
+
+
+def run_fused_backtest(bt: BacktestRun) -> None:
+    """
+    Runs forecast -> signal -> simulation -> metrics -> report in-process.
+    Each stage hands its output to the next in memory; the ForecastJob,
+    SignalRun, TradeSimRun, artifacts and Report are still written exactly
+    as the staged workers would, so the run can be audited the same way.
+    The processed dataset is read once, and a stage whose input key matches
+    a completed one is loaded instead of recomputed.
+
+    A failing stage marks its own record FAILED and re-raises.
+    """
+    processed_uri = bt.dataset_version.processed_uri
+    if not processed_uri:
+        raise ValueError("datasetVersion missing processed_uri")
+    df_hist, price_col = load_price_history(processed_uri)
+
+    if bt.started_at is None:
+        bt.started_at = timezone.now()
+    # ids and outputs describe this attempt only (see stage_of)
+    bt.forecast_job_id = bt.signal_run_id = bt.trade_sim_run_id = None
+    bt.output_uri = bt.output_checksum = bt.report_uri = None
+
+    forecast_key = forecast_key_for(bt)
+    job, forecast = _fused_forecast(bt, df_hist, forecast_key)
+
+    signal_key = signal_key_for(bt, forecast_key)
+    sr, signals = _fused_signals(bt, job, forecast, df_hist, signal_key)
+
+    sim, bar_timestamps, metrics = _fused_simulation(
+        bt, sr, signals, df_hist, price_col, sim_key_for(bt, signal_key)
+    )
+
+    # metrics + report
+    write_backtest_output(bt, metrics, equity_curve_points(sim, bar_timestamps))
+    _finish_backtest(bt)
+
+
+def _finish_backtest(bt: BacktestRun) -> None:
+    write_backtest_report(bt)
+
+    bt.status = BacktestStatus.REPORT_DONE
+    bt.finished_at = timezone.now()
+    bt.last_error = None
+    save_leased(
+        bt,
+        [
+            "forecast_job_id",
+            "signal_run_id",
+            "trade_sim_run_id",
+            "metrics_json",
+            "output_uri",
+            "output_checksum",
+            "report_uri",
+            "status",
+            "last_error",
+            "started_at",
+            "finished_at",
+        ],
+    )
+
+
+# walk-forward --------------------------------------------------------------
+
+
+def run_walk_forward_backtest(bt: BacktestRun, max_workers: Optional[int] = None) -> None:
+    """
+    Splits the dataset version into rolling train/test folds
+    (bt.walk_forward_json). Each fold fits the forecast on its train window
+    only, turns it into signals against the last train price and simulates
+    the test window from the account's initial cash; the folds run in
+    parallel on the sweep process pool over shared-memory prices.
+
+    The fold results are stitched (compounding) into one out-of-sample
+    equity curve; the output carries the aggregate metrics of that curve
+    plus each fold's bounds and metrics under "folds". No ForecastJob /
+    SignalRun / TradeSimRun rows are written for the folds.
+    """
+    processed_uri = bt.dataset_version.processed_uri
+    if not processed_uri:
+        raise ValueError("datasetVersion missing processed_uri")
+    df_hist, price_col = load_price_history(processed_uri)
+    if "target" not in df_hist.columns:
+        raise ValueError("processed.csv missing 'target' column")
+
+    wf = bt.walk_forward_json or {}
+    folds = walk_forward_folds(len(df_hist), int(wf["trainBars"]), int(wf["testBars"]), bool(wf.get("anchored")))
+    if not folds:
+        raise ValueError(f"walkForward.trainBars={wf['trainBars']} leaves no test bars ({len(df_hist)} bars)")
+
+    if bt.started_at is None:
+        bt.started_at = timezone.now()
+    bt.output_uri = bt.report_uri = None
+
+    bar_ts = parse_timestamps(df_hist["timestamp"].astype(str))
+    prices = df_hist[price_col].to_numpy(dtype=float)
+    target = df_hist["target"].to_numpy(dtype=float)
+    arrays = {
+        "prices": prices,
+        "opens": df_hist["open"].to_numpy(dtype=float) if "open" in df_hist.columns else None,
+        "day_ids": bar_days(bar_ts),
+    }
+
+    fc = bt.forecast_config_snapshot_json or {}
+    window = int((fc.get("params") or {}).get("window", 20))
+    execution = bt.execution_config_json or {}
+    initial_cash = float((bt.account_config_json or {}).get("initialCash", 100000))
+
+    tasks = []
+    for k, fold in enumerate(folds):
+        train = target[fold.train_start : fold.train_end]
+        yhat = ma_forecast(train[~np.isnan(train)].tolist(), window)
+        test_len = fold.test_end - fold.test_start
+        actions, _ = evaluate_strategies(
+            np.full(test_len, yhat), float(prices[fold.train_end - 1]), [bt.strategy.spec_json or {}]
+        )
+        tasks.append((
+            k,
+            fold.test_start,
+            fold.test_end,
+            np.arange(test_len, dtype=np.int64),
+            action_codes(actions[:, 0]),
+            execution.get("model", DEFAULT_EXECUTION_MODEL),
+            execution,
+            bt.risk_rules_json or {},
+            initial_cash,
+        ))
+
+    periods_per_year = infer_periods_per_year(bar_ts)
+    results = simulate_tasks(arrays, tasks, periods_per_year, max_workers, keep_results=True)
+    for k in range(len(folds)):
+        _, error, _ = results[k]
+        if error:
+            raise ValueError(f"fold {k}: {error}")
+
+    stitched = stitch_folds([results[k][2] for k in range(len(folds))], initial_cash)
+    metrics = simulation_metrics(stitched, None, periods_per_year)
+
+    ts = df_hist["timestamp"].astype(str).to_numpy()
+    fold_rows = [
+        {
+            "fold": k,
+            "trainStart": ts[f.train_start],
+            "trainEnd": ts[f.train_end - 1],
+            "testStart": ts[f.test_start],
+            "testEnd": ts[f.test_end - 1],
+            "trainBars": f.train_end - f.train_start,
+            "testBars": f.test_end - f.test_start,
+            "metrics": results[k][0],
+        }
+        for k, f in enumerate(folds)
+    ]
+    write_backtest_output(
+        bt,
+        metrics,
+        equity_curve_points(stitched, ts[folds[0].test_start : folds[-1].test_end]),
+        {"walkForward": wf, "folds": fold_rows},
+    )
+    _finish_backtest(bt)
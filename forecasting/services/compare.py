@@ -0,0 +1,91 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .metrics import _finite, infer_periods_per_year
+from .simulation import parse_timestamps
+
+
+def align_equity_curves(curves: Dict[str, List[dict]]) -> pd.DataFrame:
+    """
+    One column per run on the union of all timestamps (outer join), each
+    forward-filled from its last bar. Before a run's first bar its column
+    stays NaN.
+    """
+    columns = []
+    for run_id, curve in curves.items():
+        ts = parse_timestamps(p.get("timestamp") for p in curve)
+        equity = np.fromiter((np.nan if p.get("equity") is None else p["equity"] for p in curve), dtype=np.float64)
+        keep = ~np.isnat(ts)
+        series = pd.Series(equity[keep], index=pd.DatetimeIndex(ts[keep]), name=run_id)
+        # repeated timestamps: the last bar wins
+        columns.append(series[~series.index.duplicated(keep="last")])
+    if not columns:
+        return pd.DataFrame()
+    return pd.concat(columns, axis=1, join="outer").sort_index().ffill()
+
+
+def _thin(index_size: int, points: Optional[int]) -> np.ndarray:
+    if not points or points >= index_size:
+        return np.arange(index_size)
+    return np.unique(np.linspace(0, index_size - 1, points).round().astype(np.int64))
+
+
+def compare_equity_curves(
+    curves: Dict[str, List[dict]],
+    baseline: str,
+    metrics: Dict[str, dict],
+    points: Optional[int] = None,
+) -> dict:
+    """
+    Aligned curves plus, per run, its stored metrics and metrics relative to
+    `baseline` on the common timeline: excess total return, beta, tracking
+    error and information ratio of per-bar returns (annualized), and the
+    correlation matrix of returns. `points` thins the returned timeline
+    only; statistics use every bar.
+    """
+    aligned = align_equity_curves(curves)
+    run_ids = list(curves)
+    periods_per_year = infer_periods_per_year(aligned.index.to_numpy(dtype="datetime64[ns]"))
+    scale = math.sqrt(periods_per_year)
+
+    returns = aligned.pct_change(fill_method=None)
+    base = returns[baseline]
+    active = returns.sub(base, axis=0)
+    tracking = active.std() * scale
+    info_ratio = active.mean() / active.std() * scale
+    beta = returns.cov()[baseline] / base.var()
+    corr = returns.corr()
+
+    base_return = (metrics.get(baseline) or {}).get("totalReturn")
+    relative = {}
+    for run_id in run_ids:
+        total_return = (metrics.get(run_id) or {}).get("totalReturn")
+        relative[run_id] = {
+            "excessReturn": (
+                _finite(total_return - base_return)
+                if total_return is not None and base_return is not None
+                else None
+            ),
+            "beta": _finite(beta[run_id]),
+            "correlation": _finite(corr.at[run_id, baseline]),
+            "trackingError": _finite(tracking[run_id]),
+            "informationRatio": _finite(info_ratio[run_id]),
+        }
+
+    keep = _thin(len(aligned), points)
+    shown = aligned.iloc[keep]
+    return {
+        "runIds": run_ids,
+        "baseline": baseline,
+        "timeline": shown.index.strftime("%Y-%m-%dT%H:%M:%S").tolist(),
+        "equity": {
+            run_id: [_finite(v) for v in shown[run_id].to_numpy()]
+            for run_id in run_ids
+        },
+        "metrics": {run_id: metrics.get(run_id) or {} for run_id in run_ids},
+        "relative": relative,
+        "correlation": [[_finite(corr.at[a, b]) for b in run_ids] for a in run_ids],
+    }
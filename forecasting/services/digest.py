@@ -0,0 +1,288 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+
+from forecasting.models import BacktestRun, TradeSimRun
+
+from .artifacts import load_sim_result
+from .dataset_service import compute_sha256_bytes
+from .metrics import _finite, compute_metrics, infer_periods_per_year
+from .stages import load_price_history
+from .simulation import parse_timestamps
+
+# the digest is fixed-size whatever the backtest length
+TOP_DRAWDOWNS = 3
+MONTHLY_YEARS = 3
+YEARLY_YEARS = 10
+REGIME_WINDOW = 20
+
+
+def _ts(ts: np.ndarray, i) -> Optional[str]:
+    if i is None or np.isnat(ts[i]):
+        return None
+    return str(ts[i].astype("datetime64[s]")).replace("T", " ")
+
+
+def _round(value, digits: int = 4):
+    value = _finite(value) if value is not None else None
+    return None if value is None else round(value, digits)
+
+
+def drawdown_windows(equity: np.ndarray, ts: np.ndarray, top: int = TOP_DRAWDOWNS) -> List[dict]:
+    """
+    The `top` deepest peak-to-recovery episodes: peak, trough and recovery
+    bar (None while still under water), depth and length in bars.
+    """
+    n = equity.size
+    if n == 0:
+        return []
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, equity / peak - 1, 0.0)
+    under = dd < 0
+    starts = under & ~np.concatenate(([False], under[:-1]))
+    episode = np.cumsum(starts) * under
+    if not episode.any():
+        return []
+
+    frame = pd.DataFrame({"episode": episode[under], "bar": np.flatnonzero(under), "dd": dd[under]})
+    grouped = frame.groupby("episode")
+    first, last = grouped["bar"].min(), grouped["bar"].max()
+    trough = frame.loc[grouped["dd"].idxmin(), "bar"].to_numpy()
+    depth = grouped["dd"].min().to_numpy()
+
+    windows = []
+    for k in np.argsort(depth, kind="stable")[:top]:
+        peak_bar, end = max(int(first.iloc[k]) - 1, 0), int(last.iloc[k])
+        recovery = end + 1 if end + 1 < n else None
+        windows.append({
+            "peak": _ts(ts, peak_bar),
+            "trough": _ts(ts, int(trough[k])),
+            "recovery": _ts(ts, recovery),
+            "depth": _round(depth[k]),
+            # peak to recovery, or to the last bar while still under water
+            "bars": (recovery if recovery is not None else n - 1) - peak_bar,
+        })
+    return windows
+
+
+def _equity_series(equity: np.ndarray, ts: np.ndarray) -> pd.Series:
+    keep = ~np.isnat(ts)
+    series = pd.Series(equity[keep], index=pd.DatetimeIndex(ts[keep]))
+    return series[~series.index.duplicated(keep="last")].sort_index()
+
+
+def period_returns(equity: np.ndarray, ts: np.ndarray, initial_cash: float) -> dict:
+    """
+    Monthly returns of the last MONTHLY_YEARS years as a year x month
+    table, yearly returns of the last YEARLY_YEARS years, and a summary
+    over every month.
+    """
+    series = _equity_series(equity, ts)
+    if series.empty:
+        return {}
+    month_end = series.resample("ME").last().dropna()
+    prev = month_end.shift(1)
+    prev.iloc[0] = initial_cash
+    monthly = month_end / prev - 1
+    year_end = series.resample("YE").last().dropna()
+    prev_year = year_end.shift(1)
+    prev_year.iloc[0] = initial_cash
+    yearly = year_end / prev_year - 1
+
+    recent = monthly[monthly.index.year > monthly.index.year.max() - MONTHLY_YEARS]
+    table = {}
+    for stamp, value in recent.items():
+        table.setdefault(str(stamp.year), [None] * 12)[stamp.month - 1] = _round(value)
+    return {
+        "monthly": table,
+        "yearly": {str(stamp.year): _round(v) for stamp, v in yearly.iloc[-YEARLY_YEARS:].items()},
+        "months": int(monthly.size),
+        "positiveMonths": _round((monthly > 0).mean()),
+        "bestMonth": {"month": monthly.idxmax().strftime("%Y-%m"), "return": _round(monthly.max())},
+        "worstMonth": {"month": monthly.idxmin().strftime("%Y-%m"), "return": _round(monthly.min())},
+    }
+
+
+def _longest_run(flags: np.ndarray) -> int:
+    if not flags.any():
+        return 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.astype(np.int8), [0]))))
+    return int((edges[1::2] - edges[::2]).max())
+
+
+def trade_stats(fills: np.ndarray, position: Optional[np.ndarray], ts: np.ndarray) -> dict:
+    """
+    Round-trip statistics from a FILL_DTYPE array: win/loss sizes, payoff,
+    holding period and losing streaks, plus trading frequency.
+    """
+    stats = {"fills": int(fills.size)}
+    if position is not None and position.size:
+        stats["exposure"] = _round(np.mean(position != 0))
+    valid = ts[~np.isnat(ts)]
+    if valid.size > 1 and fills.size:
+        months = (valid[-1] - valid[0]) / np.timedelta64(1, "D") / 30.4375
+        stats["fillsPerMonth"] = _round(fills.size / months, 2) if months > 0 else None
+    if fills.size == 0:
+        return stats
+
+    signed = fills["side"] * fills["qty"]
+    cash_flow = -signed * fills["price"] - fills["commission"]
+    flat_after = np.isclose(np.cumsum(signed), 0.0)
+    closed = int(flat_after.sum())
+    stats["roundTrips"] = closed
+    if closed == 0:
+        return stats
+
+    trip = np.concatenate(([0], np.cumsum(flat_after)[:-1]))
+    in_trip = trip < closed
+    pnl = np.bincount(trip[in_trip], weights=cash_flow[in_trip], minlength=closed)
+    opened = np.full(closed, np.iinfo(np.int64).max)
+    np.minimum.at(opened, trip[in_trip], fills["bar"][in_trip])
+    holding = fills["bar"][flat_after] - opened
+
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    stats.update({
+        "winRate": _round((pnl > 0).mean()),
+        "avgWin": _round(wins.mean(), 2) if wins.size else None,
+        "avgLoss": _round(losses.mean(), 2) if losses.size else None,
+        "payoffRatio": _round(wins.mean() / -losses.mean(), 3) if wins.size and losses.size else None,
+        "profitFactor": _round(wins.sum() / -losses.sum(), 3) if losses.size else None,
+        "largestWin": _round(pnl.max(), 2),
+        "largestLoss": _round(pnl.min(), 2),
+        "avgHoldingBars": _round(holding.mean(), 1),
+        "maxConsecutiveLosses": _longest_run(pnl < 0),
+    })
+    return stats
+
+
+def regime_segments(prices: pd.Series, equity: pd.Series, window: int = REGIME_WINDOW) -> List[dict]:
+    """
+    Splits the market into up/down trend x high/low volatility regimes
+    (trailing `window`-bar return sign; rolling volatility above or below
+    its median) and reports, per regime, its share of bars, how many
+    separate stretches it had, and the market's and the strategy's
+    compounded return inside it.
+    """
+    frame = pd.concat({"price": prices, "equity": equity}, axis=1, join="inner").dropna()
+    if len(frame) <= window + 1:
+        return []
+    market = frame["price"].pct_change()
+    strategy = frame["equity"].pct_change()
+    trend = np.where(frame["price"].pct_change(window) >= 0, "up", "down")
+    vol = market.rolling(window).std()
+    level = np.where(vol > vol.median(), "high-vol", "low-vol")
+    label = pd.Series([f"{t}/{v}" for t, v in zip(trend, level)], index=frame.index)
+    ready = vol.notna() & market.notna()
+    label, market, strategy = label[ready], market[ready], strategy[ready]
+
+    stretches = (label != label.shift()).cumsum()
+    grouped = pd.DataFrame({
+        "label": label,
+        "stretch": stretches,
+        "market": np.log1p(market),
+        "strategy": np.log1p(strategy),
+    }).groupby("label")
+    rows = []
+    for name, g in grouped:
+        rows.append({
+            "regime": name,
+            "share": _round(len(g) / len(label), 3),
+            "stretches": int(g["stretch"].nunique()),
+            "marketReturn": _round(np.expm1(g["market"].sum())),
+            "strategyReturn": _round(np.expm1(g["strategy"].sum())),
+        })
+    return sorted(rows, key=lambda r: -r["share"])
+
+
+def backtest_digest(
+    equity: np.ndarray,
+    ts: np.ndarray,
+    initial_cash: float,
+    fills: Optional[np.ndarray] = None,
+    position: Optional[np.ndarray] = None,
+    prices: Optional[pd.Series] = None,
+) -> dict:
+    """
+    A fixed-size summary of a backtest for LLM prompts: headline metrics
+    recomputed from the arrays, the deepest drawdowns, monthly/yearly
+    returns, trade statistics (with fills) and market regimes (with the
+    price series).
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    ts = np.asarray(ts, dtype="datetime64[ns]")
+    metrics = compute_metrics(equity, initial_cash, fills, position, infer_periods_per_year(ts))
+    digest = {
+        "bars": int(equity.size),
+        "start": _ts(ts, 0) if ts.size else None,
+        "end": _ts(ts, -1) if ts.size else None,
+        "metrics": {k: _round(v) if isinstance(v, float) else v for k, v in metrics.items()},
+        "drawdowns": drawdown_windows(equity, ts),
+        "returns": period_returns(equity, ts, initial_cash),
+    }
+    if fills is not None:
+        digest["trades"] = trade_stats(fills, position, ts)
+    if prices is not None:
+        digest["regimes"] = regime_segments(prices, _equity_series(equity, ts))
+    return digest
+
+
+def _digest_inputs(bt: BacktestRun, output: dict) -> dict:
+    """
+    The stored arrays behind a backtest: the simulation artifact when the
+    run has one, else the equity curve of its output. Prices come from the
+    dataset version.
+    """
+    inputs = {}
+    sim_run = (
+        TradeSimRun.objects.filter(trade_sim_run_id=bt.trade_sim_run_id).first() if bt.trade_sim_run_id else None
+    )
+    if sim_run and sim_run.output_uri and sim_run.output_uri.endswith(".npz") and Path(sim_run.output_uri).exists():
+        sim, timestamps, _ = load_sim_result(sim_run.output_uri)
+        inputs.update(
+            equity=sim.equity,
+            ts=parse_timestamps(timestamps),
+            initial_cash=sim.initial_cash,
+            fills=sim.fills,
+            position=sim.position,
+        )
+    else:
+        curve = output.get("equityCurve") or []
+        inputs.update(
+            equity=np.array([np.nan if p.get("equity") is None else p["equity"] for p in curve], dtype=np.float64),
+            ts=parse_timestamps(p.get("timestamp") for p in curve),
+            initial_cash=float((bt.account_config_json or {}).get("initialCash", 100000)),
+        )
+
+    processed_uri = bt.dataset_version.processed_uri
+    if processed_uri and Path(processed_uri).exists():
+        df_hist, price_col = load_price_history(processed_uri)
+        ts = parse_timestamps(df_hist["timestamp"])
+        keep = ~np.isnat(ts)
+        prices = pd.Series(df_hist[price_col].to_numpy(dtype=np.float64)[keep], index=pd.DatetimeIndex(ts[keep]))
+        inputs["prices"] = prices[~prices.index.duplicated(keep="last")].sort_index()
+    return inputs
+
+
+def load_backtest_digest(bt: BacktestRun) -> Optional[dict]:
+    """
+    backtest_digest for a finished run, cached under the run and the exact
+    artifact it summarizes. None when the run has no output yet.
+    """
+    if not bt.output_uri or not Path(bt.output_uri).exists():
+        return None
+    raw = Path(bt.output_uri).read_bytes()
+    key = "backtest_digest:" + hashlib.sha256(json.dumps(
+        [bt.tenant_id, bt.backtest_run_id, bt.trade_sim_run_id, compute_sha256_bytes(raw)]
+    ).encode("utf-8")).hexdigest()
+    digest = cache.get(key)
+    if digest is None:
+        digest = backtest_digest(**_digest_inputs(bt, json.loads(raw.decode("utf-8"))))
+        cache.set(key, digest, settings.BACKTEST_DIGEST_CACHE_SECONDS)
+    return digest
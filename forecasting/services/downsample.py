@@ -0,0 +1,112 @@
+from typing import Optional
+
+import numpy as np
+
+from .simulation import parse_timestamps
+
+MIN_POINTS = 3
+
+
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets over evenly spaced points: keeps the first
+    and last point and, per bucket, the point forming the largest triangle
+    with the previously kept point and the next bucket's average. Peaks and
+    troughs survive, unlike plain striding.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[0]
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64)
+    # n_out - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1 : n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1 : n - 1], edges[:-1] - 1) / counts
+    # the bucket after the last one is the final point
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def parse_curve_query(params) -> dict:
+    """
+    Reads ?points=N&from=&to= from the query string. Raises ValueError on
+    bad input.
+    """
+    points = params.get("points")
+    if points not in (None, ""):
+        try:
+            points = int(points)
+        except ValueError:
+            raise ValueError("points must be an integer")
+        if points < MIN_POINTS:
+            raise ValueError(f"points must be >= {MIN_POINTS}")
+    else:
+        points = None
+
+    bounds = {}
+    for key in ("from", "to"):
+        value = params.get(key) or None
+        if value is not None and np.isnat(parse_timestamps([value])[0]):
+            raise ValueError(f"{key} must be a timestamp")
+        bounds[key] = value
+    return {"points": points, "from": bounds["from"], "to": bounds["to"]}
+
+
+def curve_indices(
+    timestamps,
+    equity: np.ndarray,
+    points: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Indices of the points kept when an equity curve is restricted to
+    [start, end] and thinned to at most `points` entries with LTTB on the
+    equity values. Works on the arrays, so callers only build the kept
+    points.
+    """
+    idx = np.arange(len(equity))
+    if start or end:
+        ts = parse_timestamps(timestamps)
+        keep = ~np.isnat(ts)
+        if start:
+            keep &= ts >= parse_timestamps([start])[0]
+        if end:
+            keep &= ts <= parse_timestamps([end])[0]
+        idx = np.flatnonzero(keep)
+
+    if points is None or len(idx) <= points:
+        return idx
+    return idx[lttb_indices(np.asarray(equity, dtype=np.float64)[idx], points)]
+
+
+def downsample_equity_curve(
+    curve: list,
+    points: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> list:
+    """
+    Restricts an equityCurve list to [start, end] and thins it to at most
+    `points` entries with LTTB on the equity values.
+    """
+    if not (start or end) and (points is None or len(curve) <= points):
+        return curve
+    timestamps = [p.get("timestamp") for p in curve]
+    equity = np.fromiter((p.get("equity") or 0.0 for p in curve), dtype=np.float64, count=len(curve))
+    return [curve[i] for i in curve_indices(timestamps, equity, points, start, end).tolist()]
@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_EXECUTION_MODEL = "NEXT_BAR_CLOSE"
+
+
+@dataclass
+class ExecutionPlan:
+    """
+    Everything the simulation core needs to price fills, as per-bar arrays:
+      - lag: bars between the decision bar and the fill bar
+      - buy_price / sell_price: price per share when buying / selling on a bar
+      - commission(qty, price): vectorized commission per fill
+    """
+    lag: int
+    buy_price: np.ndarray
+    sell_price: np.ndarray
+    commission: Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+# fill timing -------------------------------------------------------------
+# Each model returns (lag, base fill price per bar). The price is indexed by
+# the fill bar, i.e. decision bar + lag.
+
+def same_bar_close(close: np.ndarray, open_: Optional[np.ndarray]):
+    return 0, close
+
+
+def next_bar_close(close: np.ndarray, open_: Optional[np.ndarray]):
+    return 1, close
+
+
+def next_bar_open(close: np.ndarray, open_: Optional[np.ndarray]):
+    if open_ is None:
+        # no open column: the previous close is the best proxy for the open
+        open_ = np.concatenate(([np.nan], close[:-1]))
+    return 1, open_
+
+
+EXECUTION_MODELS: Dict[str, Callable] = {
+    "SAME_BAR_CLOSE": same_bar_close,
+    "NEXT_BAR_CLOSE": next_bar_close,
+    "NEXT_BAR_OPEN": next_bar_open,
+}
+
+
+# slippage ----------------------------------------------------------------
+# Each model returns a per-bar fraction of price paid on buys and given up
+# on sells.
+
+def fixed_slippage(close: np.ndarray, cfg: dict) -> np.ndarray:
+    return np.full(close.shape[0], float(cfg.get("bps", 0.0)) / 10000.0)
+
+
+def volatility_slippage(close: np.ndarray, cfg: dict) -> np.ndarray:
+    """
+    multiplier x rolling std of log returns over `window` bars (only past
+    bars, so no look-ahead). Bars before the window fills use bps as floor.
+    """
+    window = int(cfg.get("window", 20))
+    multiplier = float(cfg.get("multiplier", 1.0))
+    floor = float(cfg.get("bps", 0.0)) / 10000.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ret = np.diff(np.log(close), prepend=np.nan)
+    vol = pd.Series(log_ret).rolling(window, min_periods=2).std().shift(1).to_numpy()
+    return np.maximum(np.nan_to_num(multiplier * vol, nan=0.0), floor)
+
+
+SLIPPAGE_MODELS: Dict[str, Callable] = {
+    "none": lambda close, cfg: np.zeros(close.shape[0]),
+    "fixed": fixed_slippage,
+    "volatility": volatility_slippage,
+}
+
+
+# commission --------------------------------------------------------------
+
+def no_commission(qty, price):
+    return np.zeros(np.shape(qty))
+
+
+def build_commission(cfg: dict) -> Callable:
+    per_share = float(cfg.get("perShare", 0.0))
+    bps = float(cfg.get("bps", 0.0)) / 10000.0
+    minimum = float(cfg.get("minimum", 0.0))
+    if not (per_share or bps or minimum):
+        return no_commission
+
+    def commission(qty, price):
+        qty = np.abs(qty)
+        fee = per_share * qty + bps * qty * price
+        return np.where(qty > 0, np.maximum(fee, minimum), 0.0)
+
+    return commission
+
+
+def register_execution_model(name: str, model: Callable) -> None:
+    EXECUTION_MODELS[name] = model
+
+
+def register_slippage_model(name: str, model: Callable) -> None:
+    SLIPPAGE_MODELS[name] = model
+
+
+def validate_execution_config(model_name: str, cfg: dict) -> None:
+    if model_name not in EXECUTION_MODELS:
+        raise ValueError(f"execution model must be one of {sorted(EXECUTION_MODELS)}")
+    slippage = (cfg or {}).get("slippage") or {}
+    if slippage.get("model", "fixed") not in SLIPPAGE_MODELS:
+        raise ValueError(f"slippage model must be one of {sorted(SLIPPAGE_MODELS)}")
+
+
+def build_execution_plan(
+    model_name: Optional[str],
+    cfg: Optional[dict],
+    close: np.ndarray,
+    open_: Optional[np.ndarray] = None,
+) -> ExecutionPlan:
+    """
+    execution config keys:
+      - slippage: {"model": "fixed", "bps": 5}
+                  {"model": "volatility", "multiplier": 0.5, "window": 20, "bps": 1}
+      - commission: {"perShare": 0.005, "bps": 1, "minimum": 1}
+    """
+    cfg = cfg or {}
+    model_name = model_name or DEFAULT_EXECUTION_MODEL
+    validate_execution_config(model_name, cfg)
+
+    close = np.asarray(close, dtype=np.float64)
+    if open_ is not None:
+        open_ = np.asarray(open_, dtype=np.float64)
+
+    lag, base = EXECUTION_MODELS[model_name](close, open_)
+    slippage_cfg = cfg.get("slippage") or {}
+    slip = SLIPPAGE_MODELS[slippage_cfg.get("model", "fixed")](close, slippage_cfg)
+
+    return ExecutionPlan(
+        lag=lag,
+        buy_price=base * (1 + slip),
+        sell_price=base * (1 - slip),
+        commission=build_commission(cfg.get("commission") or {}),
+    )
@@ -0,0 +1,28 @@
+from datetime import timedelta
+from typing import Sequence
+
+from django.utils import timezone
+
+MODEL_ARTIFACT_VERSION = "ma-baseline:v0.1"
+
+
+def ma_forecast(series: Sequence[float], window: int) -> float:
+    """
+    The baseline's point forecast: mean of the last `window` points.
+    """
+    if len(series) < window:
+        raise ValueError(f"not enough data points: have={len(series)}, need window={window}")
+    return sum(series[-window:]) / window
+
+
+def build_ma_forecast(series: Sequence[float], window: int, horizon: int) -> dict:
+    """
+    Forecast artifact payload: the mean of the last `window` points,
+    repeated for `horizon` days from today.
+    """
+    ma = ma_forecast(series, window)
+
+    start_date = timezone.now().date()
+    preds = [{"timestamp": (start_date + timedelta(days=i+1)).isoformat(), "yhat": round(float(ma), 4)} for i in range(horizon)]
+
+    return {"predictions": preds, "metrics": {"rmse": None}, "modelArtifactVersion": MODEL_ARTIFACT_VERSION}
@@ -0,0 +1,115 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_LEASE_SECONDS = 30
+CLAIM_BATCH = 10
+
+
+class LeaseLost(Exception):
+    """
+    The row's lease passed to another worker while this one was still
+    writing to it.
+    """
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def claimable(now=None) -> Q:
+    now = now or timezone.now()
+    return Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+
+
+def try_claim(model, pk, owner: str, statuses: Iterable[str], lease_seconds: int = DEFAULT_LEASE_SECONDS):
+    """
+    Leases row `pk` if it is still in one of `statuses` and unheld; the
+    compare-and-set UPDATE decides races. Returns the row or None.
+    """
+    now = timezone.now()
+    claimed = model.objects.filter(claimable(now), id=pk, status__in=list(statuses)).update(
+        lease_owner=owner,
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+    )
+    return model.objects.get(id=pk) if claimed else None
+
+
+def renew_lease(model, pk, owner: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """
+    Extends a lease still held by `owner`. False means it was lost.
+    """
+    return bool(
+        model.objects.filter(id=pk, lease_owner=owner).update(
+            lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+        )
+    )
+
+
+def release_lease(model, pk, owner: str, delay_seconds: float = 0) -> None:
+    """
+    Gives the row back. With delay_seconds the row stays unclaimable for
+    that long, so a run that is only waiting on another worker is not
+    picked straight up again.
+    """
+    expires = timezone.now() + timedelta(seconds=delay_seconds) if delay_seconds else None
+    model.objects.filter(id=pk, lease_owner=owner).update(lease_owner=None, lease_expires_at=expires)
+
+
+def save_leased(obj, update_fields: Iterable[str]) -> None:
+    """
+    obj.save(update_fields=...) fenced on the lease obj was loaded with:
+    the UPDATE only matches while lease_owner is unchanged, so a worker
+    whose lease expired and was taken over cannot overwrite the new
+    holder's progress. Raises LeaseLost when nothing matched.
+    """
+    updated = type(obj).objects.filter(pk=obj.pk, lease_owner=obj.lease_owner).update(
+        **{name: getattr(obj, name) for name in update_fields}
+    )
+    if not updated:
+        raise LeaseLost(f"{type(obj).__name__} {obj.pk} is no longer leased to {obj.lease_owner}")
+
+
+class LeaseHeartbeat:
+    """
+    Renews a lease from a background thread while the block runs:
+
+        with LeaseHeartbeat(BacktestRun, bt.id, owner, 30) as hb:
+            ...
+            if hb.lost.is_set(): ...
+    """
+
+    def __init__(self, model, pk, owner: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.model = model
+        self.pk = pk
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                close_old_connections()
+                if not renew_lease(self.model, self.pk, self.owner, self.lease_seconds):
+                    self.lost.set()
+                    return
+        finally:
+            connection.close()
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.pk}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
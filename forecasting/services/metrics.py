@@ -0,0 +1,149 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_PERIODS_PER_YEAR = 252
+_SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+
+def _finite(value) -> Optional[float]:
+    """
+    JSON has no inf/NaN; undefined ratios are reported as None.
+    """
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def infer_periods_per_year(bar_ts: Optional[np.ndarray]) -> float:
+    """
+    Bars per year from the median spacing of the bar timestamps
+    (datetime64). Falls back to 252 when there is nothing to infer from.
+    """
+    if bar_ts is None:
+        return DEFAULT_PERIODS_PER_YEAR
+    ts = np.asarray(bar_ts, dtype="datetime64[ns]")
+    ts = ts[~np.isnat(ts)]
+    if ts.size < 2:
+        return DEFAULT_PERIODS_PER_YEAR
+    step = np.median(np.diff(ts.view(np.int64))) / 1e9
+    if step <= 0:
+        return DEFAULT_PERIODS_PER_YEAR
+    return _SECONDS_PER_YEAR / step
+
+
+def drawdown_stats(equity: np.ndarray):
+    """
+    (max drawdown, longest stretch in bars spent below a previous peak).
+    """
+    if equity.size == 0:
+        return 0.0, 0
+    n = equity.shape[0]
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, equity / peak - 1, 0.0)
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, np.arange(n), 0))
+    return float(min(dd.min(), 0.0)), int((np.arange(n) - last_peak).max())
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    return drawdown_stats(equity)[0]
+
+
+def round_trip_pnl(fills: np.ndarray) -> np.ndarray:
+    """
+    Net PnL of each closed round trip (flat -> position -> flat), from a
+    FILL_DTYPE array. A trailing open position is not counted.
+    """
+    if fills.size == 0:
+        return np.zeros(0)
+    signed_qty = fills["side"] * fills["qty"]
+    cash_flow = -signed_qty * fills["price"] - fills["commission"]
+    flat_after = np.isclose(np.cumsum(signed_qty), 0.0)
+    closed = int(flat_after.sum())
+    if closed == 0:
+        return np.zeros(0)
+    trip = np.concatenate(([0], np.cumsum(flat_after)[:-1]))
+    return np.bincount(trip, weights=cash_flow)[:closed]
+
+
+def compute_metrics(
+    equity: np.ndarray,
+    initial_cash: float,
+    fills: Optional[np.ndarray] = None,
+    position: Optional[np.ndarray] = None,
+    periods_per_year: float = DEFAULT_PERIODS_PER_YEAR,
+) -> dict:
+    """
+    Performance metrics from the per-bar equity curve and, when given, the
+    fills (FILL_DTYPE) and per-bar position. Returns are per bar,
+    annualized with periods_per_year; the risk-free rate is taken as 0.
+
+      - totalReturn, annualizedReturn, volatility
+      - sharpe, sortino, calmar
+      - maxDrawdown, maxDrawdownDuration (bars)
+      - finalEquity, tradeCount, roundTrips, winRate, profitFactor
+      - exposure (share of bars holding a position)
+      - turnover (traded notional / average equity)
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    initial_cash = float(initial_cash)
+    final_equity = float(equity[-1]) if equity.size else initial_cash
+
+    total_return = final_equity / initial_cash - 1 if initial_cash else 0.0
+    years = equity.size / periods_per_year if periods_per_year else 0.0
+    if years > 0 and initial_cash and final_equity > 0:
+        annualized_return = (final_equity / initial_cash) ** (1 / years) - 1
+    else:
+        annualized_return = float("nan")
+
+    prev = np.concatenate(([initial_cash], equity[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(prev != 0, equity / prev - 1, 0.0)
+
+    scale = math.sqrt(periods_per_year)
+    if returns.size > 1:
+        mean = returns.mean()
+        std = returns.std(ddof=1)
+        downside = math.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    else:
+        mean, std, downside = 0.0, 0.0, 0.0
+    volatility = std * scale
+    sharpe = mean / std * scale if std > 0 else float("nan")
+    sortino = mean / downside * scale if downside > 0 else float("nan")
+
+    max_dd, max_dd_duration = drawdown_stats(equity)
+    calmar = annualized_return / -max_dd if max_dd < 0 else float("nan")
+
+    metrics = {
+        "totalReturn": total_return,
+        "annualizedReturn": _finite(annualized_return),
+        "volatility": _finite(volatility),
+        "sharpe": _finite(sharpe),
+        "sortino": _finite(sortino),
+        "calmar": _finite(calmar),
+        "maxDrawdown": max_dd,
+        "maxDrawdownDuration": max_dd_duration,
+        "finalEquity": final_equity,
+    }
+
+    if fills is not None:
+        pnl = round_trip_pnl(fills)
+        gross_profit = pnl[pnl > 0].sum()
+        gross_loss = -pnl[pnl < 0].sum()
+        avg_equity = equity.mean() if equity.size else initial_cash
+        metrics.update({
+            "tradeCount": int(fills.size),
+            "roundTrips": int(pnl.size),
+            "winRate": float((pnl > 0).mean()) if pnl.size else None,
+            "profitFactor": _finite(gross_profit / gross_loss) if gross_loss > 0 else None,
+            "turnover": _finite(
+                (fills["qty"] * fills["price"]).sum() / avg_equity if avg_equity else float("nan")
+            ),
+        })
+
+    if position is not None:
+        metrics["exposure"] = float(np.mean(position != 0)) if position.size else 0.0
+
+    return metrics
+
@@ -0,0 +1,125 @@
+from pathlib import Path
+from typing import List, Optional
+
+from forecasting.models import (
+    BacktestMode,
+    BacktestRun,
+    BacktestStage,
+    BacktestStatus,
+    ForecastJob,
+    SignalRun,
+    TradeSimRun,
+)
+
+
+STAGE_BY_STATUS = {
+    BacktestStatus.CREATED: BacktestStage.FORECAST,
+    BacktestStatus.FORECAST_PENDING: BacktestStage.FORECAST,
+    BacktestStatus.FORECAST_DONE: BacktestStage.SIGNAL,
+    BacktestStatus.SIGNAL_PENDING: BacktestStage.SIGNAL,
+    BacktestStatus.SIGNAL_DONE: BacktestStage.SIMULATION,
+    BacktestStatus.SIM_PENDING: BacktestStage.SIMULATION,
+    BacktestStatus.SIM_DONE: BacktestStage.METRICS,
+    BacktestStatus.METRICS_DONE: BacktestStage.REPORT,
+}
+# the status a run is put back to in order to (re)run a stage
+STAGE_START = {
+    BacktestStage.FORECAST: BacktestStatus.CREATED,
+    BacktestStage.SIGNAL: BacktestStatus.FORECAST_DONE,
+    BacktestStage.SIMULATION: BacktestStatus.SIGNAL_DONE,
+    BacktestStage.METRICS: BacktestStatus.SIM_DONE,
+    BacktestStage.REPORT: BacktestStatus.METRICS_DONE,
+}
+STAGE_ORDER = list(STAGE_START)
+
+
+def stage_of(bt: BacktestRun) -> str:
+    """
+    The stage a step of `bt` was working on. Single-step modes run every
+    stage from CREATED; the stage outputs they recorded so far tell which
+    one was reached.
+    """
+    if bt.status == BacktestStatus.CREATED and bt.mode != BacktestMode.STAGED:
+        if bt.output_uri:
+            return BacktestStage.REPORT
+        if bt.trade_sim_run_id:
+            return BacktestStage.SIMULATION
+        if bt.signal_run_id:
+            return BacktestStage.SIGNAL
+    return STAGE_BY_STATUS.get(bt.status, BacktestStage.FORECAST)
+
+
+def completed_stages(bt: BacktestRun) -> List[str]:
+    """
+    Leading stages whose outputs are recorded on the run and still usable.
+    """
+    if bt.mode == BacktestMode.WALK_FORWARD:
+        return []
+    checks = [
+        (BacktestStage.FORECAST, ForecastJob, "forecast_job_id", bt.forecast_job_id),
+        (BacktestStage.SIGNAL, SignalRun, "signal_run_id", bt.signal_run_id),
+        (BacktestStage.SIMULATION, TradeSimRun, "trade_sim_run_id", bt.trade_sim_run_id),
+    ]
+    done = []
+    for stage, model, id_field, record_id in checks:
+        row = model.objects.filter(tenant_id=bt.tenant_id, **{id_field: record_id}).first() if record_id else None
+        if not (row and row.status == "SUCCEEDED" and row.output_uri and Path(row.output_uri).exists()):
+            return done
+        done.append(stage)
+    if bt.output_uri and Path(bt.output_uri).exists():
+        done.append(BacktestStage.METRICS)
+    return done
+
+
+def redrive_backtest(bt: BacktestRun, from_stage: Optional[str] = None) -> str:
+    """
+    Puts a FAILED run back in the queue at `from_stage`, by default the
+    first stage without a recorded output. Outputs of earlier stages are
+    kept; those of from_stage onwards are dropped. Retry counters start
+    over. Returns the stage the run resumes at; raises ValueError when the
+    stages before from_stage have no usable output.
+    """
+    done = completed_stages(bt)
+    if from_stage is None:
+        from_stage = STAGE_ORDER[min(len(done), len(STAGE_ORDER) - 1)]
+    if from_stage not in STAGE_START:
+        raise ValueError(f"unknown stage {from_stage!r}, expected one of {STAGE_ORDER}")
+    needed = STAGE_ORDER[: STAGE_ORDER.index(from_stage)]
+    missing = [stage for stage in needed if stage not in done]
+    if missing:
+        raise ValueError(f"cannot redrive from {from_stage}: no usable {missing[0]} output")
+
+    start = STAGE_ORDER.index(from_stage)
+    if start <= STAGE_ORDER.index(BacktestStage.FORECAST):
+        bt.forecast_job_id = None
+    if start <= STAGE_ORDER.index(BacktestStage.SIGNAL):
+        bt.signal_run_id = None
+    if start <= STAGE_ORDER.index(BacktestStage.SIMULATION):
+        bt.trade_sim_run_id = None
+    if start <= STAGE_ORDER.index(BacktestStage.METRICS):
+        bt.output_uri = bt.output_checksum = None
+    bt.report_uri = None
+
+    bt.status = STAGE_START[from_stage]
+    bt.failed_stage = None
+    bt.stage_attempts_json = {}
+    bt.next_attempt_at = None
+    bt.last_error = None
+    bt.finished_at = None
+    bt.save(
+        update_fields=[
+            "forecast_job_id",
+            "signal_run_id",
+            "trade_sim_run_id",
+            "output_uri",
+            "output_checksum",
+            "report_uri",
+            "status",
+            "failed_stage",
+            "stage_attempts_json",
+            "next_attempt_at",
+            "last_error",
+            "finished_at",
+        ]
+    )
+    return from_stage
@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from forecasting.models import BacktestRun, BacktestStatus, Report
+
+from .artifacts import backtest_curve_path, write_backtest_curve, write_bytes_atomic
+from .dataset_service import compute_sha256_bytes
+
+
+def build_backtest_report_markdown(bt: BacktestRun, metrics: dict) -> str:
+    return f"""# Backtest Report
+
+## Run Summary
+- BacktestRunId: {bt.backtest_run_id}
+- DatasetVersionId: {bt.dataset_version.dataset_version_id}
+- StrategyId: {bt.strategy.strategy_id}
+- Forecast Config: {bt.forecast_config_snapshot_json}
+- Account Config: {bt.account_config_json}
+- Execution Config: {bt.execution_config_json}
+
+## Metrics
+- totalReturn: {metrics.get("totalReturn")}
+- maxDrawdown: {metrics.get("maxDrawdown")}
+- sharpe: {metrics.get("sharpe")}
+- sortino: {metrics.get("sortino")}
+- winRate: {metrics.get("winRate")}
+- profitFactor: {metrics.get("profitFactor")}
+- finalEquity: {metrics.get("finalEquity")}
+- tradeCount: {metrics.get("tradeCount")}
+
+## Interpretation
+- This is a template-generated report for this lesson.
+- Next step: replace this section with richer analysis/LLM output.
+"""
+
+
+def write_backtest_output(bt: BacktestRun, metrics: dict, equity_curve: list, extra: Optional[dict] = None) -> None:
+    """
+    Writes the result artifact, and its equity curve as arrays next to it
+    (backtest_curve_path), and sets bt.metrics_json, output_uri and
+    output_checksum (sha256 of the JSON result); the caller saves them.
+    """
+    result = {
+        "backtestRunId": bt.backtest_run_id,
+        "status": BacktestStatus.METRICS_DONE,
+        "forecastJobId": bt.forecast_job_id,
+        "signalRunId": bt.signal_run_id,
+        "tradeSimRunId": bt.trade_sim_run_id,
+        "metrics": metrics,
+        "equityCurve": equity_curve,
+        "reportUri": bt.report_uri,
+        **(extra or {}),
+    }
+
+    out_path = Path(settings.ARTIFACT_DIR) / bt.tenant_id / "backtests" / f"{bt.backtest_run_id}.json"
+    data = json.dumps(result, ensure_ascii=False, indent=2).encode("utf-8")
+    write_backtest_curve(backtest_curve_path(out_path), result)
+    write_bytes_atomic(out_path, data)
+
+    bt.metrics_json = metrics
+    bt.output_uri = str(out_path)
+    bt.output_checksum = compute_sha256_bytes(data)
+
+
+def write_backtest_report(bt: BacktestRun) -> None:
+    reports_dir = Path(settings.ARTIFACT_DIR) / bt.tenant_id / "reports"
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    report_path = reports_dir / f"{bt.backtest_run_id}.md"
+    report_path.write_text(
+        build_backtest_report_markdown(bt, bt.metrics_json or {}),
+        encoding="utf-8",
+    )
+
+    Report.objects.create(
+        report_id=Report.new_report_id(),
+        tenant_id=bt.tenant_id,
+        source_type="BACKTEST",
+        source_id=bt.backtest_run_id,
+        format="MARKDOWN",
+        uri=str(report_path),
+    )
+    bt.report_uri = str(report_path)
@@ -0,0 +1,96 @@
+import builtins
+import importlib
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+# bad input or missing rows: retrying cannot help
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, ObjectDoesNotExist)
+
+
+class StageFailed(Exception):
+    """
+    A stage row (ForecastJob / SignalRun / TradeSimRun) ended FAILED. A
+    retry re-runs the stage from `rewind_to`, the run's last completed
+    status. `cause` is the exception class the stage recorded (see
+    recorded_exception), None when unknown.
+    """
+
+    def __init__(self, message: str, rewind_to: str, cause: Optional[type] = None):
+        super().__init__(message)
+        self.rewind_to = rewind_to
+        self.cause = cause
+
+
+def _resolve(name: str) -> Optional[type]:
+    if "." not in name:
+        found = getattr(builtins, name, None)
+    else:
+        # "pkg.module.Class.Inner": the longest importable module prefix
+        parts = name.split(".")
+        found = None
+        for i in range(len(parts) - 1, 0, -1):
+            try:
+                found = importlib.import_module(".".join(parts[:i]))
+            except ImportError:
+                continue
+            for attr in parts[i:]:
+                found = getattr(found, attr, None)
+            break
+    return found if isinstance(found, type) and issubclass(found, BaseException) else None
+
+
+def recorded_exception(error_message: Optional[str]) -> Optional[type]:
+    """
+    The exception class behind a stage row's error_message, which is a
+    traceback or "ExceptionName: message": its last line's name resolved
+    to a class. A bare "DoesNotExist" (a model's) maps to
+    ObjectDoesNotExist. None when the name cannot be resolved.
+    """
+    lines = [line for line in (error_message or "").strip().splitlines() if line.strip()]
+    if not lines:
+        return None
+    name = lines[-1].split(":", 1)[0].strip()
+    if not name.replace(".", "").replace("_", "").isalnum():
+        return None
+    if name == "DoesNotExist":
+        return ObjectDoesNotExist
+    return _resolve(name)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 2.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+
+    def delay(self, attempt: int, rng: Optional[random.Random] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (1-based): exponential
+        backoff capped at max_delay, with equal jitter so retries of runs
+        that failed together spread out but never fire immediately.
+        """
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return ceiling / 2 + (rng or random).uniform(0, ceiling / 2)
+
+
+def retry_policy(stage: str) -> RetryPolicy:
+    """
+    settings.BACKTEST_RETRY_POLICIES[stage], falling back to its "default".
+    """
+    policies = settings.BACKTEST_RETRY_POLICIES
+    return RetryPolicy(**policies.get(stage, policies.get("default", {})))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Permanent errors are not retried. A failed stage is classified by the
+    exception it recorded; one whose cause is unknown is retried.
+    """
+    if isinstance(exc, StageFailed):
+        return exc.cause is None or not issubclass(exc.cause, PERMANENT_ERRORS)
+    return not isinstance(exc, PERMANENT_ERRORS)
@@ -0,0 +1,317 @@
+import math
+from dataclasses import dataclass, fields
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .execution_models import ExecutionPlan, no_commission
+
+RULE_STOP_LOSS = "STOP_LOSS"
+RULE_TAKE_PROFIT = "TAKE_PROFIT"
+RULE_MAX_DAILY_LOSS = "MAX_DAILY_LOSS"
+RULE_DRAWDOWN_KILL = "DRAWDOWN_KILL_SWITCH"
+
+# camelCase keys accepted in risk_rules_json -> RiskRules attribute
+RISK_RULE_KEYS = {
+    "stopLossPct": "stop_loss_pct",
+    "takeProfitPct": "take_profit_pct",
+    "maxPositionShares": "max_position_shares",
+    "maxPositionNotional": "max_position_notional",
+    "maxGrossExposure": "max_gross_exposure",
+    "maxDailyLossPct": "max_daily_loss_pct",
+    "maxDrawdownPct": "max_drawdown_pct",
+}
+
+
+@dataclass
+class RiskRules:
+    """
+    All thresholds are positive numbers; None disables a rule.
+      - stop_loss_pct / take_profit_pct: vs. average entry price
+      - max_position_shares / max_position_notional: cap on the long position
+      - max_gross_exposure: position value / equity, checked when adding
+      - max_daily_loss_pct: vs. equity at the start of the day; flattens and
+        blocks new entries until the next day
+      - max_drawdown_pct: vs. peak equity; flattens and stops trading
+    """
+    stop_loss_pct: Optional[float] = None
+    take_profit_pct: Optional[float] = None
+    max_position_shares: Optional[float] = None
+    max_position_notional: Optional[float] = None
+    max_gross_exposure: Optional[float] = None
+    max_daily_loss_pct: Optional[float] = None
+    max_drawdown_pct: Optional[float] = None
+
+    @classmethod
+    def from_json(cls, data: Optional[dict]) -> "RiskRules":
+        data = data or {}
+        unknown = set(data) - set(RISK_RULE_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown risk rules: {sorted(unknown)}")
+
+        kwargs = {}
+        for key, attr in RISK_RULE_KEYS.items():
+            value = data.get(key)
+            if value is None:
+                continue
+            value = float(value)
+            if not value > 0:
+                raise ValueError(f"{key} must be > 0")
+            kwargs[attr] = value
+        return cls(**kwargs)
+
+    @property
+    def enabled(self) -> bool:
+        return any(getattr(self, f.name) is not None for f in fields(self))
+
+    @property
+    def needs_event_loop(self) -> bool:
+        return any(
+            v is not None
+            for v in (
+                self.stop_loss_pct,
+                self.take_profit_pct,
+                self.max_gross_exposure,
+                self.max_daily_loss_pct,
+                self.max_drawdown_pct,
+            )
+        )
+
+
+def clip_targets(target: np.ndarray, buy_price: np.ndarray, rules: RiskRules) -> np.ndarray:
+    """
+    Vectorized pre-pass for the position caps. They do not depend on the
+    path, so they apply to every target at once.
+    """
+    cap = np.full(target.shape[0], np.inf)
+    if rules.max_position_shares is not None:
+        cap = np.minimum(cap, rules.max_position_shares)
+    if rules.max_position_notional is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cap = np.minimum(cap, np.floor(rules.max_position_notional / buy_price))
+    return np.where(np.isnan(target), target, np.minimum(target, np.nan_to_num(cap, nan=0.0)))
+
+
+# holding segments up to this many bars are scanned in plain Python; numpy
+# call overhead dominates below that
+_SHORT_SEGMENT = 16
+
+
+class _RiskState:
+    """
+    O(1) state per rule: average entry (stop-loss / take-profit), peak
+    equity (kill switch), halt flag and blocked day (daily loss).
+    """
+
+    def __init__(self, initial_cash: float):
+        self.cash = float(initial_cash)
+        self.position = 0.0
+        self.avg_cost = 0.0
+        self.peak = float(initial_cash)
+        self.halted = False
+        self.blocked_day = None
+
+
+def apply_risk_rules(
+    prices: np.ndarray,
+    target: np.ndarray,
+    initial_cash: float,
+    plan: ExecutionPlan,
+    rules: RiskRules,
+    day_ids: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, List[dict]]:
+    """
+    Returns (adjusted target, risk events). The adjusted target is fed to the
+    regular vectorized core, which then reproduces the same fills.
+
+    Walks the bars where the target changes. Between two such bars the
+    position is constant, so each holding segment is scanned for the first
+    bar that breaches a rule (vectorized for long segments); forced exits
+    fill according to the execution plan (decision bar + lag).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    n = prices.shape[0]
+    target = clip_targets(np.asarray(target, dtype=np.float64), plan.buy_price, rules)
+    if not rules.needs_event_loop or n == 0:
+        return target, []
+
+    # marked at the last valid price, like the core
+    valid_px = prices > 0
+    mark = prices
+    if not valid_px.all():
+        idx = np.where(valid_px, np.arange(n), 0)
+        np.maximum.accumulate(idx, out=idx)
+        mark = prices[idx]
+        mark[: np.argmax(valid_px) if valid_px.any() else n] = 0.0
+    tradable = valid_px & (plan.buy_price > 0) & (plan.sell_price > 0)
+
+    # first bar of each bar's day; the day opens at the equity of the bar
+    # before it. equity_hist[i + 1] is the equity at the close of bar i.
+    if day_ids is None:
+        day_ids = np.zeros(n, dtype=np.int64)
+    new_day = np.concatenate(([True], day_ids[1:] != day_ids[:-1]))
+    day_first = np.maximum.accumulate(np.where(new_day, np.arange(n), 0))
+    equity_hist = np.empty(n + 1)
+    equity_hist[0] = float(initial_cash)
+
+    state = _RiskState(initial_cash)
+    adjusted = np.full(n, np.nan)
+    events: List[dict] = []
+    commission = None if plan.commission is no_commission else plan.commission
+    lag = plan.lag
+
+    stop_loss = rules.stop_loss_pct
+    take_profit = rules.take_profit_pct
+    daily_loss = rules.max_daily_loss_pct
+    drawdown = rules.max_drawdown_pct
+    gross = rules.max_gross_exposure
+
+    # per-event values as Python scalars; the loop below runs once per event
+    ev = np.flatnonzero(~np.isnan(target) & tradable)
+    event_bars = ev.tolist()
+    event_target = target[ev].tolist()
+    event_mark = mark[ev].tolist()
+    event_buy = plan.buy_price[ev].tolist()
+    event_sell = plan.sell_price[ev].tolist()
+    event_day = day_ids[ev].tolist()
+
+    def trade_to(bar: int, desired: float, buy_px: float, sell_px: float) -> None:
+        delta = desired - state.position
+        adjusted[bar] = desired
+        if delta == 0:
+            return
+        px = buy_px if delta > 0 else sell_px
+        if delta > 0:
+            state.avg_cost = (state.avg_cost * state.position + delta * px) / desired
+        elif desired == 0:
+            state.avg_cost = 0.0
+        state.cash -= delta * px
+        if commission:
+            state.cash -= float(commission(abs(delta), px))
+        state.position = desired
+
+    def scan_bars(a: int, b: int) -> Optional[Tuple[int, str]]:
+        position, cash, peak = state.position, state.cash, state.peak
+        stop_px = state.avg_cost * (1 - stop_loss) if stop_loss is not None else None
+        take_px = state.avg_cost * (1 + take_profit) if take_profit is not None else None
+        firsts = day_first[a:b].tolist() if daily_loss is not None else None
+        hist = []
+        for j, px in enumerate(mark[a:b].tolist()):
+            equity = cash + position * px
+            hist.append(equity)
+            if equity > peak:
+                peak = equity
+            rule = None
+            if stop_px is not None and px <= stop_px:
+                rule = RULE_STOP_LOSS
+            elif take_px is not None and px >= take_px:
+                rule = RULE_TAKE_PROFIT
+            elif daily_loss is not None:
+                first = firsts[j]
+                opening = hist[first - a - 1] if first > a else equity_hist[first]
+                if equity <= opening * (1 - daily_loss):
+                    rule = RULE_MAX_DAILY_LOSS
+            if rule is None and drawdown is not None and equity <= peak * (1 - drawdown):
+                rule = RULE_DRAWDOWN_KILL
+            if rule is not None:
+                equity_hist[a + 1 : a + j + 2] = hist
+                state.peak = peak
+                return a + j, rule
+        equity_hist[a + 1 : b + 1] = hist
+        state.peak = peak
+        return None
+
+    def scan(a: int, b: int) -> Optional[Tuple[int, str]]:
+        """
+        Holds the current position over bars [a, b) and returns the first
+        breach as (bar, rule), or None.
+        """
+        if state.position == 0:
+            equity_hist[a + 1 : b + 1] = state.cash
+            state.peak = max(state.peak, state.cash)
+            return None
+        if b - a <= _SHORT_SEGMENT:
+            return scan_bars(a, b)
+
+        px = mark[a:b]
+        equity = state.cash + state.position * px
+        equity_hist[a + 1 : b + 1] = equity
+        peak = np.maximum(np.maximum.accumulate(equity), state.peak)
+
+        checks = []
+        if stop_loss is not None:
+            checks.append((px <= state.avg_cost * (1 - stop_loss), RULE_STOP_LOSS))
+        if take_profit is not None:
+            checks.append((px >= state.avg_cost * (1 + take_profit), RULE_TAKE_PROFIT))
+        if daily_loss is not None:
+            opening = equity_hist[day_first[a:b]]
+            checks.append((equity <= opening * (1 - daily_loss), RULE_MAX_DAILY_LOSS))
+        if drawdown is not None:
+            checks.append((equity <= peak * (1 - drawdown), RULE_DRAWDOWN_KILL))
+
+        breach = np.logical_or.reduce([mask for mask, _ in checks])
+        if not breach.any():
+            state.peak = float(peak[-1])
+            return None
+        k = int(np.argmax(breach))
+        state.peak = float(peak[k])
+        return a + k, next(name for mask, name in checks if mask[k])
+
+    i = 0
+    cursor = 0
+    n_events = len(event_bars)
+    while cursor < n:
+        next_event = event_bars[i] if i < n_events else n
+
+        if next_event > cursor:
+            hit = scan(cursor, next_event)
+            if hit is not None:
+                bar, rule = hit
+                fill_bar = bar + lag
+                while fill_bar < n and not tradable[fill_bar]:
+                    fill_bar += 1
+                # a forced exit supersedes signals decided before it fills
+                while i < n_events and event_bars[i] < fill_bar:
+                    i += 1
+                # the position is still held until the exit fills
+                held_until = min(fill_bar, n)
+                equity_hist[bar + 2 : held_until + 1] = state.cash + state.position * mark[bar + 1 : held_until]
+
+                if rule == RULE_DRAWDOWN_KILL:
+                    state.halted = True
+                elif rule == RULE_MAX_DAILY_LOSS:
+                    state.blocked_day = int(day_ids[bar])
+                events.append({
+                    "bar": bar,
+                    "fillBar": fill_bar if fill_bar < n else None,
+                    "rule": rule,
+                })
+                if fill_bar >= n:
+                    break
+                trade_to(fill_bar, 0.0, 0.0, float(plan.sell_price[fill_bar]))
+                if state.halted:
+                    break
+                # the exit bar may also carry a new target
+                cursor = fill_bar
+                if i < n_events and event_bars[i] == fill_bar:
+                    continue
+                scan(fill_bar, fill_bar + 1)
+                cursor = fill_bar + 1
+                continue
+
+        if next_event >= n:
+            break
+
+        bar = next_event
+        desired = event_target[i]
+        if state.blocked_day is not None and event_day[i] == state.blocked_day:
+            desired = min(desired, state.position)
+        if gross is not None and desired > state.position:
+            equity = state.cash + state.position * event_mark[i]
+            cap = math.floor(gross * max(equity, 0.0) / event_buy[i])
+            desired = max(min(desired, cap), state.position)
+        trade_to(bar, desired, event_buy[i], event_sell[i])
+        i += 1
+        cursor = bar
+
+    return adjusted, events
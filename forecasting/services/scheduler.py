@@ -0,0 +1,148 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from forecasting.models import FairQueueState, JobPriority
+
+# scheduled strictly in this order; tenants share fairly within a class
+PRIORITY_ORDER = [JobPriority.INTERACTIVE, JobPriority.BATCH]
+QUEUE_CLOCK = ""  # FairQueueState.tenant_id of the queue's own clock
+
+
+@dataclass(frozen=True)
+class Queue:
+    """
+    What a worker polls. `pending` selects rows it may pick up, `admit`
+    the subset that starts new work (counted against the tenant's cap),
+    `running` the work a tenant has in flight. The filters are callables so
+    they can depend on the current time.
+    """
+    name: str
+    model: type
+    pending: Callable[[], Q]
+    running: Callable[[], Q]
+    admit: Optional[Callable[[], Q]] = None
+    priority_field: Optional[str] = "priority"
+
+
+def tenant_policy(queue: str, tenant_id: str) -> dict:
+    """
+    settings.TENANT_SCHEDULING[tenant_id] over its "default": the tenant's
+    weight and max_running (a number, or {queue name: number}; None is
+    unlimited).
+    """
+    cfg = settings.TENANT_SCHEDULING
+    policy = {"weight": 1.0, "max_running": None, **cfg.get("default", {}), **cfg.get(tenant_id, {})}
+    cap = policy["max_running"]
+    if isinstance(cap, dict):
+        cap = cap.get(queue)
+    return {"weight": float(policy["weight"]), "max_running": cap}
+
+
+def _clocks(queue: str, tenants) -> Dict[str, float]:
+    return dict(
+        FairQueueState.objects.filter(queue=queue, tenant_id__in=[QUEUE_CLOCK, *tenants]).values_list(
+            "tenant_id", "virtual_time"
+        )
+    )
+
+
+def candidates(queue: Queue, limit: int = 10) -> List:
+    """
+    Primary keys of up to `limit` pending rows, best first: start-time fair
+    queuing across tenants within each priority class, one row per
+    (class, tenant), the oldest. A tenant's start tag is
+    max(queue clock, its finish tag), so a tenant that sat idle does not
+    bank credit. Tenants at their max_running cap only get rows that
+    continue work already admitted.
+    """
+    pending = queue.model.objects.filter(queue.pending())
+    prio = queue.priority_field
+    backlog = list(
+        pending.values_list("tenant_id", prio).distinct()
+        if prio
+        else pending.values_list("tenant_id").distinct()
+    )
+    if not backlog:
+        return []
+
+    tenants = {row[0] for row in backlog}
+    running = dict(
+        queue.model.objects.filter(queue.running(), tenant_id__in=tenants)
+        .values("tenant_id")
+        .annotate(n=Count("id"))
+        .values_list("tenant_id", "n")
+    )
+    clocks = _clocks(queue.name, tenants)
+    now = clocks.get(QUEUE_CLOCK, 0.0)
+
+    def start_tag(tenant_id: str) -> float:
+        return max(now, clocks.get(tenant_id, now))
+
+    picks = []
+    classes = PRIORITY_ORDER if prio else [None]
+    for cls in classes:
+        members = sorted(
+            (t for t, *c in backlog if not prio or c[0] == cls),
+            key=lambda t: (start_tag(t), t),
+        )
+        for tenant_id in members:
+            qs = pending.filter(tenant_id=tenant_id)
+            if prio:
+                qs = qs.filter(**{prio: cls})
+            cap = tenant_policy(queue.name, tenant_id)["max_running"]
+            if cap is not None and running.get(tenant_id, 0) >= cap:
+                if queue.admit is None:
+                    continue
+                qs = qs.exclude(queue.admit())
+            pk = qs.order_by("created_at").values_list("pk", flat=True).first()
+            if pk is not None:
+                picks.append(pk)
+            if len(picks) >= limit:
+                return picks
+    return picks
+
+
+def charge(queue: Queue, tenant_id: str, cost: float = 1.0) -> None:
+    """
+    Records that a row of `tenant_id` was dispatched: the queue clock moves
+    to the tenant's start tag and the tenant's finish tag advances by
+    cost / weight.
+    """
+    weight = tenant_policy(queue.name, tenant_id)["weight"]
+    with transaction.atomic():
+        clock, _ = FairQueueState.objects.select_for_update().get_or_create(queue=queue.name, tenant_id=QUEUE_CLOCK)
+        state, _ = FairQueueState.objects.select_for_update().get_or_create(
+            queue=queue.name, tenant_id=tenant_id, defaults={"virtual_time": clock.virtual_time}
+        )
+        start = max(clock.virtual_time, state.virtual_time)
+        clock.virtual_time = start
+        state.virtual_time = start + cost / weight
+        clock.save(update_fields=["virtual_time", "updated_at"])
+        state.save(update_fields=["virtual_time", "updated_at"])
+
+
+def next_candidate(queue: Queue):
+    """
+    The row the queue should serve next, or None. Not claimed: the worker
+    claims it its usual way and then calls charge().
+    """
+    picks = candidates(queue, limit=1)
+    return queue.model.objects.filter(pk=picks[0]).first() if picks else None
+
+
+def claim(queue: Queue, try_claim: Callable[[object], object], limit: int = 10):
+    """
+    Walks candidates() best first until try_claim(pk) returns a row (i.e.
+    won the race for it), charges its tenant and returns it. None when
+    every candidate was taken by someone else or nothing is pending.
+    """
+    for pk in candidates(queue, limit):
+        row = try_claim(pk)
+        if row is not None:
+            charge(queue, row.tenant_id)
+            return row
+    return None
@@ -0,0 +1,103 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def load_signal_inputs(forecast_uri: str, processed_uri: str) -> Tuple[List[str], np.ndarray, float]:
+    """
+    Loads what every strategy needs from a forecast: prediction timestamps,
+    yhat values and the last observed price. Done once per signal run.
+    """
+    with open(forecast_uri, "r", encoding="utf-8") as f:
+        forecast_payload = json.load(f)
+    return signal_inputs(forecast_payload, pd.read_csv(processed_uri))
+
+
+def signal_inputs(forecast_payload: dict, df_processed: pd.DataFrame) -> Tuple[List[str], np.ndarray, float]:
+    """
+    load_signal_inputs for a forecast payload and price history already in
+    memory.
+    """
+    preds = forecast_payload.get("predictions", [])
+    if not preds:
+        raise ValueError("Forecast artifact has no predictions")
+
+    if "target" not in df_processed.columns:
+        raise ValueError("processed.csv missing 'target' column")
+    last_price = float(df_processed["target"].dropna().iloc[-1])
+
+    timestamps = [r.get("timestamp") for r in preds]
+    yhat = np.array([float(r.get("yhat")) for r in preds], dtype=np.float64)
+    return timestamps, yhat, last_price
+
+
+def evaluate_strategies(
+    yhat: np.ndarray, last_price: float, specs: List[Dict[str, Any]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Threshold strategies evaluated for all (prediction, strategy) pairs at once.
+    Returns (actions, reasons), both shaped (len(yhat), len(specs)).
+    """
+    buy_pct = np.array([float(s.get("buyAbovePct", 0.0)) for s in specs], dtype=np.float64)
+    sell_pct = np.array([float(s.get("sellBelowPct", 0.0)) for s in specs], dtype=np.float64)
+
+    y = np.asarray(yhat, dtype=np.float64)[:, None]
+    is_buy = y >= last_price * (1 + buy_pct)[None, :]
+    is_sell = ~is_buy & (y <= last_price * (1 - sell_pct)[None, :])
+
+    actions = np.where(is_buy, "BUY", np.where(is_sell, "SELL", "HOLD"))
+    reasons = np.where(
+        is_buy, "threshold_up", np.where(is_sell, "threshold_down", "within_band")
+    )
+    return actions, reasons
+
+
+def build_signal_list(timestamps: List[str], actions: np.ndarray, reasons: np.ndarray) -> List[dict]:
+    return [
+        {"timestamp": ts, "action": str(a), "reason": str(r)}
+        for ts, a, r in zip(timestamps, actions, reasons)
+    ]
+
+
+def build_signal_matrix(
+    signal_run_id: str,
+    timestamps: List[str],
+    strategy_ids: List[str],
+    actions: np.ndarray,
+    reasons: np.ndarray,
+) -> dict:
+    """
+    Fan-out artifact: one row per timestamp, one column per strategy.
+    """
+    return {
+        "signalRunId": signal_run_id,
+        "strategyIds": list(strategy_ids),
+        "timestamps": list(timestamps),
+        "actions": actions.tolist(),
+        "reasons": reasons.tolist(),
+    }
+
+
+def select_signal_column(payload: dict, strategy_id: Optional[str] = None) -> List[dict]:
+    """
+    Returns the signal list a simulation should consume. Single-strategy
+    artifacts are returned as-is; matrix artifacts need a strategy column
+    (defaults to the first one).
+    """
+    if "signals" in payload:
+        return payload["signals"]
+
+    strategy_ids = payload.get("strategyIds", [])
+    if not strategy_ids:
+        raise ValueError("Signal artifact has no strategy columns")
+    if strategy_id is None:
+        strategy_id = strategy_ids[0]
+    if strategy_id not in strategy_ids:
+        raise ValueError(f"Signal column not found: {strategy_id}")
+
+    j = strategy_ids.index(strategy_id)
+    actions = np.asarray(payload.get("actions", []), dtype=object).reshape(-1, len(strategy_ids))
+    reasons = np.asarray(payload.get("reasons", []), dtype=object).reshape(-1, len(strategy_ids))
+    return build_signal_list(payload.get("timestamps", []), actions[:, j], reasons[:, j])
@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Optional
+
+from django.utils import timezone
+
+from forecasting.dedup import forecast_stage_key, signal_stage_key, sim_stage_key
+from forecasting.models import BacktestRun
+
+from .execution_models import DEFAULT_EXECUTION_MODEL
+
+
+def forecast_key_for(bt: BacktestRun) -> Optional[str]:
+    cfg = bt.forecast_config_snapshot_json or {}
+    return forecast_stage_key(
+        bt.dataset_version.checksum,
+        cfg.get("modelType", "MA"),
+        cfg.get("params", {}),
+        int(cfg.get("horizon", 10)),
+        timezone.now().date().isoformat(),
+    )
+
+
+def signal_key_for(bt: BacktestRun, forecast_key: Optional[str]) -> Optional[str]:
+    return signal_stage_key(forecast_key, bt.strategy.spec_json)
+
+
+def sim_key_for(bt: BacktestRun, signal_key: Optional[str]) -> Optional[str]:
+    execution_cfg = bt.execution_config_json or {}
+    return sim_stage_key(
+        signal_key,
+        bt.account_config_json,
+        execution_cfg.get("model", DEFAULT_EXECUTION_MODEL),
+        execution_cfg,
+        bt.risk_rules_json,
+    )
+
+
+def find_reusable(model, tenant_id: str, key_field: str, key: Optional[str], in_flight: bool = True):
+    """
+    A stage row of `model` with the same input key: the latest SUCCEEDED one
+    whose artifact is still there or, with in_flight, one still PENDING /
+    RUNNING that the caller can wait on. None when the stage must run.
+    """
+    if not key:
+        return None
+    qs = model.objects.filter(tenant_id=tenant_id, **{key_field: key})
+    done = qs.filter(status="SUCCEEDED").order_by("-id").first()
+    if done and done.output_uri and Path(done.output_uri).exists():
+        return done
+    if in_flight:
+        return qs.filter(status__in=["PENDING", "RUNNING"]).order_by("-id").first()
+    return None
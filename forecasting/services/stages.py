@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from forecasting.models import TradeSimRun
+
+from .artifacts import write_sim_artifact
+from .metrics import infer_periods_per_year
+from .simulation import (
+    SimResult,
+    action_codes,
+    align_signals_to_bars,
+    bar_days,
+    parse_timestamps,
+    simulate_signal_bars,
+    simulation_metrics,
+)
+
+
+# stages shared by run_trade_sim, the staged orchestrator and the fused
+# pipeline ---------------------------------------------------------------
+
+def load_price_history(processed_uri: str) -> Tuple[pd.DataFrame, str]:
+    df_hist = pd.read_csv(processed_uri)
+    if "timestamp" not in df_hist.columns:
+        raise ValueError("processed.csv missing 'timestamp' column")
+    price_col = "target" if "target" in df_hist.columns else "close"
+    if price_col not in df_hist.columns:
+        raise ValueError("processed.csv missing price column ('target' or 'close')")
+    return df_hist, price_col
+
+
+def simulate_signals(
+    df_hist: pd.DataFrame,
+    price_col: str,
+    signals: List[dict],
+    execution_model: str,
+    execution_cfg: dict,
+    risk_rules_json: dict,
+    initial_cash: float,
+) -> Tuple[SimResult, np.ndarray, dict]:
+    """
+    One simulation over the price history. Returns (result, bar timestamps,
+    metrics).
+    """
+    bar_timestamps = df_hist["timestamp"].astype(str).to_numpy()
+    bar_ts = parse_timestamps(bar_timestamps)
+    sim = simulate_signal_bars(
+        df_hist[price_col].to_numpy(dtype=float),
+        df_hist["open"].to_numpy(dtype=float) if "open" in df_hist.columns else None,
+        bar_days(bar_ts),
+        align_signals_to_bars(bar_timestamps, signals, execution_cfg),
+        action_codes(s.get("action") for s in signals),
+        execution_model,
+        execution_cfg,
+        risk_rules_json,
+        initial_cash,
+    )
+    metrics = simulation_metrics(sim, bar_timestamps, infer_periods_per_year(bar_ts))
+    return sim, bar_timestamps, metrics
+
+
+def store_sim_result(sim_run: TradeSimRun, sim: SimResult, bar_timestamps, metrics: dict) -> None:
+    out_path = Path(settings.ARTIFACT_DIR) / sim_run.tenant_id / "sim" / f"{sim_run.trade_sim_run_id}.npz"
+    sim_run.output_checksum = write_sim_artifact(out_path, sim, bar_timestamps, metrics)
+    sim_run.output_uri = str(out_path)
+    sim_run.metrics_json = metrics
+    sim_run.status = "SUCCEEDED"
+    sim_run.save(update_fields=["output_uri", "output_checksum", "metrics_json", "status", "updated_at"])
@@ -0,0 +1,276 @@
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .execution_models import DEFAULT_EXECUTION_MODEL
+from .forecast_service import build_ma_forecast
+from .signal_service import evaluate_strategies
+from .simulation import (
+    SimResult,
+    action_codes,
+    asof_bar_indices,
+    parse_timestamps,
+    simulate_signal_bars,
+    simulation_metrics,
+)
+
+# first segment of a grid key: which part of the backtest config it overrides
+SWEEP_ROOTS = ("forecast", "strategy", "execution", "riskRules")
+RANK_METRICS = (
+    "totalReturn",
+    "annualizedReturn",
+    "volatility",
+    "sharpe",
+    "sortino",
+    "calmar",
+    "maxDrawdown",
+    "maxDrawdownDuration",
+    "finalEquity",
+    "winRate",
+    "profitFactor",
+)
+LOWER_IS_BETTER = ("volatility", "maxDrawdownDuration")
+
+
+def validate_sweep_grid(grid) -> None:
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("grid must be a non-empty object")
+    for path, values in grid.items():
+        root, _, field = str(path).partition(".")
+        if root not in SWEEP_ROOTS or not field:
+            raise ValueError(f"grid key {path!r} must be <{'|'.join(SWEEP_ROOTS)}>.<field>")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"grid[{path!r}] must be a non-empty list")
+
+
+def count_variants(grid: dict, samples: Optional[int] = None) -> int:
+    total = math.prod(len(v) for v in grid.values())
+    return min(total, samples) if samples else total
+
+
+def expand_variants(grid: dict, samples: Optional[int] = None, seed: Optional[int] = None) -> List[dict]:
+    """
+    The grid's combinations as {key: value} overrides, in a stable order.
+    With samples, a seeded uniform sample of that many distinct
+    combinations (drawn by index, the full product is never built).
+    """
+    keys = sorted(grid)
+    sizes = [len(grid[k]) for k in keys]
+    total = math.prod(sizes)
+    if samples and samples < total:
+        indices = sorted(random.Random(seed).sample(range(total), samples))
+    else:
+        indices = range(total)
+
+    variants = []
+    for index in indices:
+        picks = {}
+        for key, size in zip(reversed(keys), reversed(sizes)):
+            index, j = divmod(index, size)
+            picks[key] = grid[key][j]
+        variants.append({k: picks[k] for k in keys})
+    return variants
+
+
+def variant_config(base: dict, overrides: dict) -> dict:
+    """
+    base ({"forecast", "strategy", "account", "execution", "riskRules"})
+    with each dotted override applied.
+    """
+    cfg = deepcopy(base)
+    for path, value in overrides.items():
+        *parents, leaf = path.split(".")
+        node = cfg
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return cfg
+
+
+def signal_tasks(
+    configs: Sequence[dict], series: List[float], last_price: float, bar_ts: np.ndarray
+) -> Tuple[list, Dict[int, str]]:
+    """
+    Forecast and signals for every variant config. Each distinct forecast
+    config is computed once and all strategy specs sharing it go through a
+    single evaluate_strategies call. Returns (simulation tasks, errors by
+    variant index) for simulate_tasks.
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, cfg in enumerate(configs):
+        fc = cfg.get("forecast") or {}
+        key = json.dumps(
+            [fc.get("modelType", "MA"), fc.get("params") or {}, fc.get("horizon", 10)], sort_keys=True
+        )
+        groups.setdefault(key, []).append(i)
+
+    tasks, errors = [], {}
+    for members in groups.values():
+        fc = configs[members[0]].get("forecast") or {}
+        try:
+            window = int((fc.get("params") or {}).get("window", 20))
+            forecast = build_ma_forecast(series, window, int(fc.get("horizon", 10)))
+            preds = forecast["predictions"]
+            sig_ts = parse_timestamps(p["timestamp"] for p in preds)
+            yhat = np.array([float(p["yhat"]) for p in preds], dtype=np.float64)
+            actions, _ = evaluate_strategies(yhat, last_price, [configs[i].get("strategy") or {} for i in members])
+        except Exception as e:
+            errors.update((i, f"{type(e).__name__}: {e}") for i in members)
+            continue
+
+        for col, i in enumerate(members):
+            cfg = configs[i]
+            execution = cfg.get("execution") or {}
+            try:
+                signal_bars = asof_bar_indices(
+                    bar_ts,
+                    sig_ts,
+                    direction=execution.get("asofDirection", "backward"),
+                    tolerance=execution.get("asofTolerance"),
+                )
+                initial_cash = float((cfg.get("account") or {}).get("initialCash", 100000))
+            except Exception as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+                continue
+            tasks.append((
+                i,
+                0,
+                len(bar_ts),
+                signal_bars,
+                action_codes(actions[:, col]),
+                execution.get("model", DEFAULT_EXECUTION_MODEL),
+                execution,
+                cfg.get("riskRules") or {},
+                initial_cash,
+            ))
+    return tasks, errors
+
+
+# process pool ------------------------------------------------------------------
+
+# per-process view of the parent's price arrays (see _attach_shared)
+_SHARED: Dict[str, Optional[np.ndarray]] = {}
+_SEGMENTS: List[shared_memory.SharedMemory] = []
+
+
+def _share_arrays(arrays: Dict[str, Optional[np.ndarray]]):
+    segments, spec = [], {}
+    for name, arr in arrays.items():
+        if arr is None:
+            spec[name] = None
+            continue
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        segments.append(shm)
+        spec[name] = (shm.name, arr.dtype.str, arr.shape)
+    return segments, spec
+
+
+def _attach_shared(spec: dict, periods_per_year: float, keep_results: bool) -> None:
+    """
+    Pool initializer: maps the parent's arrays read-only, without copying.
+    """
+    for name, entry in spec.items():
+        if entry is None:
+            _SHARED[name] = None
+            continue
+        shm_name, dtype, shape = entry
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SEGMENTS.append(shm)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _SHARED[name] = arr
+    _SHARED["periods_per_year"] = periods_per_year
+    _SHARED["keep_results"] = keep_results
+
+
+def _window(name: str, start: int, stop: int) -> Optional[np.ndarray]:
+    arr = _SHARED[name]
+    return None if arr is None else arr[start:stop]
+
+
+def _simulate_task(task) -> Tuple[int, Optional[dict], Optional[str], Optional[SimResult]]:
+    task_id, start, stop, signal_bars, codes, execution_model, execution_cfg, risk_rules, initial_cash = task
+    try:
+        sim = simulate_signal_bars(
+            _window("prices", start, stop),
+            _window("opens", start, stop),
+            _window("day_ids", start, stop),
+            signal_bars,
+            codes,
+            execution_model,
+            execution_cfg,
+            risk_rules,
+            initial_cash,
+        )
+        metrics = simulation_metrics(sim, None, _SHARED["periods_per_year"])
+        return task_id, metrics, None, sim if _SHARED["keep_results"] else None
+    except Exception as e:
+        return task_id, None, f"{type(e).__name__}: {e}", None
+
+
+def simulate_tasks(
+    arrays: Dict[str, Optional[np.ndarray]],
+    tasks: list,
+    periods_per_year: float,
+    max_workers: Optional[int] = None,
+    keep_results: bool = False,
+) -> Dict[int, Tuple[Optional[dict], Optional[str], Optional[SimResult]]]:
+    """
+    Runs independent simulations against shared price arrays ("prices",
+    "opens", "day_ids"). A task is (id, start bar, stop bar, signal bars
+    relative to start, action codes, execution model, execution config,
+    risk rules, initial cash) and simulates bars [start, stop).
+
+    With more than one worker the arrays are placed in shared memory once
+    and the tasks fanned out over a process pool; each task only carries
+    its signals and config. Returns {id: (metrics, error, result)}, with
+    result only when keep_results is set.
+    """
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        _SHARED.update(arrays, periods_per_year=periods_per_year, keep_results=keep_results)
+        try:
+            results = [_simulate_task(t) for t in tasks]
+        finally:
+            _SHARED.clear()
+    else:
+        segments, spec = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_attach_shared,
+                initargs=(spec, periods_per_year, keep_results),
+            ) as pool:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                results = list(pool.map(_simulate_task, tasks, chunksize=chunksize))
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+    return {task_id: (metrics, error, sim) for task_id, metrics, error, sim in results}
+
+
+def rank_variants(rows: List[dict], rank_by: str) -> List[dict]:
+    """
+    Sorts leaderboard rows best first on metrics[rank_by]; rows without the
+    metric (failed variants, undefined ratios) go last. Adds "rank".
+    """
+    sign = 1 if rank_by in LOWER_IS_BETTER else -1
+
+    def sort_key(row):
+        value = (row.get("metrics") or {}).get(rank_by)
+        return (value is None, 0 if value is None else sign * value, row["variantId"])
+
+    ranked = sorted(rows, key=sort_key)
+    for rank, row in enumerate(ranked, 1):
+        row["rank"] = rank
+    return ranked
@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from forecasting.models import (
+    BacktestMode,
+    BacktestRun,
+    BacktestStatus,
+    BacktestSweep,
+    JobPriority,
+    JobStatus,
+    Strategy,
+)
+
+from .metrics import infer_periods_per_year
+from .simulation import bar_days, parse_timestamps
+from .stages import load_price_history
+from .sweep import expand_variants, rank_variants, signal_tasks, simulate_tasks, variant_config
+
+
+LEADERBOARD_TOP = 10
+
+
+def _persist_variant(sweep: BacktestSweep, row: dict, cfg: dict) -> BacktestRun:
+    strategy = sweep.strategy
+    if cfg["strategy"] != (strategy.spec_json or {}):
+        strategy = Strategy.objects.create(
+            tenant_id=sweep.tenant_id,
+            name=f"{strategy.name} [{sweep.sweep_id} #{row['variantId']}]",
+            type=strategy.type,
+            spec_json=cfg["strategy"],
+        )
+    return BacktestRun.objects.create(
+        backtest_run_id=BacktestRun.new_backtest_run_id(),
+        tenant_id=sweep.tenant_id,
+        dataset_version=sweep.dataset_version,
+        strategy=strategy,
+        forecast_config_snapshot_json=cfg["forecast"],
+        account_config_json=cfg["account"],
+        execution_config_json=cfg["execution"],
+        risk_rules_json=cfg["riskRules"],
+        mode=BacktestMode.FUSED,
+        priority=JobPriority.BATCH,
+        status=BacktestStatus.CREATED,
+    )
+
+
+def run_backtest_sweep(sweep: BacktestSweep, max_workers: Optional[int] = None) -> None:
+    """
+    Evaluates every variant of a sweep and writes the ranked leaderboard to
+    <tenant>/sweeps/<sweepId>.json. The dataset is read and parsed once;
+    forecasts and signals are shared between variants that agree on them,
+    and the simulations run on a process pool over shared-memory prices.
+    No per-variant rows are written, except a FUSED BacktestRun for each of
+    the top persist_top variants.
+    """
+    processed_uri = sweep.dataset_version.processed_uri
+    if not processed_uri:
+        raise ValueError("datasetVersion missing processed_uri")
+    df_hist, price_col = load_price_history(processed_uri)
+    if "target" not in df_hist.columns:
+        raise ValueError("processed.csv missing 'target' column")
+    series = df_hist["target"].dropna().tolist()
+
+    bar_ts = parse_timestamps(df_hist["timestamp"].astype(str))
+    arrays = {
+        "prices": df_hist[price_col].to_numpy(dtype=float),
+        "opens": df_hist["open"].to_numpy(dtype=float) if "open" in df_hist.columns else None,
+        "day_ids": bar_days(bar_ts),
+    }
+
+    base = {
+        "forecast": sweep.forecast_config_json or {},
+        "strategy": sweep.strategy.spec_json or {},
+        "account": sweep.account_config_json or {},
+        "execution": sweep.execution_config_json or {},
+        "riskRules": sweep.risk_rules_json or {},
+    }
+    variants = expand_variants(sweep.grid_json, sweep.samples, sweep.seed)
+    configs = [variant_config(base, v) for v in variants]
+
+    tasks, errors = signal_tasks(configs, series, series[-1] if series else float("nan"), bar_ts)
+    results = simulate_tasks(arrays, tasks, infer_periods_per_year(bar_ts), max_workers)
+
+    rows = []
+    for i, params in enumerate(variants):
+        metrics, error, _ = results.get(i, (None, errors.get(i), None))
+        rows.append({"variantId": i, "params": params, "metrics": metrics, "error": error})
+    leaderboard = rank_variants(rows, sweep.rank_by)
+
+    for row in leaderboard[: sweep.persist_top]:
+        if row["metrics"] is not None:
+            bt = _persist_variant(sweep, row, configs[row["variantId"]])
+            row["backtestRunId"] = bt.backtest_run_id
+
+    out_dir = Path(settings.ARTIFACT_DIR) / sweep.tenant_id / "sweeps"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{sweep.sweep_id}.json"
+    out_path.write_text(
+        json.dumps(
+            {"sweepId": sweep.sweep_id, "rankBy": sweep.rank_by, "leaderboard": leaderboard},
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+
+    sweep.variant_count = len(variants)
+    sweep.leaderboard_json = leaderboard[:LEADERBOARD_TOP]
+    sweep.output_uri = str(out_path)
+    sweep.status = JobStatus.SUCCEEDED
+    sweep.finished_at = timezone.now()
+    sweep.save(update_fields=["variant_count", "leaderboard_json", "output_uri", "status", "finished_at"])
@@ -0,0 +1,92 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+from .simulation import SimResult
+
+
+class Fold(NamedTuple):
+    train_start: int
+    train_end: int
+    test_start: int
+    test_end: int
+
+
+def validate_walk_forward(cfg) -> dict:
+    """
+    {"trainBars": int, "testBars": int, "anchored": bool}. Raises ValueError.
+    """
+    if not isinstance(cfg, dict):
+        raise ValueError("walkForward must be an object")
+    unknown = set(cfg) - {"trainBars", "testBars", "anchored"}
+    if unknown:
+        raise ValueError(f"unknown walkForward keys: {sorted(unknown)}")
+    out = {}
+    for key in ("trainBars", "testBars"):
+        try:
+            out[key] = int(cfg[key])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"walkForward.{key} must be an integer")
+        if out[key] < 1:
+            raise ValueError(f"walkForward.{key} must be >= 1")
+    out["anchored"] = bool(cfg.get("anchored", False))
+    return out
+
+
+def walk_forward_folds(n_bars: int, train_bars: int, test_bars: int, anchored: bool = False) -> List[Fold]:
+    """
+    Consecutive train/test splits over [0, n_bars): fold k trains on the
+    train_bars before its test window (or on everything before it when
+    anchored) and tests on the next test_bars. Test windows tile the
+    history after the first train window; a short last window is kept.
+    """
+    folds = []
+    test_start = train_bars
+    while test_start < n_bars:
+        test_end = min(test_start + test_bars, n_bars)
+        folds.append(Fold(0 if anchored else test_start - train_bars, test_start, test_start, test_end))
+        test_start = test_end
+    return folds
+
+
+def stitch_folds(results: List[SimResult], initial_cash: float) -> SimResult:
+    """
+    Chains per-fold results (each simulated from the same initial cash)
+    into one run over the concatenated test windows. Compounding: every
+    fold is scaled by the growth of the folds before it, as if it had
+    started from the previous fold's ending equity. Fills, orders and
+    risk events are shifted to the stitched bar index.
+    """
+    equity, cash, position, orders, fills, risk_events = [], [], [], [], [], []
+    scale, offset = 1.0, 0
+    for r in results:
+        equity.append(r.equity * scale)
+        cash.append(r.cash * scale)
+        position.append(r.position * scale)
+
+        for src, dst in ((r.orders, orders), (r.fills, fills)):
+            shifted = src.copy()
+            shifted["bar"] += offset
+            shifted["qty"] *= scale
+            if "commission" in shifted.dtype.names:
+                shifted["commission"] *= scale
+            dst.append(shifted)
+        for e in r.risk_events:
+            e = dict(e, bar=e["bar"] + offset)
+            if e.get("fillBar") is not None:
+                e["fillBar"] += offset
+            risk_events.append(e)
+
+        if r.equity.size and r.initial_cash:
+            scale *= float(r.equity[-1]) / r.initial_cash
+        offset += r.equity.size
+
+    return SimResult(
+        orders=np.concatenate(orders) if orders else np.zeros(0, dtype=results[0].orders.dtype),
+        fills=np.concatenate(fills) if fills else np.zeros(0, dtype=results[0].fills.dtype),
+        position=np.concatenate(position),
+        cash=np.concatenate(cash),
+        equity=np.concatenate(equity),
+        initial_cash=float(initial_cash),
+        risk_events=risk_events,
+    )
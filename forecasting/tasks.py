@@ -2,11 +2,18 @@ import json
 import traceback
 from pathlib import Path
 
-import pandas as pd
 from celery import shared_task
 from django.conf import settings
 
-from .models import ForecastJob, SignalRun, TradeSimRun
+from .models import ForecastJob, SignalRun, Strategy, TradeSimRun
+from .services.signal_service import (
+    build_signal_list,
+    build_signal_matrix,
+    evaluate_strategies,
+    load_signal_inputs,
+    select_signal_column,
+)
+from .services.stages import load_price_history, simulate_signals, store_sim_result
 
 @shared_task
 def run_signal_job(signal_run_id):
@@ -29,45 +36,41 @@ def run_signal_job(signal_run_id):
         if not job.dataset_version or not job.dataset_version.processed_uri:
             raise ValueError("ForecastJob missing dataset_version.processed_uri")
 
-        with open(job.output_uri, "r", encoding="utf-8") as f:
-            forecast_payload = json.load(f)
-
-        preds = forecast_payload.get("predictions", [])
-        if not preds:
-            raise ValueError("Forecast artifact has no predictions")
-
-        df_processed = pd.read_csv(job.dataset_version.processed_uri)
-        if "target" not in df_processed.columns:
-            raise ValueError("processed.csv missing 'target' column")
-        last_price = float(df_processed["target"].dropna().iloc[-1])
-
-        buy_pct = sr.strategy.spec_json.get("buyAbovePct", 0.0)
-        sell_pct = sr.strategy.spec_json.get("sellBelowPct", 0.0)
-
-        signals = []
-        for r in preds:
-            ts = r.get("timestamp")
-            yhat = float(r.get("yhat"))
-            act = "HOLD"
-            reason = "within_band"
-            if yhat >= last_price * (1 + buy_pct):
-                act = "BUY"
-                reason = "threshold_up"
-            elif yhat <= last_price * (1 - sell_pct):
-                act = "SELL"
-                reason = "threshold_down"
-
-            signals.append({
-                "timestamp": ts,
-                "action": act,
-                "reason": reason
-            })
+        timestamps, yhat, last_price = load_signal_inputs(
+            job.output_uri, job.dataset_version.processed_uri
+        )
 
         out_dir = Path(settings.ARTIFACT_DIR) / sr.tenant_id / "signals"
         out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / f"{signal_run_id}.json"
+        out_path = out_dir / f"{sr.signal_run_id}.json"
+
+        if sr.strategy_ids_json:
+            # fan-out: all strategies share the inputs loaded above
+            strategies = {
+                s.strategy_id: s
+                for s in Strategy.objects.filter(
+                    tenant_id=sr.tenant_id,
+                    strategy_id__in=sr.strategy_ids_json,
+                )
+            }
+            missing = [sid for sid in sr.strategy_ids_json if sid not in strategies]
+            if missing:
+                raise ValueError(f"Strategies not found: {missing}")
+
+            specs = [strategies[sid].spec_json or {} for sid in sr.strategy_ids_json]
+            actions, reasons = evaluate_strategies(yhat, last_price, specs)
+            payload = build_signal_matrix(
+                sr.signal_run_id, timestamps, sr.strategy_ids_json, actions, reasons
+            )
+        else:
+            actions, reasons = evaluate_strategies(yhat, last_price, [sr.strategy.spec_json or {}])
+            payload = {
+                "signalRunId": sr.signal_run_id,
+                "signals": build_signal_list(timestamps, actions[:, 0], reasons[:, 0]),
+            }
+
         with open(out_path, "w", encoding="utf-8") as f:
-            json.dump({"signalRunId": signal_run_id, "signals": signals}, f, ensure_ascii=False)
+            json.dump(payload, f, ensure_ascii=False)
 
         sr.output_uri = str(out_path)
         sr.status = "SUCCEEDED"
@@ -106,86 +109,17 @@ def run_trade_sim(trade_sim_run_id):
         with open(sr.output_uri, "r", encoding="utf-8") as f:
             sig_data = json.load(f)
 
-        df_hist = pd.read_csv(job.dataset_version.processed_uri)
-        if "timestamp" not in df_hist.columns:
-            raise ValueError("processed.csv missing 'timestamp' column")
-        price_col = "target" if "target" in df_hist.columns else "close"
-        if price_col not in df_hist.columns:
-            raise ValueError("processed.csv missing price column ('target' or 'close')")
-
-        cash = float(sa.initial_cash)
-        initial_cash = cash
-        shares = 0
-
-        orders = []
-        fills = []
-        equity_curve = []
-
-        for s in sig_data.get("signals", []):
-            ts = s.get("timestamp")
-            action = s.get("action")
-
-            price_row = df_hist[df_hist["timestamp"] == ts]
-            if price_row.empty:
-                continue
-
-            price = float(price_row.iloc[0][price_col])
-            if price <= 0:
-                continue
-
-            if action == "BUY" and cash >= price:
-                qty = int((cash * 0.2) // price)
-                if qty > 0:
-                    cash -= qty * price
-                    shares += qty
-                    orders.append({"timestamp": ts, "action": "BUY", "price": price, "qty": qty})
-                    fills.append({"timestamp": ts, "fill_price": price, "filled_qty": qty})
-
-            if action == "SELL" and shares > 0:
-                qty = shares
-                cash += qty * price
-                orders.append({"timestamp": ts, "action": "SELL", "price": price, "qty": qty})
-                fills.append({"timestamp": ts, "fill_price": price, "filled_qty": qty})
-                shares = 0
-
-            equity_curve.append({"timestamp": ts, "equity": cash + shares * price})
-
-        if not equity_curve:
-            equity_curve.append({"timestamp": None, "equity": initial_cash})
-
-        final_equity = float(equity_curve[-1]["equity"])
-        total_return = (final_equity / initial_cash) - 1
-
-        peak = float(equity_curve[0]["equity"])
-        max_drawdown = 0.0
-        for point in equity_curve:
-            eq = float(point["equity"])
-            if eq > peak:
-                peak = eq
-            dd = (eq / peak) - 1 if peak > 0 else 0.0
-            if dd < max_drawdown:
-                max_drawdown = dd
-
-        result = {
-            "orders": orders,
-            "fills": fills,
-            "equityCurve": equity_curve,
-            "metrics": {
-                "totalReturn": total_return,
-                "maxDrawdown": max_drawdown,
-            },
-        }
-
-        out_dir = Path(settings.ARTIFACT_DIR) / sim_run.tenant_id / "sim"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / f"{sim_run.trade_sim_run_id}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False)
-
-        sim_run.output_uri = str(out_path)
-        sim_run.result = result
-        sim_run.status = "SUCCEEDED"
-        sim_run.save(update_fields=["output_uri", "result", "status", "updated_at"])
+        df_hist, price_col = load_price_history(job.dataset_version.processed_uri)
+        sim, bar_timestamps, metrics = simulate_signals(
+            df_hist,
+            price_col,
+            select_signal_column(sig_data, sim_run.signal_column),
+            sim_run.execution_model,
+            sim_run.execution_config_json,
+            sim_run.risk_rules_json,
+            float(sa.initial_cash),
+        )
+        store_sim_result(sim_run, sim, bar_timestamps, metrics)
 
     except Exception:
         sim_run.status = "FAILED"
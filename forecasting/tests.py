@@ -1,3 +1,1919 @@
-from django.test import TestCase
+import io
+import json
+import math
+import os
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from forecasting.dedup import forecast_stage_key, signal_stage_key, sim_stage_key
+from forecasting.management.commands.run_backtest_worker import Command as BacktestWorker
+from forecasting.management.commands.run_dataset_worker import Command as DatasetWorker
+from forecasting.management.commands.run_forecast_worker import Command as ForecastWorker
+from forecasting.management.commands.run_forecast_worker import write_ma_artifact
+from forecasting.management.commands.run_signal_worker import Command as SignalWorker
+from forecasting.management.commands.run_sim_worker import Command as SimWorker
+from forecasting.management.commands.run_sweep_worker import Command as SweepWorker
+from forecasting.models import (
+    BacktestMode,
+    BacktestRun,
+    BacktestStatus,
+    BacktestSweep,
+    Dataset,
+    DatasetVersion,
+    DatasetVersionStatus,
+    ForecastJob,
+    JobPriority,
+    JobStatus,
+    Report,
+    SignalRun,
+    SimAccount,
+    Strategy,
+    TradeSimRun,
+)
+from forecasting.services.artifacts import (
+    backtest_curve_path,
+    load_sim_payload,
+    load_sim_result,
+    write_sim_artifact,
+)
+from forecasting.services.backtest_service import run_fused_backtest
+from forecasting.services.compare import align_equity_curves
+from forecasting.services.dataset_service import compute_sha256_bytes
+from forecasting.services.digest import (
+    backtest_digest,
+    drawdown_windows,
+    load_backtest_digest,
+    period_returns,
+    trade_stats,
+)
+from forecasting.services.downsample import downsample_equity_curve, lttb_indices
+from forecasting.services.execution_models import build_execution_plan
+from forecasting.services.forecast_service import build_ma_forecast
+from forecasting.services.leases import release_lease, renew_lease, try_claim
+from forecasting.services.metrics import compute_metrics, infer_periods_per_year
+from forecasting.services.report import write_backtest_output
+from forecasting.services.retry import RetryPolicy, StageFailed, is_retryable, recorded_exception
+from forecasting.services.risk_rules import RiskRules, apply_risk_rules
+from forecasting.services.scheduler import candidates, charge, claim, next_candidate
+from forecasting.services.signal_service import build_signal_list, evaluate_strategies, signal_inputs
+from forecasting.services.simulation import (
+    FILL_DTYPE,
+    ORDER_DTYPE,
+    SIDE_BUY,
+    SIDE_SELL,
+    action_codes,
+    asof_bar_indices,
+    bar_days,
+    equity_curve_points,
+    parse_timestamps,
+    SimResult,
+    shift_to_fill_bars,
+    simulate_targets,
+    targets_from_actions,
+)
+from forecasting.services.stages import load_price_history, simulate_signals
+from forecasting.services.sweep import expand_variants, variant_config
+from forecasting.services.sweep_service import run_backtest_sweep
+from forecasting.services.walk_forward import Fold, stitch_folds, walk_forward_folds
+from forecasting.tasks import run_signal_job, run_trade_sim
+from llm.models import LLMTask
+from llm.pregeneration import enqueue_pregenerated
+
+
+@override_settings(ARTIFACT_DIR=settings.BASE_DIR / "test_artifacts")
+class ForecastingTestBase(TestCase):
+    def setUp(self):
+        self.tenant_id = "tenant_demo_1"
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer demo-key-1")
+
+        self.dataset = Dataset.objects.create(
+            dataset_id="ds_test",
+            tenant_id=self.tenant_id,
+            name="Test Dataset",
+        )
+        version_dir = Path(settings.ARTIFACT_DIR) / self.tenant_id / "datasets" / "ds_test"
+        version_dir.mkdir(parents=True, exist_ok=True)
+        self.processed_path = version_dir / "processed.csv"
+        self.write_prices([100, 101, 102, 101, 103, 104, 102, 105])
+
+        self.dataset_version = DatasetVersion.objects.create(
+            dataset_version_id="dsv_test",
+            dataset=self.dataset,
+            tenant_id=self.tenant_id,
+            raw_uri=str(self.processed_path),
+            processed_uri=str(self.processed_path),
+            checksum="sha256:test",
+            status=DatasetVersionStatus.READY,
+        )
+
+    def tearDown(self):
+        artifact_dir = settings.ARTIFACT_DIR
+        if artifact_dir.exists():
+            for path in sorted(artifact_dir.rglob("*"), reverse=True):
+                if path.is_file():
+                    path.unlink()
+                elif path.is_dir():
+                    path.rmdir()
+
+    def write_prices(self, prices, start="2026-01-01"):
+        lines = ["timestamp,target"]
+        day0 = int(start[-2:])
+        for i, p in enumerate(prices):
+            lines.append(f"{start[:-2]}{day0 + i:02d},{p}")
+        self.processed_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def write_recent_prices(self, prices, days_back=7):
+        # bars around today, so the MA forecast's dates land on them
+        today = timezone.now().date()
+        lines = ["timestamp,target"] + [
+            f"{(today + timedelta(days=i - days_back)).isoformat()},{p}" for i, p in enumerate(prices)
+        ]
+        self.processed_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def create_forecast_job(self, predictions, forecast_job_id="fc_test"):
+        out_path = self.processed_path.parent / f"{forecast_job_id}.json"
+        out_path.write_text(
+            json.dumps({"predictions": predictions, "metrics": {}, "modelArtifactVersion": "test"}),
+            encoding="utf-8",
+        )
+        return ForecastJob.objects.create(
+            forecast_job_id=forecast_job_id,
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            model_type="MA",
+            params_json={"window": 3},
+            horizon=len(predictions),
+            status=JobStatus.SUCCEEDED,
+            output_uri=str(out_path),
+        )
+
+    def create_strategy(self, strategy_id, spec):
+        return Strategy.objects.create(
+            strategy_id=strategy_id,
+            tenant_id=self.tenant_id,
+            name=strategy_id,
+            type="RULES",
+            spec_json=spec,
+        )
+
+    def sim_payload(self, sim_run):
+        return load_sim_payload(sim_run.output_uri)
+
+    def create_account(self, initial_cash=100000):
+        return SimAccount.objects.create(
+            account_id="acct_test",
+            tenant_id=self.tenant_id,
+            initial_cash=Decimal(str(initial_cash)),
+        )
+
+
+class SignalFanOutTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        # last price is 105
+        self.job = self.create_forecast_job([
+            {"timestamp": "2026-01-06", "yhat": 110.0},
+            {"timestamp": "2026-01-07", "yhat": 100.0},
+            {"timestamp": "2026-01-08", "yhat": 105.5},
+        ])
+        self.tight = self.create_strategy("strat_tight", {"buyAbovePct": 0.0, "sellBelowPct": 0.0})
+        self.wide = self.create_strategy("strat_wide", {"buyAbovePct": 0.1, "sellBelowPct": 0.1})
+
+    def test_fan_out_run_writes_one_column_per_strategy(self):
+        response = self.client.post(
+            "/api/v1/signals:run",
+            {"forecast_job_id": "fc_test", "strategy_ids": ["strat_tight", "strat_wide"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        sr = SignalRun.objects.get(signal_run_id=response.data["signalRunId"])
+        self.assertEqual(sr.strategy_ids_json, ["strat_tight", "strat_wide"])
+
+        run_signal_job(sr.signal_run_id)
+        sr.refresh_from_db()
+        self.assertEqual(sr.status, "SUCCEEDED", sr.error_message)
+
+        payload = json.loads(Path(sr.output_uri).read_text(encoding="utf-8"))
+        self.assertEqual(payload["strategyIds"], ["strat_tight", "strat_wide"])
+        self.assertEqual(payload["timestamps"], ["2026-01-06", "2026-01-07", "2026-01-08"])
+        self.assertEqual(
+            payload["actions"],
+            [["BUY", "HOLD"], ["SELL", "HOLD"], ["BUY", "HOLD"]],
+        )
+
+    def test_single_strategy_run_keeps_signal_list_format(self):
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id,
+            forecast_job_id="fc_test",
+            strategy=self.tight,
+        )
+        run_signal_job(sr.signal_run_id)
+        sr.refresh_from_db()
+        self.assertEqual(sr.status, "SUCCEEDED", sr.error_message)
+
+        payload = json.loads(Path(sr.output_uri).read_text(encoding="utf-8"))
+        self.assertEqual([s["action"] for s in payload["signals"]], ["BUY", "SELL", "BUY"])
+
+    def test_unknown_strategy_in_fan_out_is_rejected(self):
+        response = self.client.post(
+            "/api/v1/signals:run",
+            {"forecast_job_id": "fc_test", "strategy_ids": ["strat_tight", "nope"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_simulation_consumes_a_single_column(self):
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id,
+            forecast_job_id="fc_test",
+            strategy=self.tight,
+            strategy_ids_json=["strat_tight", "strat_wide"],
+        )
+        run_signal_job(sr.signal_run_id)
+        account = self.create_account()
+
+        response = self.client.post(
+            "/api/v1/sim/runs",
+            {
+                "account_id": "acct_test",
+                "signal_run_id": str(sr.signal_run_id),
+                "signal_column": "strat_wide",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        sim_run = TradeSimRun.objects.get(trade_sim_run_id=response.data["tradeSimRunId"])
+        self.assertEqual(sim_run.signal_column, "strat_wide")
+
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        # the wide band only ever holds, so nothing trades
+        self.assertEqual(self.sim_payload(sim_run)["fills"], [])
+
+        tight_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=account,
+            signal_run=sr,
+            signal_column="strat_tight",
+            execution_model="SAME_BAR_CLOSE",
+        )
+        run_trade_sim(tight_run.trade_sim_run_id)
+        tight_run.refresh_from_db()
+        self.assertEqual(len(self.sim_payload(tight_run)["fills"]), 3)
+
+    def test_simulation_rejects_unknown_column(self):
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id,
+            forecast_job_id="fc_test",
+            strategy=self.tight,
+            strategy_ids_json=["strat_tight", "strat_wide"],
+            status="SUCCEEDED",
+        )
+        self.create_account()
+
+        response = self.client.post(
+            "/api/v1/sim/runs",
+            {"account_id": "acct_test", "signal_run_id": str(sr.signal_run_id), "signal_column": "nope"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AsofAlignmentTests(ForecastingTestBase):
+    def bars(self):
+        return parse_timestamps(["2026-01-01", "2026-01-02", "2026-01-05"])
+
+    def test_backward_matches_last_bar_at_or_before_signal(self):
+        sig = parse_timestamps(["2026-01-02T15:00:00", "2026-01-04", "2025-12-31", "2026-01-05"])
+        self.assertEqual(asof_bar_indices(self.bars(), sig, tolerance="3D").tolist(), [1, 1, -1, 2])
+
+    def test_default_tolerance_is_one_bar_spacing(self):
+        # median spacing of the bars is 2 days
+        sig = parse_timestamps(["2026-01-02T15:00:00", "2026-01-04", "2026-01-06", "2026-01-07"])
+        self.assertEqual(asof_bar_indices(self.bars(), sig).tolist(), [1, -1, 2, -1])
+        self.assertEqual(asof_bar_indices(self.bars()[:1], sig[:1]).tolist(), [-1])
+
+    def test_forward_and_nearest(self):
+        sig = parse_timestamps(["2026-01-02T15:00:00", "2026-01-04", "2026-01-06"])
+        self.assertEqual(
+            asof_bar_indices(self.bars(), sig, direction="forward", tolerance="3D").tolist(), [2, 2, -1]
+        )
+        self.assertEqual(
+            asof_bar_indices(self.bars(), sig, direction="nearest", tolerance="3D").tolist(), [1, 2, 2]
+        )
+
+    def test_tolerance_rejects_far_matches(self):
+        sig = parse_timestamps(["2026-01-02T15:00:00", "2026-01-04", "not a date"])
+        self.assertEqual(
+            asof_bar_indices(self.bars(), sig, tolerance="1D").tolist(), [1, -1, -1]
+        )
+
+    def test_unsorted_bars_map_back_to_original_rows(self):
+        bars = parse_timestamps(["2026-01-05", "2026-01-01", "2026-01-02"])
+        sig = parse_timestamps(["2026-01-01T12:00:00", "2026-01-06"])
+        self.assertEqual(asof_bar_indices(bars, sig, tolerance="3D").tolist(), [1, 0])
+
+    def test_simulation_fills_near_miss_timestamps(self):
+        # intraday signal timestamps never equal the daily bar timestamps
+        self.create_forecast_job([
+            {"timestamp": "2026-01-06T10:00:00", "yhat": 110.0},
+            {"timestamp": "2026-01-07T10:00:00", "yhat": 100.0},
+        ])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=self.create_account(),
+            signal_run=sr,
+            execution_model="SAME_BAR_CLOSE",
+            execution_config_json={"asofDirection": "backward", "asofTolerance": "1D"},
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        fills = self.sim_payload(sim_run)["fills"]
+        self.assertEqual([f["timestamp"] for f in fills], ["2026-01-06", "2026-01-07"])
+        self.assertEqual([f["fill_price"] for f in fills], [104.0, 102.0])
+
+    def test_signal_past_the_last_bar_is_not_executed(self):
+        # bars end 2026-01-08; the second forecast date is beyond the data
+        self.create_forecast_job([
+            {"timestamp": "2026-01-06T10:00:00", "yhat": 110.0},
+            {"timestamp": "2026-01-09", "yhat": 100.0},
+        ])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sr.refresh_from_db()
+        actions = [s["action"] for s in json.loads(Path(sr.output_uri).read_text())["signals"]]
+        self.assertEqual(actions, ["BUY", "SELL"])
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=self.create_account(),
+            signal_run=sr,
+            execution_model="SAME_BAR_CLOSE",
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        payload = self.sim_payload(sim_run)
+        self.assertEqual([(o["timestamp"], o["action"]) for o in payload["orders"]], [("2026-01-06", "BUY")])
+        self.assertEqual([f["timestamp"] for f in payload["fills"]], ["2026-01-06"])
+
+    def test_backtest_create_validates_execution_config(self):
+        self.create_strategy("strat_exec", {})
+
+        def create(execution):
+            return self.client.post(
+                "/api/v1/backtests/",
+                {
+                    "datasetVersionId": "dsv_test",
+                    "strategyId": "strat_exec",
+                    "forecast": {"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+                    "account": {"initialCash": 10000},
+                    "execution": execution,
+                },
+                format="json",
+            )
+
+        for bad in (
+            {"model": "MAGIC_FILL"},
+            {"asofTolerance": "soon"},
+            {"asofTolerance": "-1D"},
+            {"asofDirection": "sideways"},
+            {"sizing": "allIn"},
+            {"slippage": {"model": "psychic"}},
+        ):
+            resp = create(bad)
+            self.assertEqual(resp.status_code, 400, bad)
+            self.assertIn("execution", resp.json())
+        self.assertEqual(create({"model": "SAME_BAR_CLOSE", "asofTolerance": "1D"}).status_code, 201)
+
+    def test_create_rejects_bad_asof_direction(self):
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy, status="SUCCEEDED"
+        )
+        self.create_account()
+        response = self.client.post(
+            "/api/v1/sim/runs",
+            {
+                "account_id": "acct_test",
+                "signal_run_id": str(sr.signal_run_id),
+                "execution_config": {"asofDirection": "sideways"},
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SimulationCoreTests(ForecastingTestBase):
+    def reference_loop(self, prices, actions, cash):
+        shares = 0
+        for price, action in zip(prices, actions):
+            if action == "BUY" and cash >= price:
+                qty = int((cash * 0.2) // price)
+                if qty > 0:
+                    cash -= qty * price
+                    shares += qty
+            if action == "SELL" and shares > 0:
+                cash += shares * price
+                shares = 0
+        return cash + shares * prices[-1]
+
+    def test_cash_fraction_sizing_matches_original_loop(self):
+        rng = np.random.default_rng(7)
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 500)))
+        actions = rng.choice(["BUY", "SELL", "HOLD"], 500)
+
+        target = targets_from_actions(
+            500, np.arange(500), action_codes(actions), prices, 10000.0
+        )
+        result = simulate_targets(prices, target, 10000.0)
+
+        expected = self.reference_loop(prices.tolist(), actions.tolist(), 10000.0)
+        self.assertTrue(math.isclose(result.equity[-1], expected, rel_tol=1e-9))
+
+    def test_equity_is_marked_to_market_on_every_bar(self):
+        prices = np.array([10.0, 11.0, 12.0, np.nan, 9.0])
+        target = np.array([np.nan, 5.0, np.nan, 2.0, 0.0])
+        result = simulate_targets(prices, target, 100.0)
+
+        # the NaN bar cannot trade and is marked at the last good price
+        self.assertEqual(result.position.tolist(), [0.0, 5.0, 5.0, 5.0, 0.0])
+        self.assertEqual(result.equity.tolist(), [100.0, 100.0, 105.0, 105.0, 90.0])
+        self.assertEqual(result.fills["bar"].tolist(), [1, 4])
+        self.assertEqual(result.fills["side"].tolist(), [SIDE_BUY, SIDE_SELL])
+        self.assertEqual(result.fills["qty"].tolist(), [5.0, 5.0])
+        self.assertEqual(result.orders.dtype.names, ("bar", "side", "qty", "price"))
+
+    def test_fixed_fraction_sizing_is_vectorized_and_resets_on_sell(self):
+        prices = np.array([10.0, 20.0, 10.0, 10.0])
+        codes = action_codes(["BUY", "BUY", "SELL", "BUY"])
+        target = targets_from_actions(
+            4, np.arange(4), codes, prices, 1000.0, sizing="fixedFraction", buy_fraction=0.1
+        )
+        self.assertEqual(target.tolist(), [10.0, 15.0, 0.0, 10.0])
+
+    def dict_loop(self, timestamps, prices, actions, cash):
+        # the per-signal loop the array core replaced, price lookup hoisted
+        shares, orders, equity_curve = 0, [], []
+        for ts, price, action in zip(timestamps, prices, actions):
+            if action == "BUY" and cash >= price:
+                qty = int((cash * 0.2) // price)
+                if qty > 0:
+                    cash -= qty * price
+                    shares += qty
+                    orders.append({"timestamp": ts, "action": "BUY", "price": price, "qty": qty})
+            if action == "SELL" and shares > 0:
+                cash += shares * price
+                orders.append({"timestamp": ts, "action": "SELL", "price": price, "qty": shares})
+                shares = 0
+            equity_curve.append({"timestamp": ts, "equity": cash + shares * price})
+        return equity_curve[-1]["equity"]
+
+    def price_path(self, n):
+        rng = np.random.default_rng(11)
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+        actions = rng.choice(["BUY", "SELL"], n)
+        return prices, actions, np.arange(n).astype(str).tolist()
+
+    def run_core(self, prices, codes, sizing):
+        n = len(prices)
+        target = targets_from_actions(n, np.arange(n), codes, prices, 1e5, sizing=sizing)
+        return simulate_targets(prices, target, 1e5)
+
+    def test_cash_fraction_matches_the_per_signal_loop(self):
+        prices, actions, timestamps = self.price_path(20_000)
+        expected = self.dict_loop(timestamps, prices.tolist(), actions.tolist(), 1e5)
+        result = self.run_core(prices, action_codes(actions), "cashFraction")
+        self.assertTrue(math.isclose(result.equity[-1], expected, rel_tol=1e-9))
+
+    @skipUnless(os.environ.get("RUN_BENCHMARKS"), "set RUN_BENCHMARKS=1 to time the simulation core")
+    def test_throughput_against_the_per_signal_loop(self):
+        prices, actions, timestamps = self.price_path(1_000_000)
+        codes = action_codes(actions)
+
+        def best_time(fn, repeat=3):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        loop_s = best_time(lambda: self.dict_loop(timestamps, prices.tolist(), actions.tolist(), 1e5))
+        fixed_s = best_time(lambda: self.run_core(prices, codes, "fixedFraction"))
+        cash_s = best_time(lambda: self.run_core(prices, codes, "cashFraction"))
+        print(f"\n1M bars: loop {loop_s:.2f}s, fixedFraction {fixed_s:.2f}s, cashFraction {cash_s:.2f}s")
+        self.assertLess(fixed_s, loop_s)
+        self.assertLess(cash_s, loop_s)
+
+
+class ExecutionModelTests(ForecastingTestBase):
+    prices = np.array([10.0, 11.0, 12.0, 13.0])
+
+    def run_sim(self, model, cfg=None, actions=("BUY", "HOLD", "SELL", "HOLD")):
+        plan = build_execution_plan(model, cfg or {}, self.prices)
+        fill_bars = shift_to_fill_bars(np.arange(4), plan.lag, 4)
+        target = targets_from_actions(
+            4, fill_bars, action_codes(actions), self.prices, 1000.0, plan=plan
+        )
+        return simulate_targets(self.prices, target, 1000.0, plan)
+
+    def test_same_bar_close_fills_on_the_signal_bar(self):
+        result = self.run_sim("SAME_BAR_CLOSE")
+        self.assertEqual(result.fills["bar"].tolist(), [0, 2])
+        self.assertEqual(result.fills["price"].tolist(), [10.0, 12.0])
+
+    def test_next_bar_close_fills_one_bar_later(self):
+        result = self.run_sim("NEXT_BAR_CLOSE")
+        self.assertEqual(result.fills["bar"].tolist(), [1, 3])
+        self.assertEqual(result.fills["price"].tolist(), [11.0, 13.0])
+        # orders keep the decision bar and its close
+        self.assertEqual(result.orders["bar"].tolist(), [0, 2])
+        self.assertEqual(result.orders["price"].tolist(), [10.0, 12.0])
+
+    def test_next_bar_open_without_open_column_uses_previous_close(self):
+        result = self.run_sim("NEXT_BAR_OPEN")
+        self.assertEqual(result.fills["bar"].tolist(), [1, 3])
+        self.assertEqual(result.fills["price"].tolist(), [10.0, 12.0])
+
+    def test_fixed_slippage_and_commissions_reduce_equity(self):
+        cfg = {
+            "slippage": {"model": "fixed", "bps": 100},
+            "commission": {"perShare": 0.5, "bps": 10},
+        }
+        result = self.run_sim("SAME_BAR_CLOSE", cfg)
+        # 1% slippage: buy 19 @ 10.1, sell 19 @ 11.88
+        self.assertEqual(result.fills["qty"].tolist(), [19.0, 19.0])
+        np.testing.assert_allclose(result.fills["price"], [10.1, 11.88])
+        expected_fees = [19 * 0.5 + 0.001 * 19 * 10.1, 19 * 0.5 + 0.001 * 19 * 11.88]
+        np.testing.assert_allclose(result.fills["commission"], expected_fees)
+        expected_cash = 1000.0 - 19 * 10.1 + 19 * 11.88 - sum(expected_fees)
+        self.assertAlmostEqual(result.equity[-1], expected_cash)
+
+    def test_volatility_slippage_scales_with_recent_volatility(self):
+        prices = np.concatenate([np.full(30, 100.0), 100 * np.exp(np.cumsum(np.tile([0.05, -0.05], 15)))])
+        plan = build_execution_plan(
+            "SAME_BAR_CLOSE",
+            {"slippage": {"model": "volatility", "multiplier": 1.0, "window": 10}},
+            prices,
+        )
+        slip = plan.buy_price / prices - 1
+        self.assertAlmostEqual(slip[20], 0.0)
+        self.assertGreater(slip[-1], 0.04)
+        np.testing.assert_allclose(plan.sell_price / prices - 1, -slip)
+
+    def test_sim_run_uses_its_execution_model(self):
+        self.create_forecast_job([
+            {"timestamp": "2026-01-06", "yhat": 110.0},
+            {"timestamp": "2026-01-07", "yhat": 100.0},
+        ])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=self.create_account(),
+            signal_run=sr,
+            execution_config_json={"commission": {"perShare": 1}},
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        fills = self.sim_payload(sim_run)["fills"]
+        # NEXT_BAR_CLOSE by default: decided on 01-06/01-07, filled a bar later
+        self.assertEqual([f["timestamp"] for f in fills], ["2026-01-07", "2026-01-08"])
+        self.assertEqual([f["fill_price"] for f in fills], [102.0, 105.0])
+        self.assertEqual(fills[0]["commission"], fills[0]["filled_qty"])
+
+    def test_create_rejects_unknown_execution_model(self):
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy, status="SUCCEEDED"
+        )
+        self.create_account()
+        response = self.client.post(
+            "/api/v1/sim/runs",
+            {"account_id": "acct_test", "signal_run_id": str(sr.signal_run_id), "execution_model": "VWAP"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RiskRuleTests(ForecastingTestBase):
+    def reference_loop(self, prices, target, cash, rules, days, lag):
+        """
+        Plain bar-by-bar version of the rules: returns the position per bar.
+        """
+        pos, avg, peak, last_eq = 0.0, 0.0, cash, cash
+        day, day_open = days[0], cash
+        halted, blocked, exit_bar, skip_until = False, None, None, -1
+        out = []
+        for t, px in enumerate(prices):
+            if days[t] != day:
+                day, day_open = days[t], last_eq
+            if exit_bar == t:
+                cash += pos * px
+                pos, avg, exit_bar = 0.0, 0.0, None
+            if not np.isnan(target[t]) and t >= skip_until and not halted:
+                desired = target[t]
+                if blocked == days[t]:
+                    desired = min(desired, pos)
+                if rules.max_gross_exposure and desired > pos:
+                    cap = math.floor(rules.max_gross_exposure * max(cash + pos * px, 0) / px)
+                    desired = max(min(desired, cap), pos)
+                if desired > pos:
+                    avg = (avg * pos + (desired - pos) * px) / desired
+                elif desired == 0:
+                    avg = 0.0
+                cash -= (desired - pos) * px
+                pos = desired
+            eq = cash + pos * px
+            peak = max(peak, eq)
+            if pos > 0 and exit_bar is None:
+                rule = None
+                if rules.stop_loss_pct and px <= avg * (1 - rules.stop_loss_pct):
+                    rule = "sl"
+                elif rules.take_profit_pct and px >= avg * (1 + rules.take_profit_pct):
+                    rule = "tp"
+                elif rules.max_daily_loss_pct and eq <= day_open * (1 - rules.max_daily_loss_pct):
+                    rule, blocked = "daily", days[t]
+                elif rules.max_drawdown_pct and eq <= peak * (1 - rules.max_drawdown_pct):
+                    rule, halted = "dd", True
+                if rule:
+                    exit_bar = skip_until = t + lag
+                    if lag == 0:
+                        cash += pos * px
+                        pos, avg, exit_bar = 0.0, 0.0, None
+                        peak = max(peak, cash)
+            last_eq = cash + pos * px
+            out.append(pos)
+        return out
+
+    def test_stop_loss_flattens_on_the_next_bar(self):
+        prices = np.array([100.0, 98.0, 94.0, 93.0, 99.0])
+        target = np.array([10.0, np.nan, np.nan, np.nan, np.nan])
+        plan = build_execution_plan("NEXT_BAR_CLOSE", {}, prices)
+        result = simulate_targets(prices, target, 1000.0, plan, RiskRules(stop_loss_pct=0.05))
+
+        self.assertEqual(result.position.tolist(), [10.0, 10.0, 10.0, 0.0, 0.0])
+        self.assertEqual(result.risk_events, [{"bar": 2, "fillBar": 3, "rule": "STOP_LOSS"}])
+        self.assertAlmostEqual(result.equity[-1], 1000.0 - 70.0)
+
+    def test_take_profit_and_position_caps(self):
+        prices = np.array([10.0, 10.5, 11.5, 11.0])
+        target = np.array([500.0, np.nan, np.nan, np.nan])
+        rules = RiskRules(take_profit_pct=0.1, max_position_shares=80, max_position_notional=600)
+        result = simulate_targets(prices, target, 1000.0, None, rules)
+
+        # notional cap 600 / 10 = 60 shares beats the 80 share cap
+        self.assertEqual(result.position.tolist(), [60.0, 60.0, 0.0, 0.0])
+        self.assertEqual(result.risk_events[0]["rule"], "TAKE_PROFIT")
+
+    def test_position_caps_alone_are_a_vectorized_pre_pass(self):
+        prices = np.array([10.0, 20.0])
+        target = np.array([100.0, 100.0])
+        adjusted, events = apply_risk_rules(
+            prices, target, 1e6, build_execution_plan("SAME_BAR_CLOSE", {}, prices),
+            RiskRules(max_position_notional=1000),
+        )
+        self.assertEqual(adjusted.tolist(), [100.0, 50.0])
+        self.assertEqual(events, [])
+
+    def test_gross_exposure_caps_adds_against_current_equity(self):
+        prices = np.array([10.0, 10.0, 5.0, 5.0])
+        target = np.array([100.0, np.nan, np.nan, 200.0])
+        result = simulate_targets(prices, target, 1000.0, None, RiskRules(max_gross_exposure=0.5))
+
+        # 50 shares at 10; after the drop equity is 750, so at most 75 shares
+        self.assertEqual(result.position.tolist(), [50.0, 50.0, 50.0, 75.0])
+
+    def test_daily_loss_blocks_entries_until_the_next_day(self):
+        prices = np.array([100.0, 100.0, 90.0, 90.0, 90.0, 90.0])
+        days = np.array([0, 0, 0, 0, 1, 1])
+        target = np.array([5.0, np.nan, np.nan, 5.0, np.nan, 5.0])
+        result = simulate_targets(
+            prices, target, 1000.0, None, RiskRules(max_daily_loss_pct=0.04), day_ids=days
+        )
+
+        self.assertEqual(result.position.tolist(), [5.0, 5.0, 0.0, 0.0, 0.0, 5.0])
+        self.assertEqual(result.risk_events[0]["rule"], "MAX_DAILY_LOSS")
+
+    def test_drawdown_kill_switch_stops_trading(self):
+        prices = np.array([100.0, 120.0, 100.0, 100.0, 110.0])
+        target = np.array([5.0, np.nan, np.nan, 5.0, 8.0])
+        result = simulate_targets(prices, target, 1000.0, None, RiskRules(max_drawdown_pct=0.05))
+
+        self.assertEqual(result.position.tolist(), [5.0, 5.0, 0.0, 0.0, 0.0])
+        self.assertEqual(result.risk_events[0]["rule"], "DRAWDOWN_KILL_SWITCH")
+
+    def test_rules_match_a_bar_by_bar_reference(self):
+        rng = np.random.default_rng(11)
+        n = 2000
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        target = np.where(rng.random(n) < 0.05, rng.integers(0, 40, n).astype(float), np.nan)
+        days = np.arange(n) // 8
+        rules = RiskRules(
+            stop_loss_pct=0.03,
+            take_profit_pct=0.04,
+            max_gross_exposure=1.0,
+            max_daily_loss_pct=0.02,
+            max_drawdown_pct=0.25,
+        )
+        for model, lag in (("SAME_BAR_CLOSE", 0), ("NEXT_BAR_CLOSE", 1)):
+            plan = build_execution_plan(model, {}, prices)
+            result = simulate_targets(prices, target, 5000.0, plan, rules, days)
+            expected = self.reference_loop(prices, target, 5000.0, rules, days, lag)
+            self.assertEqual(result.position.tolist(), expected, model)
+
+    def test_sim_run_applies_backtest_risk_rules(self):
+        self.write_prices([100, 101, 102, 101, 103, 90, 89, 95])
+        self.create_forecast_job([{"timestamp": "2026-01-02", "yhat": 110.0}])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=self.create_account(),
+            signal_run=sr,
+            risk_rules_json={"stopLossPct": 0.05},
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        self.assertEqual(
+            self.sim_payload(sim_run)["riskEvents"],
+            [{"timestamp": "2026-01-06", "fillTimestamp": "2026-01-07", "rule": "STOP_LOSS"}],
+        )
+        self.assertEqual(self.sim_payload(sim_run)["fills"][-1]["timestamp"], "2026-01-07")
+
+    def test_unknown_risk_rule_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RiskRules.from_json({"stopLoss": 0.05})
+        with self.assertRaises(ValueError):
+            RiskRules.from_json({"maxDrawdownPct": -0.1})
+
+    def test_bar_days_groups_intraday_bars(self):
+        days = bar_days(parse_timestamps(["2026-01-01T09:00", "2026-01-01T16:00", "2026-01-02"])).tolist()
+        self.assertEqual(days[0], days[1])
+        self.assertEqual(days[2], days[1] + 1)
+
+
+class MetricsTests(ForecastingTestBase):
+    def fills(self, rows):
+        fills = np.zeros(len(rows), dtype=FILL_DTYPE)
+        for i, (bar, side, qty, price, commission) in enumerate(rows):
+            fills[i] = (bar, side, qty, price, commission)
+        return fills
+
+    def test_returns_and_drawdown(self):
+        equity = np.array([100.0, 110.0, 99.0, 104.5, 121.0, 115.0])
+        m = compute_metrics(equity, 100.0, periods_per_year=252)
+
+        self.assertAlmostEqual(m["totalReturn"], 0.15)
+        self.assertAlmostEqual(m["maxDrawdown"], -0.1)
+        # below the 110 peak for bars 2 and 3
+        self.assertEqual(m["maxDrawdownDuration"], 2)
+        returns = equity / np.concatenate(([100.0], equity[:-1])) - 1
+        self.assertAlmostEqual(m["sharpe"], returns.mean() / returns.std(ddof=1) * math.sqrt(252))
+        self.assertAlmostEqual(m["volatility"], returns.std(ddof=1) * math.sqrt(252))
+        downside = math.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+        self.assertAlmostEqual(m["sortino"], returns.mean() / downside * math.sqrt(252))
+        self.assertAlmostEqual(m["calmar"], m["annualizedReturn"] / 0.1)
+
+    def test_round_trip_stats(self):
+        fills = self.fills([
+            (0, SIDE_BUY, 10, 10.0, 1.0),
+            (1, SIDE_SELL, 10, 12.0, 1.0),   # +18
+            (2, SIDE_BUY, 5, 10.0, 0.0),
+            (3, SIDE_BUY, 5, 11.0, 0.0),
+            (4, SIDE_SELL, 10, 9.0, 0.0),    # -15
+            (5, SIDE_BUY, 3, 10.0, 0.0),     # still open
+        ])
+        position = np.array([10, 0, 5, 10, 0, 3], dtype=float)
+        m = compute_metrics(np.full(6, 1000.0), 1000.0, fills=fills, position=position)
+
+        self.assertEqual(m["tradeCount"], 6)
+        self.assertEqual(m["roundTrips"], 2)
+        self.assertEqual(m["winRate"], 0.5)
+        self.assertAlmostEqual(m["profitFactor"], 18 / 15)
+        self.assertAlmostEqual(m["exposure"], 4 / 6)
+        self.assertAlmostEqual(m["turnover"], (100 + 120 + 50 + 55 + 90 + 30) / 1000)
+        # flat equity: ratios are undefined, reported as null
+        self.assertIsNone(m["sharpe"])
+        self.assertIsNone(m["calmar"])
+
+    def test_periods_per_year_follows_bar_spacing(self):
+        daily = parse_timestamps(["2026-01-01", "2026-01-02", "2026-01-03"])
+        hourly = parse_timestamps(["2026-01-01T10:00", "2026-01-01T11:00", "2026-01-01T12:00"])
+        self.assertAlmostEqual(infer_periods_per_year(daily), 365.25)
+        self.assertAlmostEqual(infer_periods_per_year(hourly), 365.25 * 24)
+
+    def test_sim_result_carries_full_metrics(self):
+        self.create_forecast_job([
+            {"timestamp": "2026-01-02", "yhat": 110.0},
+            {"timestamp": "2026-01-05", "yhat": 90.0},
+        ])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id, account=self.create_account(), signal_run=sr
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+
+        metrics = self.sim_payload(sim_run)["metrics"]
+        for key in ("sharpe", "sortino", "calmar", "winRate", "profitFactor", "exposure", "turnover"):
+            self.assertIn(key, metrics)
+        self.assertEqual(metrics["tradeCount"], 2)
+        self.assertEqual(metrics["roundTrips"], 1)
+        self.assertEqual(metrics["finalEquity"], self.sim_payload(sim_run)["equityCurve"][-1]["equity"])
+
+
+class EquityCurveDownsampleTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def curve(self, n):
+        equity = 1000 + np.sin(np.arange(n) / 7.0) * 50
+        equity[n // 3] = 2000.0
+        return [
+            {"timestamp": str(np.datetime64("2026-01-01") + np.timedelta64(i, "D")), "equity": float(e)}
+            for i, e in enumerate(equity)
+        ]
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        y = np.zeros(500)
+        y[123] = 10.0
+        y[321] = -10.0
+        idx = lttb_indices(y, 20)
+        self.assertEqual(len(idx), 20)
+        self.assertEqual((idx[0], idx[-1]), (0, 499))
+        self.assertIn(123, idx)
+        self.assertIn(321, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_range_then_points(self):
+        curve = self.curve(100)
+        window = downsample_equity_curve(curve, start="2026-01-11", end="2026-01-30")
+        self.assertEqual([p["timestamp"] for p in (window[0], window[-1])], ["2026-01-11", "2026-01-30"])
+        self.assertEqual(len(window), 20)
+        self.assertEqual(len(downsample_equity_curve(curve, points=10, start="2026-01-11")), 10)
+        self.assertEqual(downsample_equity_curve(curve[:5], points=10), curve[:5])
+
+    def test_backtest_result_endpoint_downsamples_and_caches(self):
+        out_path = self.processed_path.parent / "bt_test.json"
+        out_path.write_text(
+            json.dumps({"backtestRunId": "bt_test", "metrics": {}, "equityCurve": self.curve(400)}),
+            encoding="utf-8",
+        )
+        BacktestRun.objects.create(
+            backtest_run_id="bt_test",
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=self.create_strategy("strat_tight", {}),
+            status=BacktestStatus.METRICS_DONE,
+            output_uri=str(out_path),
+        )
+
+        full = self.client.get("/api/v1/backtests/bt_test/result")
+        self.assertEqual(len(full.json()["equityCurve"]), 400)
+
+        response = self.client.get("/api/v1/backtests/bt_test/result?points=50")
+        self.assertEqual(response.status_code, 200)
+        curve = response.json()["equityCurve"]
+        self.assertEqual(len(curve), 50)
+        self.assertIn(2000.0, [p["equity"] for p in curve])
+
+        # served from the cache until the artifact changes
+        with mock.patch("forecasting.views.thin_equity_curve") as thin:
+            again = self.client.get("/api/v1/backtests/bt_test/result?points=50")
+        thin.assert_not_called()
+        self.assertEqual(again.json(), response.json())
+
+        bad = self.client.get("/api/v1/backtests/bt_test/result?points=2")
+        self.assertEqual(bad.status_code, 400)
+        bad = self.client.get("/api/v1/backtests/bt_test/result?from=yesterday-ish")
+        self.assertEqual(bad.status_code, 400)
+
+    def test_backtest_result_thins_on_the_curve_arrays(self):
+        bt = BacktestRun.objects.create(
+            backtest_run_id="bt_arrays",
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=self.create_strategy("strat_arrays", {}),
+            status=BacktestStatus.METRICS_DONE,
+        )
+        curve = self.curve(400)
+        write_backtest_output(bt, {"finalEquity": 1.0}, curve)
+        bt.save()
+        self.assertTrue(backtest_curve_path(bt.output_uri).exists())
+
+        with mock.patch("forecasting.views.thin_equity_curve") as thin:
+            response = self.client.get("/api/v1/backtests/bt_arrays/result?points=50&from=2026-01-11")
+        thin.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        out = response.json()
+        self.assertEqual(out["equityCurve"], downsample_equity_curve(curve, 50, "2026-01-11"))
+        self.assertEqual(out["metrics"], {"finalEquity": 1.0})
+        self.assertEqual(out["backtestRunId"], "bt_arrays")
+
+    def test_sim_result_endpoint_accepts_range(self):
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy, status="SUCCEEDED"
+        )
+        # a JSON artifact, as written before the .npz store
+        out_path = self.processed_path.parent / "sim_legacy.json"
+        out_path.write_text(
+            json.dumps({"orders": [], "fills": [], "equityCurve": self.curve(60), "metrics": {}}),
+            encoding="utf-8",
+        )
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id,
+            account=self.create_account(),
+            signal_run=sr,
+            status="SUCCEEDED",
+            output_uri=str(out_path),
+        )
+        response = self.client.get(
+            f"/api/v1/sim/runs/{sim_run.trade_sim_run_id}/result?from=2026-01-03&to=2026-01-12&points=5"
+        )
+        self.assertEqual(response.status_code, 200)
+        curve = response.json()["equityCurve"]
+        self.assertEqual(len(curve), 5)
+        self.assertEqual((curve[0]["timestamp"], curve[-1]["timestamp"]), ("2026-01-03", "2026-01-12"))
+
+
+class SimArtifactTests(ForecastingTestBase):
+    def test_artifact_round_trip(self):
+        prices = np.array([100.0, 98.0, 94.0, 93.0, 99.0])
+        target = np.array([10.0, np.nan, np.nan, np.nan, np.nan])
+        plan = build_execution_plan("NEXT_BAR_CLOSE", {"commission": {"perShare": 1}}, prices)
+        result = simulate_targets(prices, target, 1000.0, plan, RiskRules(stop_loss_pct=0.05))
+        timestamps = [f"2026-01-0{i + 1}" for i in range(5)]
+
+        path = Path(settings.ARTIFACT_DIR) / "sim_test.npz"
+        checksum = write_sim_artifact(path, result, timestamps, {"sharpe": 1.5})
+        self.assertEqual(checksum, compute_sha256_bytes(path.read_bytes()))
+
+        loaded, loaded_ts, metrics = load_sim_result(path)
+        self.assertEqual(loaded_ts.tolist(), timestamps)
+        self.assertEqual(metrics, {"sharpe": 1.5})
+        self.assertEqual(loaded.fills.dtype, FILL_DTYPE)
+        np.testing.assert_array_equal(loaded.fills, result.fills)
+        np.testing.assert_array_equal(loaded.orders, result.orders)
+        np.testing.assert_array_equal(loaded.equity, result.equity)
+        self.assertEqual(loaded.risk_events, result.risk_events)
+
+        payload = load_sim_payload(str(path))
+        self.assertEqual(payload["riskEvents"][0]["rule"], "STOP_LOSS")
+        self.assertEqual(payload["metrics"], {"sharpe": 1.5})
+
+    def test_payload_thins_the_curve_on_the_arrays(self):
+        n = 400
+        prices = 100 + np.sin(np.arange(n) / 9.0) * 10
+        target = np.full(n, np.nan)
+        target[::50] = [10.0, 0.0] * 4
+        plan = build_execution_plan("NEXT_BAR_CLOSE", {}, prices)
+        result = simulate_targets(prices, target, 10000.0, plan, RiskRules())
+        timestamps = [str(np.datetime64("2026-01-01") + np.timedelta64(i, "D")) for i in range(n)]
+        path = Path(settings.ARTIFACT_DIR) / "sim_thin.npz"
+        write_sim_artifact(path, result, timestamps, {})
+
+        full = load_sim_payload(str(path))
+        query = {"points": 20, "from": "2026-02-01", "to": None}
+        with mock.patch(
+            "forecasting.services.simulation.equity_curve_points", wraps=equity_curve_points
+        ) as points:
+            thin = load_sim_payload(str(path), query)
+        self.assertEqual(len(points.call_args.args[2]), 20)
+        self.assertEqual(thin["equityCurve"], downsample_equity_curve(full["equityCurve"], 20, "2026-02-01"))
+        self.assertEqual(thin["fills"], full["fills"])
+
+    def test_sim_run_keeps_only_summary_in_the_row(self):
+        self.create_forecast_job([
+            {"timestamp": "2026-01-02", "yhat": 110.0},
+            {"timestamp": "2026-01-05", "yhat": 90.0},
+        ])
+        strategy = self.create_strategy("strat_tight", {})
+        sr = SignalRun.objects.create(
+            tenant_id=self.tenant_id, forecast_job_id="fc_test", strategy=strategy
+        )
+        run_signal_job(sr.signal_run_id)
+        sim_run = TradeSimRun.objects.create(
+            tenant_id=self.tenant_id, account=self.create_account(), signal_run=sr
+        )
+        run_trade_sim(sim_run.trade_sim_run_id)
+        sim_run.refresh_from_db()
+        self.assertEqual(sim_run.status, "SUCCEEDED", sim_run.error_message)
+        self.assertTrue(sim_run.output_uri.endswith(".npz"))
+        self.assertEqual(sim_run.output_checksum, compute_sha256_bytes(Path(sim_run.output_uri).read_bytes()))
+        self.assertEqual(sim_run.metrics_json["tradeCount"], 2)
+
+        detail = self.client.get(f"/api/v1/sim/runs/{sim_run.trade_sim_run_id}").json()
+        self.assertEqual(detail["metrics"], sim_run.metrics_json)
+        self.assertEqual(detail["outputChecksum"], sim_run.output_checksum)
+
+        result = self.client.get(f"/api/v1/sim/runs/{sim_run.trade_sim_run_id}/result").json()
+        self.assertEqual(len(result["equityCurve"]), 8)
+        self.assertEqual(len(result["fills"]), 2)
+        self.assertEqual(result["metrics"], sim_run.metrics_json)
+
+
+class FusedPipelineTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        self.write_recent_prices([100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100])
+
+    def create_backtest(self, mode, forecast=None, initial_cash=10000):
+        return BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=Strategy.objects.get_or_create(
+                strategy_id="strat_fused", tenant_id=self.tenant_id, defaults={"name": "s", "type": "RULES"}
+            )[0],
+            forecast_config_snapshot_json=forecast or {"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+            account_config_json={"initialCash": initial_cash},
+            execution_config_json={"asof": {"direction": "backward"}},
+            mode=mode,
+        )
+
+    def run_staged(self, bt):
+        worker = BacktestWorker(stdout=io.StringIO())
+        with mock.patch.object(run_signal_job, "delay", side_effect=run_signal_job), \
+                mock.patch.object(run_trade_sim, "delay", side_effect=run_trade_sim):
+            for _ in range(20):
+                bt.refresh_from_db()
+                if bt.status in (BacktestStatus.REPORT_DONE, BacktestStatus.FAILED):
+                    break
+                if bt.status == BacktestStatus.FORECAST_PENDING:
+                    # stands in for the forecast worker
+                    job = ForecastJob.objects.get(forecast_job_id=bt.forecast_job_id)
+                    job.output_uri = str(write_ma_artifact(job.forecast_job_id, self.processed_path, 3, job.horizon))
+                    job.status = JobStatus.SUCCEEDED
+                    job.save()
+                worker._advance_one_step(bt)
+        return bt
+
+    def test_fused_run_matches_staged_run(self):
+        staged = self.run_staged(self.create_backtest(BacktestMode.STAGED))
+        self.assertEqual(staged.status, BacktestStatus.REPORT_DONE, staged.last_error)
+
+        # compare against a from-scratch fused run, not a memoized one
+        ForecastJob.objects.update(dedup_key=None)
+        SignalRun.objects.update(stage_key=None)
+        TradeSimRun.objects.update(stage_key=None)
+
+        fused = self.create_backtest(BacktestMode.FUSED)
+        BacktestWorker(stdout=io.StringIO())._advance_one_step(fused)
+        fused.refresh_from_db()
+        self.assertEqual(fused.status, BacktestStatus.REPORT_DONE)
+        self.assertIsNotNone(fused.finished_at)
+
+        job = ForecastJob.objects.get(forecast_job_id=fused.forecast_job_id)
+        sr = SignalRun.objects.get(signal_run_id=fused.signal_run_id)
+        sim_run = TradeSimRun.objects.get(trade_sim_run_id=fused.trade_sim_run_id)
+        self.assertEqual([job.status, sr.status, sim_run.status], ["SUCCEEDED"] * 3)
+        self.assertEqual(sim_run.output_checksum, compute_sha256_bytes(Path(sim_run.output_uri).read_bytes()))
+        self.assertTrue(Report.objects.filter(source_id=fused.backtest_run_id).exists())
+
+        staged_sr = SignalRun.objects.get(signal_run_id=staged.signal_run_id)
+        signals = json.loads(Path(sr.output_uri).read_text())
+        self.assertEqual(signals["signalRunId"], sr.signal_run_id)
+        self.assertEqual(signals["signals"], json.loads(Path(staged_sr.output_uri).read_text())["signals"])
+
+        self.assertGreater(fused.metrics_json["tradeCount"], 0)
+        self.assertEqual(fused.metrics_json, staged.metrics_json)
+        staged_out = json.loads(Path(staged.output_uri).read_text())
+        fused_out = json.loads(Path(fused.output_uri).read_text())
+        self.assertEqual(fused_out["equityCurve"], staged_out["equityCurve"])
+        self.assertEqual(fused_out["tradeSimRunId"], fused.trade_sim_run_id)
+
+        detail = self.client.get(f"/api/v1/backtests/{fused.backtest_run_id}/").json()
+        self.assertEqual(detail["mode"], "FUSED")
+
+    def test_staged_run_reuses_shared_stages(self):
+        first = self.run_staged(self.create_backtest(BacktestMode.STAGED))
+        second = self.create_backtest(BacktestMode.STAGED, initial_cash=20000)
+        BacktestWorker(stdout=io.StringIO())._advance_one_step(second)
+        self.assertEqual(second.status, BacktestStatus.FORECAST_DONE)
+
+        second = self.run_staged(second)
+        self.assertEqual(second.status, BacktestStatus.REPORT_DONE, second.last_error)
+        self.assertEqual(second.forecast_job_id, first.forecast_job_id)
+        self.assertEqual(second.signal_run_id, first.signal_run_id)
+        self.assertNotEqual(second.trade_sim_run_id, first.trade_sim_run_id)
+        self.assertEqual(ForecastJob.objects.count(), 1)
+        self.assertEqual(SignalRun.objects.count(), 1)
+        self.assertNotEqual(second.metrics_json["finalEquity"], first.metrics_json["finalEquity"])
+
+    def test_metrics_done_pregenerates_opted_in_reports(self):
+        bt = self.run_staged(self.create_backtest(BacktestMode.STAGED))
+        self.assertFalse(LLMTask.objects.exists())
+
+        policy = {self.tenant_id: {"task_types": ["GENERATE_REPORT", "DIAGNOSE_RESULT"]}}
+        with override_settings(LLM_PREGENERATE=policy):
+            staged = self.run_staged(self.create_backtest(BacktestMode.STAGED))
+            fused = self.create_backtest(BacktestMode.FUSED)
+            BacktestWorker(stdout=io.StringIO())._advance_one_step(fused)
+            # idempotent when a run passes METRICS_DONE again
+            self.assertEqual(enqueue_pregenerated(staged), [])
+
+        tasks = LLMTask.objects.all()
+        self.assertEqual(
+            sorted((t.source_id, t.task_type) for t in tasks),
+            sorted((b.backtest_run_id, t) for b in (staged, fused) for t in ["DIAGNOSE_RESULT", "GENERATE_REPORT"]),
+        )
+        self.assertNotIn(bt.backtest_run_id, {t.source_id for t in tasks})
+        for t in tasks:
+            self.assertEqual((t.priority, t.status, t.prompt_template_version), ("BATCH", "PENDING", "v1"))
+            self.assertTrue(t.input_refs_json["pregenerated"])
+
+    def test_fused_run_reuses_identical_stages(self):
+        first = self.create_backtest(BacktestMode.FUSED)
+        run_fused_backtest(first)
+        second = self.create_backtest(BacktestMode.FUSED)
+        with mock.patch("forecasting.services.backtest_service.simulate_signals") as simulate:
+            run_fused_backtest(second)
+        simulate.assert_not_called()
+        self.assertEqual(
+            (second.forecast_job_id, second.signal_run_id, second.trade_sim_run_id),
+            (first.forecast_job_id, first.signal_run_id, first.trade_sim_run_id),
+        )
+        self.assertEqual(second.metrics_json, first.metrics_json)
+        self.assertEqual(
+            json.loads(Path(second.output_uri).read_text())["equityCurve"],
+            json.loads(Path(first.output_uri).read_text())["equityCurve"],
+        )
+
+    def test_stage_keys_follow_inputs(self):
+        base = forecast_stage_key("sha256:a", "MA", {"window": "3"}, 3, "2026-01-01")
+        self.assertEqual(base, forecast_stage_key("sha256:a", "MA", {"window": 3}, "3", "2026-01-01"))
+        self.assertNotEqual(base, forecast_stage_key("sha256:b", "MA", {"window": 3}, 3, "2026-01-01"))
+        self.assertNotEqual(base, forecast_stage_key("sha256:a", "MA", {"window": 3}, 3, "2026-01-02"))
+        self.assertIsNone(forecast_stage_key(None, "MA", {}, 3, "2026-01-01"))
+        self.assertEqual(signal_stage_key(base, {}), signal_stage_key(base, {"buyAbovePct": 0}))
+        self.assertNotEqual(signal_stage_key(base, {}), signal_stage_key(base, {"buyAbovePct": 0.01}))
+        sig = signal_stage_key(base, {})
+        self.assertNotEqual(
+            sim_stage_key(sig, {"initialCash": 1000}, "NEXT_BAR_CLOSE", {}, {}),
+            sim_stage_key(sig, {"initialCash": 2000}, "NEXT_BAR_CLOSE", {}, {}),
+        )
+        self.assertEqual(
+            sim_stage_key(sig, {}, "NEXT_BAR_CLOSE", {}, {"stopLossPct": None, "takeProfitPct": "0.1"}),
+            sim_stage_key(sig, {}, "NEXT_BAR_CLOSE", {}, {"takeProfitPct": 0.1}),
+        )
+
+    def test_null_risk_rules_run_like_unset_ones(self):
+        bt = self.create_backtest(BacktestMode.FUSED)
+        bt.risk_rules_json = {"stopLossPct": None}
+        bt.save(update_fields=["risk_rules_json"])
+        run_fused_backtest(bt)
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.REPORT_DONE)
+        self.assertGreater(bt.metrics_json["tradeCount"], 0)
+
+    def test_failed_stage_marks_its_record(self):
+        bt = self.create_backtest(BacktestMode.FUSED, {"params": {"window": 50}, "horizon": 3})
+        with self.assertRaises(ValueError):
+            run_fused_backtest(bt)
+        job = ForecastJob.objects.get(forecast_job_id=bt.forecast_job_id)
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIn("not enough data points", job.error_message)
+        self.assertFalse(SignalRun.objects.filter(forecast_job_id=job.forecast_job_id).exists())
+
+
+class BacktestLeaseTests(ForecastingTestBase):
+    ACTIVE = BacktestWorker.ACTIVE_STATUSES
+
+    def create_backtest(self, status=BacktestStatus.CREATED):
+        return BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=Strategy.objects.get_or_create(
+                strategy_id="strat_lease", tenant_id=self.tenant_id, defaults={"name": "s", "type": "RULES"}
+            )[0],
+            status=status,
+        )
+
+    def claim(self, owner):
+        return claim(BacktestWorker.QUEUE, lambda pk: try_claim(BacktestRun, pk, owner, self.ACTIVE))
+
+    def test_workers_claim_disjoint_runs(self):
+        first, second = self.create_backtest(), self.create_backtest()
+        a = self.claim("worker-a")
+        b = self.claim("worker-b")
+        self.assertEqual((a.id, b.id), (first.id, second.id))
+        self.assertIsNone(self.claim("worker-c"))
+
+        self.assertFalse(renew_lease(BacktestRun, a.id, "worker-b"))
+        self.assertTrue(renew_lease(BacktestRun, a.id, "worker-a"))
+
+        release_lease(BacktestRun, a.id, "worker-a")
+        self.assertEqual(self.claim("worker-c").id, first.id)
+
+    def test_expired_lease_can_be_taken_over(self):
+        bt = self.create_backtest()
+        self.claim("worker-a")
+        BacktestRun.objects.filter(id=bt.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        taken = self.claim("worker-b")
+        self.assertEqual(taken.lease_owner, "worker-b")
+        self.assertFalse(renew_lease(BacktestRun, bt.id, "worker-a"))
+
+    def test_step_is_discarded_when_the_lease_is_taken_over(self):
+        bt = self.create_backtest()
+
+        def stall_then_lose_lease(*args, **kwargs):
+            # worker-a stalls past its lease and worker-b takes the run over
+            BacktestRun.objects.filter(id=bt.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(self.claim("worker-b").id, bt.id)
+            return None
+
+        worker = BacktestWorker(stdout=io.StringIO(), stderr=io.StringIO())
+        with mock.patch(
+            "forecasting.management.commands.run_backtest_worker.find_reusable", side_effect=stall_then_lose_lease
+        ):
+            self.assertTrue(worker.process_next("worker-a"))
+
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.CREATED)
+        self.assertIsNone(bt.forecast_job_id)
+        self.assertEqual(bt.stage_attempts_json, {})
+        self.assertEqual(bt.lease_owner, "worker-b")
+        self.assertIn("step discarded", worker.stderr.getvalue())
+
+    def test_waiting_run_does_not_block_the_queue(self):
+        waiting = self.create_backtest(BacktestStatus.SIGNAL_PENDING)
+        ForecastJob.objects.create(forecast_job_id="fc_wait", tenant_id=self.tenant_id, horizon=1)
+        SignalRun.objects.create(
+            signal_run_id="sr_wait", tenant_id=self.tenant_id, forecast_job_id="fc_wait",
+            strategy=waiting.strategy, status="RUNNING",
+        )
+        BacktestRun.objects.filter(id=waiting.id).update(signal_run_id="sr_wait")
+        later = self.create_backtest()
+
+        worker = BacktestWorker(stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertTrue(worker.process_next("worker-a"))
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, BacktestStatus.SIGNAL_PENDING)
+        self.assertIsNone(waiting.lease_owner)
+        self.assertGreater(waiting.lease_expires_at, timezone.now())
+
+        # the parked run is skipped, the next one advances
+        self.assertTrue(worker.process_next("worker-a"))
+        later.refresh_from_db()
+        self.assertEqual(later.status, BacktestStatus.FORECAST_PENDING)
+        self.assertIsNone(later.lease_owner)
+        self.assertIsNone(later.lease_expires_at)
+
+
+class BacktestSweepTests(ForecastingTestBase):
+    GRID = {
+        "forecast.params.window": [2, 3],
+        "strategy.buyAbovePct": [0.0, 0.5],
+        "execution.buyFraction": [0.1, 0.5],
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.write_recent_prices([100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100, 104, 108])
+        self.create_strategy("strat_sweep", {"sellBelowPct": 0.01})
+
+    def create_sweep(self, **extra):
+        body = {
+            "datasetVersionId": "dsv_test",
+            "strategyId": "strat_sweep",
+            "forecast": {"modelType": "MA", "params": {"window": 3}, "horizon": 5},
+            "account": {"initialCash": 10000},
+            "grid": self.GRID,
+            **extra,
+        }
+        return self.client.post("/api/v1/backtests:sweep", body, format="json")
+
+    def test_grid_expansion_and_sampling(self):
+        grid = {"b.y": [3, 4, 5], "a.x": [1, 2]}
+        variants = expand_variants(grid)
+        self.assertEqual(len(variants), 6)
+        self.assertEqual(variants[0], {"a.x": 1, "b.y": 3})
+        self.assertEqual(variants[-1], {"a.x": 2, "b.y": 5})
+
+        sampled = expand_variants(grid, samples=4, seed=7)
+        self.assertEqual(sampled, expand_variants(grid, samples=4, seed=7))
+        self.assertEqual(len({json.dumps(v, sort_keys=True) for v in sampled}), 4)
+        self.assertTrue(all(v in variants for v in sampled))
+
+        cfg = variant_config({"execution": {"model": "NEXT_BAR_CLOSE"}}, {"execution.commission.perShare": 1})
+        self.assertEqual(cfg["execution"], {"model": "NEXT_BAR_CLOSE", "commission": {"perShare": 1}})
+
+    def test_sweep_ranks_variants_on_a_process_pool(self):
+        resp = self.create_sweep()
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(resp.json()["variantCount"], 8)
+        sweep = BacktestSweep.objects.get(sweep_id=resp.json()["sweepId"])
+
+        run_backtest_sweep(sweep, max_workers=2)
+        detail = self.client.get(f"/api/v1/backtests/sweeps/{sweep.sweep_id}/").json()
+        self.assertEqual(detail["status"], "SUCCEEDED")
+        board = self.client.get(f"/api/v1/backtests/sweeps/{sweep.sweep_id}/result").json()["leaderboard"]
+        self.assertEqual([r["rank"] for r in board], list(range(1, 9)))
+        self.assertEqual(detail["leaderboard"], board)
+
+        sharpes = [r["metrics"]["sharpe"] for r in board]
+        defined = [v for v in sharpes if v is not None]
+        self.assertEqual(defined, sorted(defined, reverse=True))
+        self.assertEqual(sharpes[len(defined):], [None] * (8 - len(defined)))
+        self.assertTrue(all(r["error"] is None for r in board))
+
+        # same numbers as a single backtest with the winning config
+        best = board[0]
+        df_hist, price_col = load_price_history(str(self.processed_path))
+        forecast = build_ma_forecast(df_hist["target"].tolist(), best["params"]["forecast.params.window"], 5)
+        timestamps, yhat, last_price = signal_inputs(forecast, df_hist)
+        spec = {"sellBelowPct": 0.01, "buyAbovePct": best["params"]["strategy.buyAbovePct"]}
+        actions, reasons = evaluate_strategies(yhat, last_price, [spec])
+        _, _, metrics = simulate_signals(
+            df_hist,
+            price_col,
+            build_signal_list(timestamps, actions[:, 0], reasons[:, 0]),
+            "NEXT_BAR_CLOSE",
+            {"buyFraction": best["params"]["execution.buyFraction"]},
+            {},
+            10000.0,
+        )
+        self.assertEqual(best["metrics"], metrics)
+
+        # no per-variant row chain
+        self.assertFalse(BacktestRun.objects.exists())
+        self.assertFalse(ForecastJob.objects.exists())
+        self.assertFalse(TradeSimRun.objects.exists())
+
+    def test_persist_top_creates_fused_backtests(self):
+        sweep = BacktestSweep.objects.get(sweep_id=self.create_sweep(persistTop=2).json()["sweepId"])
+        run_backtest_sweep(sweep, max_workers=1)
+        sweep.refresh_from_db()
+
+        top = sweep.leaderboard_json[0]
+        self.assertEqual(BacktestRun.objects.count(), 2)
+        bt = BacktestRun.objects.get(backtest_run_id=top["backtestRunId"])
+        self.assertEqual(bt.mode, BacktestMode.FUSED)
+        self.assertNotIn("backtestRunId", sweep.leaderboard_json[2])
+
+        run_fused_backtest(bt)
+        self.assertEqual(bt.metrics_json, top["metrics"])
+
+    def test_invalid_sweeps_are_rejected(self):
+        self.assertEqual(self.create_sweep(grid={"account.initialCash": [1]}).status_code, 400)
+        self.assertEqual(self.create_sweep(grid={"strategy.buyAbovePct": []}).status_code, 400)
+        self.assertEqual(self.create_sweep(rankBy="luck").status_code, 400)
+        with override_settings(SWEEP_MAX_VARIANTS=4):
+            self.assertEqual(self.create_sweep().status_code, 400)
+            self.assertEqual(self.create_sweep(samples=4, seed=1).status_code, 201)
+
+
+class WalkForwardTests(ForecastingTestBase):
+    PRICES = [100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100, 104, 108, 107, 109]
+
+    def setUp(self):
+        super().setUp()
+        self.write_prices(self.PRICES)
+        self.create_strategy("strat_wf", {"buyAbovePct": 0.0, "sellBelowPct": 0.0})
+
+    def create_backtest(self, walk_forward):
+        return self.client.post(
+            "/api/v1/backtests/",
+            {
+                "datasetVersionId": "dsv_test",
+                "strategyId": "strat_wf",
+                "forecast": {"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+                "account": {"initialCash": 10000},
+                "mode": "WALK_FORWARD",
+                "walkForward": walk_forward,
+            },
+            format="json",
+        )
+
+    def test_fold_splits(self):
+        self.assertEqual(
+            walk_forward_folds(10, 4, 3),
+            [Fold(0, 4, 4, 7), Fold(3, 7, 7, 10)],
+        )
+        self.assertEqual(
+            walk_forward_folds(11, 4, 3, anchored=True),
+            [Fold(0, 4, 4, 7), Fold(0, 7, 7, 10), Fold(0, 10, 10, 11)],
+        )
+        self.assertEqual(walk_forward_folds(4, 4, 3), [])
+
+    def test_stitch_compounds_folds(self):
+        def fold(equity, fill_bar):
+            fills = np.zeros(1, dtype=FILL_DTYPE)
+            fills[0] = (fill_bar, SIDE_BUY, 10.0, 1.0, 0.5)
+            orders = np.zeros(1, dtype=ORDER_DTYPE)
+            orders[0] = (fill_bar, SIDE_BUY, 10.0, 1.0)
+            equity = np.array(equity, dtype=float)
+            return SimResult(
+                orders=orders,
+                fills=fills,
+                position=np.full(equity.size, 10.0),
+                cash=equity - 10.0,
+                equity=equity,
+                initial_cash=100.0,
+                risk_events=[{"bar": fill_bar, "fillBar": None, "rule": "stopLoss"}],
+            )
+
+        stitched = stitch_folds([fold([100, 110], 0), fold([100, 90], 1)], 100.0)
+        np.testing.assert_allclose(stitched.equity, [100, 110, 110, 99])
+        np.testing.assert_allclose(stitched.position, [10, 10, 11, 11])
+        self.assertEqual(stitched.fills["bar"].tolist(), [0, 3])
+        np.testing.assert_allclose(stitched.fills["qty"], [10, 11])
+        np.testing.assert_allclose(stitched.fills["commission"], [0.5, 0.55])
+        self.assertEqual(stitched.orders["bar"].tolist(), [0, 3])
+        self.assertEqual([e["bar"] for e in stitched.risk_events], [0, 3])
+
+    @override_settings(WALK_FORWARD_MAX_WORKERS=2)
+    def test_walk_forward_run_stitches_folds(self):
+        resp = self.create_backtest({"trainBars": 6, "testBars": 4})
+        self.assertEqual(resp.status_code, 201, resp.content)
+        bt = BacktestRun.objects.get(backtest_run_id=resp.json()["backtestRunId"])
+        self.assertEqual(bt.walk_forward_json, {"trainBars": 6, "testBars": 4, "anchored": False})
+
+        BacktestWorker(stdout=io.StringIO())._advance_one_step(bt)
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.REPORT_DONE, bt.last_error)
+        self.assertTrue(Report.objects.filter(source_id=bt.backtest_run_id).exists())
+
+        out = self.client.get(f"/api/v1/backtests/{bt.backtest_run_id}/result").json()
+        folds = out["folds"]
+        self.assertEqual([(f["trainBars"], f["testBars"]) for f in folds], [(6, 4), (6, 4), (6, 2)])
+        self.assertEqual(folds[0]["testStart"], "2026-01-07")
+        self.assertEqual(folds[-1]["testEnd"], "2026-01-16")
+        self.assertEqual(len(out["equityCurve"]), 10)
+        self.assertEqual(out["equityCurve"][0]["timestamp"], "2026-01-07")
+
+        # compounding: the stitched curve ends at the product of fold returns
+        growth = math.prod(1 + f["metrics"]["totalReturn"] for f in folds)
+        self.assertAlmostEqual(out["equityCurve"][-1]["equity"], 10000 * growth, places=6)
+        self.assertAlmostEqual(out["metrics"]["totalReturn"], growth - 1, places=9)
+        self.assertEqual(bt.metrics_json, out["metrics"])
+
+        # folds are not materialised as stage rows
+        self.assertFalse(ForecastJob.objects.exists())
+        self.assertFalse(TradeSimRun.objects.exists())
+
+    def test_walk_forward_config_is_validated(self):
+        self.assertEqual(self.create_backtest({"trainBars": 0, "testBars": 4}).status_code, 400)
+        self.assertEqual(self.create_backtest({"trainBars": 6}).status_code, 400)
+        resp = self.client.post(
+            "/api/v1/backtests/",
+            {
+                "datasetVersionId": "dsv_test",
+                "strategyId": "strat_wf",
+                "forecast": {"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+                "account": {"initialCash": 10000},
+                "mode": "WALK_FORWARD",
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(BACKTEST_RETRY_POLICIES={"default": {"max_attempts": 2, "base_delay": 0.0}})
+class BacktestRetryTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        self.write_recent_prices([100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100])
+        self.worker = BacktestWorker(stdout=io.StringIO(), stderr=io.StringIO())
+
+    def create_backtest(self, forecast=None):
+        return BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=self.create_strategy("strat_retry", {}),
+            forecast_config_snapshot_json=forecast or {"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+            account_config_json={"initialCash": 10000},
+            mode=BacktestMode.FUSED,
+        )
+
+    def redrive(self, bt, **body):
+        return self.client.post(f"/api/v1/backtests/{bt.backtest_run_id}:redrive", body, format="json")
+
+    def test_backoff_grows_with_jitter(self):
+        policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=4.0)
+        rng = random.Random(3)
+        for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 4.0)]:
+            delay = policy.delay(attempt, rng)
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+
+    def test_transient_error_retries_then_resumes_from_last_stage(self):
+        bt = self.create_backtest()
+        with mock.patch(
+            "forecasting.services.backtest_service.write_backtest_report", side_effect=OSError("database is locked")
+        ):
+            self.assertTrue(self.worker.process_next("worker-a"))
+            bt.refresh_from_db()
+            self.assertEqual(bt.status, BacktestStatus.CREATED)
+            self.assertEqual(bt.stage_attempts_json, {"REPORT": 1})
+            self.assertEqual(bt.retry_count, 1)
+            self.assertIsNotNone(bt.next_attempt_at)
+
+            self.assertTrue(self.worker.process_next("worker-a"))
+            bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.FAILED)
+        self.assertEqual(bt.failed_stage, "REPORT")
+        self.assertIn("database is locked", bt.last_error)
+        detail = self.client.get(f"/api/v1/backtests/{bt.backtest_run_id}/").json()
+        self.assertEqual((detail["failedStage"], detail["stageAttempts"]), ("REPORT", {"REPORT": 2}))
+
+        resp = self.redrive(bt)
+        self.assertEqual(resp.status_code, 202, resp.content)
+        self.assertEqual(resp.json()["fromStage"], "METRICS")
+        bt.refresh_from_db()
+        self.assertEqual((bt.status, bt.stage_attempts_json, bt.failed_stage), ("SIM_DONE", {}, None))
+
+        while self.worker.process_next("worker-a"):
+            pass
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.REPORT_DONE, bt.last_error)
+        self.assertEqual(ForecastJob.objects.count(), 1)
+        self.assertEqual(TradeSimRun.objects.count(), 1)
+
+    def test_failed_stage_row_rewinds_to_last_completed_status(self):
+        bt = self.create_backtest()
+        run_fused_backtest(bt)
+        TradeSimRun.objects.filter(trade_sim_run_id=bt.trade_sim_run_id).update(status="FAILED", error_message="lock")
+        BacktestRun.objects.filter(id=bt.id).update(status=BacktestStatus.SIM_PENDING)
+
+        self.worker.process_next("worker-a")
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.SIGNAL_DONE)
+        self.assertEqual(bt.stage_attempts_json, {"SIMULATION": 1})
+
+        with mock.patch.object(run_trade_sim, "delay", side_effect=run_trade_sim):
+            while self.worker.process_next("worker-a"):
+                pass
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.REPORT_DONE, bt.last_error)
+        self.assertEqual(TradeSimRun.objects.filter(status="SUCCEEDED").count(), 1)
+
+    def test_stage_failures_are_classified_by_their_cause(self):
+        traceback_text = 'Traceback (most recent call last):\n  File "x.py", line 1\nKeyError: \'target\'\n'
+        self.assertIs(recorded_exception(traceback_text), KeyError)
+        self.assertIs(recorded_exception("ValueError: not enough data points"), ValueError)
+        self.assertIs(recorded_exception("DoesNotExist: SignalRun matching query"), ObjectDoesNotExist)
+        self.assertIs(recorded_exception("forecasting.models.ForecastJob.DoesNotExist: gone"), ForecastJob.DoesNotExist)
+        self.assertIs(recorded_exception("json.decoder.JSONDecodeError: Expecting value"), json.JSONDecodeError)
+        self.assertIs(recorded_exception("OSError: database is locked"), OSError)
+        for unknown in (None, "", "lock", "no.such.module.Error: x", "Unexpected status after run_trade_sim: RUNNING"):
+            self.assertIsNone(recorded_exception(unknown), unknown)
+
+        self.assertFalse(is_retryable(StageFailed("x", BacktestStatus.CREATED, ValueError)))
+        self.assertFalse(is_retryable(StageFailed("x", BacktestStatus.CREATED, json.JSONDecodeError)))
+        self.assertTrue(is_retryable(StageFailed("x", BacktestStatus.CREATED, OSError)))
+        self.assertTrue(is_retryable(StageFailed("x", BacktestStatus.CREATED)))
+
+    def test_deterministic_stage_failure_is_not_retried(self):
+        bt = self.create_backtest()
+        run_fused_backtest(bt)
+        TradeSimRun.objects.filter(trade_sim_run_id=bt.trade_sim_run_id).update(
+            status="FAILED", error_message="ValueError: SignalRun missing output_uri"
+        )
+        BacktestRun.objects.filter(id=bt.id).update(status=BacktestStatus.SIM_PENDING)
+
+        self.worker.process_next("worker-a")
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.FAILED)
+        self.assertEqual(bt.failed_stage, "SIMULATION")
+        self.assertEqual(bt.retry_count, 0)
+        self.assertIn("SignalRun missing output_uri", bt.last_error)
+
+    def test_permanent_error_fails_without_retry(self):
+        bt = self.create_backtest({"params": {"window": 50}, "horizon": 3})
+        self.assertEqual(self.redrive(bt).status_code, 409)
+
+        self.worker.process_next("worker-a")
+        bt.refresh_from_db()
+        self.assertEqual(bt.status, BacktestStatus.FAILED)
+        self.assertEqual(bt.failed_stage, "FORECAST")
+        self.assertEqual(bt.retry_count, 0)
+
+        self.assertEqual(self.redrive(bt, fromStage="SIGNAL").status_code, 400)
+        self.assertEqual(self.redrive(bt, fromStage="BOGUS").status_code, 400)
+
+
+class FairSchedulingTests(ForecastingTestBase):
+    QUEUE = ForecastWorker.QUEUE
+
+    def submit(self, tenant_id, n, priority=JobPriority.INTERACTIVE):
+        ForecastJob.objects.bulk_create(
+            ForecastJob(
+                forecast_job_id=f"fc_{tenant_id}_{priority[0]}{i}",
+                tenant_id=tenant_id,
+                model_type="MA",
+                horizon=1,
+                priority=priority,
+            )
+            for i in range(n)
+        )
+
+    def dispatch(self, n, finish=True):
+        # a single worker: pick, start, (finish), charge
+        served = []
+        for _ in range(n):
+            job = next_candidate(self.QUEUE)
+            if job is None:
+                break
+            job.status = JobStatus.SUCCEEDED if finish else JobStatus.RUNNING
+            job.save(update_fields=["status"])
+            charge(self.QUEUE, job.tenant_id)
+            served.append(job.tenant_id)
+        return served
+
+    def test_bulk_tenant_does_not_starve_others(self):
+        self.submit("bulk", 300)
+        self.submit("small_a", 10)
+        self.submit("small_b", 10)
+
+        served = self.dispatch(30)
+        self.assertEqual(served.count("small_a"), 10)
+        self.assertEqual(served.count("small_b"), 10)
+        self.assertEqual(served.count("bulk"), 10)
+        # once the others are done the bulk tenant gets the whole worker
+        self.assertEqual(set(self.dispatch(20)), {"bulk"})
+
+    @override_settings(TENANT_SCHEDULING={"default": {"weight": 1}, "gold": {"weight": 3}})
+    def test_weights_set_the_share(self):
+        self.submit("gold", 100)
+        self.submit("basic", 100)
+        served = self.dispatch(40)
+        self.assertEqual((served.count("gold"), served.count("basic")), (30, 10))
+
+    def test_idle_tenant_does_not_bank_credit(self):
+        self.submit("early", 50)
+        self.dispatch(40)
+        self.submit("late", 50)
+        served = self.dispatch(10)
+        self.assertEqual(served.count("late"), 5)
+
+    def test_interactive_jobs_go_first(self):
+        self.submit("bulk", 20, JobPriority.BATCH)
+        self.submit("user", 3, JobPriority.INTERACTIVE)
+        self.assertEqual(self.dispatch(3), ["user"] * 3)
+        self.assertEqual(self.dispatch(1), ["bulk"])
+
+    def test_stage_queues_schedule_by_priority(self):
+        strategy = self.create_strategy("strat_prio", {})
+        batch, interactive = (
+            SignalRun.objects.create(
+                tenant_id=tenant_id, forecast_job_id="fc_prio", strategy=strategy, priority=priority
+            )
+            for tenant_id, priority in (("bulk", JobPriority.BATCH), ("user", JobPriority.INTERACTIVE))
+        )
+        self.assertEqual(next_candidate(SignalWorker.QUEUE).pk, interactive.pk)
+        SignalRun.objects.filter(pk=interactive.pk).update(status="SUCCEEDED")
+        self.assertEqual(next_candidate(SignalWorker.QUEUE).pk, batch.pk)
+
+        for worker in (SimWorker, SweepWorker, DatasetWorker):
+            self.assertEqual(worker.QUEUE.priority_field, "priority")
+
+        # a staged backtest's stage rows run at the backtest's priority
+        bt = BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=strategy,
+            priority=JobPriority.BATCH,
+            status=BacktestStatus.FORECAST_DONE,
+            forecast_job_id="fc_prio",
+        )
+        ForecastJob.objects.create(forecast_job_id="fc_prio", tenant_id=self.tenant_id, horizon=1)
+        BacktestWorker(stdout=io.StringIO(), stderr=io.StringIO())._on_forecast_done(bt)
+        self.assertEqual(SignalRun.objects.get(signal_run_id=bt.signal_run_id).priority, JobPriority.BATCH)
+
+    @override_settings(TENANT_SCHEDULING={"default": {"max_running": {"forecast": 2, "backtest": 1}}})
+    def test_concurrency_caps(self):
+        self.submit("bulk", 10)
+        served = self.dispatch(10, finish=False)
+        self.assertEqual(served, ["bulk", "bulk"])
+        self.assertEqual(ForecastJob.objects.filter(status=JobStatus.RUNNING).count(), 2)
+
+        # a capped tenant's admitted backtests keep moving, new ones wait
+        strategy = self.create_strategy("strat_cap", {})
+        started, waiting = (
+            BacktestRun.objects.create(
+                backtest_run_id=BacktestRun.new_backtest_run_id(),
+                tenant_id="bulk",
+                dataset_version=self.dataset_version,
+                strategy=strategy,
+                status=status,
+            )
+            for status in (BacktestStatus.FORECAST_DONE, BacktestStatus.CREATED)
+        )
+        self.assertEqual(candidates(BacktestWorker.QUEUE), [started.pk])
+        BacktestRun.objects.filter(pk=started.pk).update(status=BacktestStatus.REPORT_DONE)
+        self.assertEqual(candidates(BacktestWorker.QUEUE), [waiting.pk])
+
+
+class BacktestCompareTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.write_recent_prices([100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100])
+        self.strategy = self.create_strategy("strat_cmp", {})
+
+    def run_backtest(self, initial_cash):
+        bt = BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=self.strategy,
+            forecast_config_snapshot_json={"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+            account_config_json={"initialCash": initial_cash},
+            mode=BacktestMode.FUSED,
+        )
+        run_fused_backtest(bt)
+        return bt
+
+    def compare(self, *ids, **params):
+        return self.client.get("/api/v1/backtests:compare", {"ids": ",".join(ids), **params})
+
+    def test_outer_join_forward_fills(self):
+        aligned = align_equity_curves({
+            "a": [{"timestamp": f"2026-01-0{d}", "equity": e} for d, e in [(1, 10.0), (2, 11.0), (3, 12.0)]],
+            "b": [{"timestamp": f"2026-01-0{d}", "equity": e} for d, e in [(2, 5.0), (4, 6.0)]],
+        })
+        self.assertEqual(aligned.index.strftime("%d").tolist(), ["01", "02", "03", "04"])
+        np.testing.assert_array_equal(aligned["a"].to_numpy(), [10, 11, 12, 12])
+        np.testing.assert_array_equal(aligned["b"].to_numpy(), [np.nan, 5, 5, 6])
+
+    def test_compare_scaled_runs(self):
+        small, large = self.run_backtest(10000), self.run_backtest(20000)
+        resp = self.compare(small.backtest_run_id, large.backtest_run_id)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        out = resp.json()
+
+        self.assertEqual(out["baseline"], small.backtest_run_id)
+        self.assertEqual(len(out["timeline"]), 12)
+        self.assertEqual(out["equity"][large.backtest_run_id][-1], large.metrics_json["finalEquity"])
+        rel = out["relative"][large.backtest_run_id]
+        # same signals on twice the cash: near-identical returns
+        self.assertAlmostEqual(
+            rel["excessReturn"], large.metrics_json["totalReturn"] - small.metrics_json["totalReturn"], places=12
+        )
+        self.assertAlmostEqual(rel["beta"], 1.0, delta=0.05)
+        self.assertGreater(rel["correlation"], 0.99)
+        self.assertEqual(out["correlation"][0][1], rel["correlation"])
+        self.assertEqual(out["relative"][small.backtest_run_id]["trackingError"], 0.0)
+        self.assertEqual(out["metrics"][small.backtest_run_id], small.metrics_json)
+
+        self.assertEqual(len(self.compare(small.backtest_run_id, large.backtest_run_id, points=4).json()["timeline"]), 4)
+
+    def test_result_is_cached_per_artifact_version(self):
+        a, b = self.run_backtest(10000), self.run_backtest(20000)
+        self.assertEqual(b.output_checksum, compute_sha256_bytes(Path(b.output_uri).read_bytes()))
+        first = self.compare(a.backtest_run_id, b.backtest_run_id).json()
+        with mock.patch("forecasting.views.compare_equity_curves") as compare, mock.patch(
+            "forecasting.views.compute_sha256_bytes", wraps=compute_sha256_bytes
+        ) as sha256:
+            self.assertEqual(self.compare(b.backtest_run_id, a.backtest_run_id, baseline=a.backtest_run_id).json(), first)
+            compare.assert_not_called()
+            # the key comes from the stored checksums, not the files
+            sha256.assert_not_called()
+
+            # a rewritten artifact is a different key
+            path = Path(b.output_uri)
+            path.write_text(path.read_text() + " ")
+            BacktestRun.objects.filter(id=b.id).update(output_checksum=compute_sha256_bytes(path.read_bytes()))
+            compare.return_value = {"recomputed": True}
+            self.assertEqual(self.compare(a.backtest_run_id, b.backtest_run_id).json(), {"recomputed": True})
+
+    def test_invalid_requests(self):
+        a = self.run_backtest(10000)
+        self.assertEqual(self.compare(a.backtest_run_id).status_code, 400)
+        self.assertEqual(self.compare(a.backtest_run_id, "bt_missing").status_code, 404)
+        pending = BacktestRun.objects.create(
+            backtest_run_id="bt_pending", tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version, strategy=self.strategy,
+        )
+        self.assertEqual(self.compare(a.backtest_run_id, pending.backtest_run_id).status_code, 409)
+        self.assertEqual(self.compare(a.backtest_run_id, "bt_pending", baseline="bt_x").status_code, 400)
+
+
+class BacktestDigestTests(ForecastingTestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def days(self, n, start="2026-01-01"):
+        return np.datetime64(start, "ns") + np.arange(n) * np.timedelta64(1, "D")
+
+    def test_deepest_drawdown_windows(self):
+        equity = np.array([100, 110, 99, 105, 111, 120, 90, 95, 121, 100], dtype=float)
+        windows = drawdown_windows(equity, self.days(10), top=3)
+        self.assertEqual([w["depth"] for w in windows], [-0.25, round(100 / 121 - 1, 4), -0.1])
+        self.assertEqual(windows[0], {
+            "peak": "2026-01-06 00:00:00",
+            "trough": "2026-01-07 00:00:00",
+            "recovery": "2026-01-09 00:00:00",
+            "depth": -0.25,
+            "bars": 3,
+        })
+        self.assertIsNone(windows[1]["recovery"])
+        self.assertEqual(len(drawdown_windows(equity, self.days(10), top=1)), 1)
+        self.assertEqual(drawdown_windows(np.arange(1.0, 5.0), self.days(4)), [])
+
+    def test_monthly_and_yearly_returns(self):
+        ts = np.array(["2025-12-15", "2025-12-31", "2026-01-20", "2026-02-10"], dtype="datetime64[ns]")
+        out = period_returns(np.array([100.0, 110.0, 99.0, 108.9]), ts, 100.0)
+        self.assertEqual(out["monthly"], {
+            "2025": [None] * 11 + [0.1],
+            "2026": [-0.1, 0.1] + [None] * 10,
+        })
+        self.assertEqual(out["yearly"], {"2025": 0.1, "2026": -0.01})
+        self.assertEqual(out["worstMonth"], {"month": "2026-01", "return": -0.1})
+        self.assertAlmostEqual(out["positiveMonths"], 2 / 3, places=4)
+
+    def test_trade_statistics(self):
+        fills = np.array(
+            [(1, 1, 10, 100, 0), (4, -1, 10, 110, 0), (5, 1, 10, 100, 0), (7, -1, 10, 95, 0), (8, 1, 5, 90, 0)],
+            dtype=FILL_DTYPE,
+        )
+        stats = trade_stats(fills, np.array([0, 1, 1, 0]), self.days(10))
+        self.assertEqual(stats["roundTrips"], 2)
+        self.assertEqual(stats["winRate"], 0.5)
+        self.assertEqual((stats["avgWin"], stats["avgLoss"], stats["payoffRatio"]), (100.0, -50.0, 2.0))
+        self.assertEqual(stats["avgHoldingBars"], 2.5)
+        self.assertEqual(stats["maxConsecutiveLosses"], 1)
+        self.assertEqual(stats["exposure"], 0.5)
+
+    def test_digest_size_does_not_grow_with_the_backtest(self):
+        rng = np.random.default_rng(7)
+
+        def digest_of(n):
+            equity = 100000 * np.cumprod(1 + rng.normal(0.0003, 0.01, n))
+            prices = pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.01, n)), index=pd.DatetimeIndex(self.days(n)))
+            return backtest_digest(equity, self.days(n), 100000.0, prices=prices)
+
+        short, long = digest_of(400), digest_of(4000)
+        self.assertLessEqual(len(long["returns"]["monthly"]), 3)
+        self.assertLessEqual(len(long["returns"]["yearly"]), 10)
+        self.assertEqual(len(long["drawdowns"]), 3)
+        self.assertLessEqual(len(long["regimes"]), 4)
+        self.assertAlmostEqual(sum(r["share"] for r in long["regimes"]), 1.0, places=2)
+        self.assertLess(len(json.dumps(long)), 2 * len(json.dumps(short)))
+
+    def test_digest_of_a_finished_run_is_cached(self):
+        self.write_recent_prices([100, 101, 102, 101, 103, 104, 102, 105, 110, 112, 111, 100])
+        bt = BacktestRun.objects.create(
+            backtest_run_id=BacktestRun.new_backtest_run_id(),
+            tenant_id=self.tenant_id,
+            dataset_version=self.dataset_version,
+            strategy=self.create_strategy("strat_digest", {}),
+            forecast_config_snapshot_json={"modelType": "MA", "params": {"window": 3}, "horizon": 3},
+            account_config_json={"initialCash": 10000},
+            mode=BacktestMode.FUSED,
+        )
+        self.assertIsNone(load_backtest_digest(bt))
+        run_fused_backtest(bt)
+
+        digest = load_backtest_digest(bt)
+        self.assertEqual(digest["bars"], 12)
+        self.assertEqual(digest["metrics"]["finalEquity"], round(bt.metrics_json["finalEquity"], 4))
+        self.assertEqual(digest["trades"]["fills"], bt.metrics_json["tradeCount"])
+        with mock.patch("forecasting.services.digest.backtest_digest") as compute:
+            self.assertEqual(load_backtest_digest(bt), digest)
+            compute.assert_not_called()
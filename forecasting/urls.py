@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SignalRunStartView, SignalRunDetailView, SignalRunResultView, TradeSimRunCreateView, TradeSimRunDetailView, TradeSimRunResultView, DatasetCreateView, DatasetCommitView, DatasetVersionDetailView, DatasetUploadView, HealthView, ForecastListCreateView, ForecastDetailView, ForecastResultView, SimAccountViewSet, StrategyViewSet, BacktestCreateView, BacktestDetailView, BacktestResultView, ReportCreateView, ReportDetailView
+from .views import SignalRunStartView, SignalRunDetailView, SignalRunResultView, TradeSimRunCreateView, TradeSimRunDetailView, TradeSimRunResultView, DatasetCreateView, DatasetCommitView, DatasetVersionDetailView, DatasetUploadView, HealthView, ForecastListCreateView, ForecastDetailView, ForecastResultView, SimAccountViewSet, StrategyViewSet, BacktestCompareView, BacktestCreateView, BacktestDetailView, BacktestRedriveView, BacktestResultView, BacktestSweepCreateView, BacktestSweepDetailView, BacktestSweepResultView, ReportCreateView, ReportDetailView
 
 
 router = DefaultRouter()
@@ -27,6 +27,11 @@ urlpatterns = [
     path('', include(router.urls)),
 
     path("backtests/", BacktestCreateView.as_view()),
+    path("backtests:sweep", BacktestSweepCreateView.as_view()),
+    path("backtests:compare", BacktestCompareView.as_view()),
+    path("backtests/sweeps/<str:sweep_id>/", BacktestSweepDetailView.as_view()),
+    path("backtests/sweeps/<str:sweep_id>/result", BacktestSweepResultView.as_view()),
+    path("backtests/<str:backtest_run_id>:redrive", BacktestRedriveView.as_view()),
     path("backtests/<str:backtest_run_id>/", BacktestDetailView.as_view()),
     path("backtests/<str:backtest_run_id>/result", BacktestResultView.as_view()),
     path("reports/", ReportCreateView.as_view()),
@@ -3,12 +3,14 @@ from .dedup import file_checksum_sha256, normalize_params, build_dedup_key
 
 
 # Create your views here.
+import hashlib
 import json
 import uuid
 
 from django.utils import timezone
 from pathlib import Path
 from django.conf import settings
+from django.core.cache import cache
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -16,8 +18,15 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import viewsets
 
 
-from .models import Dataset, DatasetVersion, DatasetVersionStatus, ForecastJob, JobStatus, Strategy, SimAccount, SignalRun, TradeSimRun, BacktestRun, BacktestStatus, Report
+from .models import Dataset, DatasetVersion, DatasetVersionStatus, ForecastJob, JobPriority, JobStatus, Strategy, SimAccount, SignalRun, TradeSimRun, BacktestRun, BacktestStatus, BacktestSweep, Report
 from .tasks import run_signal_job, run_trade_sim
+from .services.artifacts import backtest_curve_path, load_backtest_curve_payload, load_sim_payload
+from .services.compare import compare_equity_curves
+from .services.dataset_service import compute_sha256_bytes
+from .services.downsample import downsample_equity_curve, parse_curve_query
+from .services.redrive import redrive_backtest
+from .services.report import build_backtest_report_markdown
+from .services.sweep import count_variants
 from .serializers import (
     DatasetCreateSerializer, DatasetCreateResponseSerializer,
     DatasetCommitSerializer, DatasetCommitResponseSerializer,
@@ -37,10 +46,26 @@ from .serializers import (
     BacktestCreateSerializer,
     BacktestCreateResponseSerializer,
     BacktestDetailSerializer,
+    BacktestRedriveSerializer,
+    BacktestSweepCreateSerializer,
+    BacktestSweepSerializer,
     ReportCreateSerializer,
     ReportSerializer,
 )
 
+def equity_curve_cache_key(kind: str, tenant_id: str, run_id: str, version: str, query: dict) -> str:
+    raw = json.dumps([kind, tenant_id, run_id, version, query], sort_keys=True)
+    return "equity_curve:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def thin_equity_curve(payload: dict, query: dict) -> dict:
+    out = dict(payload)
+    out["equityCurve"] = downsample_equity_curve(
+        payload.get("equityCurve", []), query["points"], query["from"], query["to"]
+    )
+    return out
+
+
 class BacktestResultView(APIView):
     def get(self, request, backtest_run_id: str):
         tenant_id = getattr(request.user, "tenant_id", None)
@@ -65,9 +90,89 @@ class BacktestResultView(APIView):
         if not bt.output_uri:
             return Response({"detail": "Missing output_uri"}, status=500)
 
-        payload = json.loads(Path(bt.output_uri).read_text(encoding="utf-8"))
+        try:
+            query = parse_curve_query(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        output_path = Path(bt.output_uri)
+        if not any(query.values()):
+            return Response(json.loads(output_path.read_text(encoding="utf-8")), status=200)
+
+        # the artifact's mtime invalidates entries when the result is rewritten
+        key = equity_curve_cache_key(
+            "backtest", tenant_id, bt.backtest_run_id, str(output_path.stat().st_mtime_ns), query
+        )
+        payload = cache.get(key)
+        if payload is None:
+            curve_path = backtest_curve_path(output_path)
+            if curve_path.exists():
+                payload = load_backtest_curve_payload(curve_path, query)
+            else:
+                # written before the curve arrays were stored
+                payload = thin_equity_curve(json.loads(output_path.read_text(encoding="utf-8")), query)
+            cache.set(key, payload, settings.EQUITY_CURVE_CACHE_SECONDS)
         return Response(payload, status=200)
     
+class BacktestCompareView(APIView):
+    """
+    GET /api/v1/backtests:compare?ids=bt_a,bt_b[&baseline=bt_a][&points=N]
+    """
+    def get(self, request):
+        tenant_id = getattr(request.user, "tenant_id", None)
+        if not tenant_id:
+            return Response(
+                {"detail": "Authenticated user with tenant_id is required"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        ids = list(dict.fromkeys(
+            i.strip() for raw in request.query_params.getlist("ids") for i in raw.split(",") if i.strip()
+        ))
+        if not 2 <= len(ids) <= settings.BACKTEST_COMPARE_MAX_RUNS:
+            return Response(
+                {"detail": f"ids must name 2..{settings.BACKTEST_COMPARE_MAX_RUNS} backtests"},
+                status=400,
+            )
+        baseline = request.query_params.get("baseline") or ids[0]
+        if baseline not in ids:
+            return Response({"detail": "baseline must be one of ids"}, status=400)
+        try:
+            points = parse_curve_query(request.query_params)["points"]
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        runs = {
+            bt.backtest_run_id: bt
+            for bt in BacktestRun.objects.filter(tenant_id=tenant_id, backtest_run_id__in=ids)
+        }
+        missing = [i for i in ids if i not in runs]
+        if missing:
+            return Response({"detail": f"BacktestRun not found: {missing}"}, status=404)
+        not_ready = [i for i in ids if runs[i].status not in ["METRICS_DONE", "REPORT_DONE"] or not runs[i].output_uri]
+        if not_ready:
+            return Response({"detail": f"Backtests not ready: {not_ready}"}, status=409)
+
+        # runs written before output_checksum was recorded are hashed here
+        checksums = {
+            i: runs[i].output_checksum or compute_sha256_bytes(Path(runs[i].output_uri).read_bytes()) for i in ids
+        }
+        # order-independent: the set of runs and the exact artifacts compared
+        key = "backtest_compare:" + hashlib.sha256(json.dumps(
+            [tenant_id, sorted(checksums.items()), baseline, points]
+        ).encode("utf-8")).hexdigest()
+        payload = cache.get(key)
+        if payload is None:
+            results = {i: json.loads(Path(runs[i].output_uri).read_text(encoding="utf-8")) for i in sorted(ids)}
+            payload = compare_equity_curves(
+                {i: r.get("equityCurve", []) for i, r in results.items()},
+                baseline,
+                {i: r.get("metrics", {}) for i, r in results.items()},
+                points,
+            )
+            cache.set(key, payload, settings.EQUITY_CURVE_CACHE_SECONDS)
+        return Response(payload, status=200)
+
 class BacktestCreateView(APIView):
     def post(self, request):
         tenant_id = getattr(request.user, "tenant_id", None)
@@ -105,6 +210,9 @@ class BacktestCreateView(APIView):
             account_config_json=data["account"],
             execution_config_json=data.get("execution", {}),
             risk_rules_json=data.get("riskRules", {}),
+            mode=data["mode"],
+            priority=data["priority"],
+            walk_forward_json=data.get("walkForward", {}),
             status=BacktestStatus.CREATED,
         )
 
@@ -134,6 +242,8 @@ class BacktestDetailView(APIView):
         out = {
             "backtestRunId": bt.backtest_run_id,
             "status": bt.status,
+            "mode": bt.mode,
+            "priority": bt.priority,
             "datasetVersionId": bt.dataset_version.dataset_version_id,
             "forecastJobId": bt.forecast_job_id,
             "signalRunId": bt.signal_run_id,
@@ -141,29 +251,148 @@ class BacktestDetailView(APIView):
             "metrics": bt.metrics_json or {},
             "reportUri": bt.report_uri,
             "lastError": bt.last_error,
+            "retryCount": bt.retry_count,
+            "stageAttempts": bt.stage_attempts_json or {},
+            "failedStage": bt.failed_stage,
+            "nextAttemptAt": bt.next_attempt_at,
         }
         return Response(BacktestDetailSerializer(out).data, status=200)
 
 
-def _build_backtest_report_markdown(bt: BacktestRun, metrics: dict) -> str:
-    return f"""# Backtest Report
+class BacktestRedriveView(APIView):
+    def post(self, request, backtest_run_id: str):
+        tenant_id = getattr(request.user, "tenant_id", None)
+        if not tenant_id:
+            return Response(
+                {"detail": "Authenticated user with tenant_id is required"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        ser = BacktestRedriveSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        bt = BacktestRun.objects.filter(
+            tenant_id=tenant_id,
+            backtest_run_id=backtest_run_id,
+        ).first()
+        if not bt:
+            return Response({"detail": "BacktestRun not found"}, status=404)
+        if bt.status != BacktestStatus.FAILED:
+            return Response(
+                {"detail": f"Only FAILED backtests can be redriven, status={bt.status}"},
+                status=409,
+            )
+
+        try:
+            stage = redrive_backtest(bt, ser.validated_data.get("fromStage"))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        return Response(
+            {"backtestRunId": bt.backtest_run_id, "status": bt.status, "fromStage": stage},
+            status=202,
+        )
+
+
+class BacktestSweepCreateView(APIView):
+    """
+    POST /api/v1/backtests:sweep
+    """
+    def post(self, request):
+        tenant_id = getattr(request.user, "tenant_id", None)
+        if not tenant_id:
+            return Response(
+                {"detail": "Authenticated user with tenant_id is required"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        ser = BacktestSweepCreateSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+
+        dsv = DatasetVersion.objects.filter(
+            tenant_id=tenant_id,
+            dataset_version_id=data["datasetVersionId"],
+            status="READY",
+        ).first()
+        if not dsv:
+            return Response({"detail": "DatasetVersion not found or not READY"}, status=404)
 
-## Run Summary
-- BacktestRunId: {bt.backtest_run_id}
-- DatasetVersionId: {bt.dataset_version.dataset_version_id}
-- StrategyId: {bt.strategy.strategy_id}
-- Forecast Config: {bt.forecast_config_snapshot_json}
-- Account Config: {bt.account_config_json}
-- Execution Config: {bt.execution_config_json}
+        strategy = Strategy.objects.filter(
+            tenant_id=tenant_id,
+            strategy_id=data["strategyId"],
+        ).first()
+        if not strategy:
+            return Response({"detail": "Strategy not found"}, status=404)
 
-## Metrics
-- totalReturn: {metrics.get("totalReturn")}
-- maxDrawdown: {metrics.get("maxDrawdown")}
+        sweep = BacktestSweep.objects.create(
+            sweep_id=BacktestSweep.new_sweep_id(),
+            tenant_id=tenant_id,
+            dataset_version=dsv,
+            strategy=strategy,
+            forecast_config_json=data["forecast"],
+            account_config_json=data["account"],
+            execution_config_json=data["execution"],
+            risk_rules_json=data["riskRules"],
+            grid_json=data["grid"],
+            samples=data.get("samples"),
+            seed=data.get("seed"),
+            rank_by=data["rankBy"],
+            persist_top=data["persistTop"],
+            variant_count=count_variants(data["grid"], data.get("samples")),
+            priority=data["priority"],
+            status=JobStatus.PENDING,
+        )
+        return Response(
+            {"sweepId": sweep.sweep_id, "status": sweep.status, "variantCount": sweep.variant_count},
+            status=status.HTTP_201_CREATED,
+        )
 
-## Interpretation
-- This is a template-generated report for this lesson.
-- Next step: replace this section with richer analysis/LLM output.
-"""
+class BacktestSweepDetailView(APIView):
+    def get(self, request, sweep_id: str):
+        tenant_id = getattr(request.user, "tenant_id", None)
+        if not tenant_id:
+            return Response(
+                {"detail": "Authenticated user with tenant_id is required"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        sweep = BacktestSweep.objects.filter(tenant_id=tenant_id, sweep_id=sweep_id).first()
+        if not sweep:
+            return Response({"detail": "BacktestSweep not found"}, status=404)
+
+        out = {
+            "sweepId": sweep.sweep_id,
+            "status": sweep.status,
+            "priority": sweep.priority,
+            "datasetVersionId": sweep.dataset_version.dataset_version_id,
+            "strategyId": sweep.strategy.strategy_id,
+            "variantCount": sweep.variant_count,
+            "rankBy": sweep.rank_by,
+            "leaderboard": sweep.leaderboard_json or [],
+            "outputUri": sweep.output_uri,
+            "errorMessage": sweep.error_message,
+        }
+        return Response(BacktestSweepSerializer(out).data, status=200)
+
+class BacktestSweepResultView(APIView):
+    """
+    GET /api/v1/backtests/sweeps/{sweepId}/result: the full ranked leaderboard
+    """
+    def get(self, request, sweep_id: str):
+        tenant_id = getattr(request.user, "tenant_id", None)
+        if not tenant_id:
+            return Response(
+                {"detail": "Authenticated user with tenant_id is required"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        sweep = BacktestSweep.objects.filter(tenant_id=tenant_id, sweep_id=sweep_id).first()
+        if not sweep:
+            return Response({"detail": "BacktestSweep not found"}, status=404)
+        if sweep.status != JobStatus.SUCCEEDED:
+            return Response({"detail": f"Sweep not ready, status={sweep.status}"}, status=409)
+        if not sweep.output_uri:
+            return Response({"detail": "Missing output_uri"}, status=500)
+        return Response(json.loads(Path(sweep.output_uri).read_text(encoding="utf-8")), status=200)
 
 
 class ReportCreateView(APIView):
@@ -206,7 +435,7 @@ class ReportCreateView(APIView):
         if fmt == "MARKDOWN":
             report_path = reports_dir / f"{bt.backtest_run_id}.md"
             report_path.write_text(
-                _build_backtest_report_markdown(bt, metrics),
+                build_backtest_report_markdown(bt, metrics),
                 encoding="utf-8",
             )
         elif fmt == "JSON":
@@ -279,6 +508,8 @@ class SignalRunStartView(APIView):
         tenant_id = getattr(request.user, "tenant_id", None)
         forecast_job_id = request.data.get("forecast_job_id")
         strategy_id = request.data.get("strategy_id")
+        strategy_ids = request.data.get("strategy_ids") or []
+        priority = request.data.get("priority") or JobPriority.INTERACTIVE
 
         if not tenant_id:
             return Response(
@@ -286,17 +517,42 @@ class SignalRunStartView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        if not forecast_job_id or not strategy_id:
+        if not forecast_job_id or not (strategy_id or strategy_ids):
+            return Response(
+                {"detail": "forecast_job_id and strategy_id (or strategy_ids) are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if strategy_ids and not isinstance(strategy_ids, list):
             return Response(
-                {"detail": "forecast_job_id and strategy_id are required"},
+                {"detail": "strategy_ids must be a list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if priority not in JobPriority.values:
+            return Response(
+                {"detail": f"priority must be one of {JobPriority.values}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # validate strategy exists
-        try:
-            strategy = Strategy.objects.get(strategy_id=strategy_id, tenant_id=tenant_id)
-        except Strategy.DoesNotExist:
-            return Response({"detail": "Strategy not found"}, status=status.HTTP_404_NOT_FOUND)
+        # fan-out: evaluate every strategy against the same forecast in one run
+        strategy_ids = list(dict.fromkeys(str(sid) for sid in strategy_ids))
+        if strategy_ids:
+            found = {
+                s.strategy_id: s
+                for s in Strategy.objects.filter(tenant_id=tenant_id, strategy_id__in=strategy_ids)
+            }
+            missing = [sid for sid in strategy_ids if sid not in found]
+            if missing:
+                return Response(
+                    {"detail": f"Strategy not found: {', '.join(missing)}"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            strategy = found[strategy_ids[0]]
+        else:
+            # validate strategy exists
+            try:
+                strategy = Strategy.objects.get(strategy_id=strategy_id, tenant_id=tenant_id)
+            except Strategy.DoesNotExist:
+                return Response({"detail": "Strategy not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # validate forecast job exists (adjust field name to your model)
         try:
@@ -308,6 +564,8 @@ class SignalRunStartView(APIView):
             tenant_id=tenant_id,
             forecast_job_id=forecast_job_id,
             strategy=strategy,
+            strategy_ids_json=strategy_ids,
+            priority=priority,
             status="PENDING",
         )
         # enqueue async job
@@ -335,8 +593,10 @@ class SignalRunDetailView(APIView):
         out = {
             "signalRunId": sr.signal_run_id,
             "status": sr.status,
+            "priority": sr.priority,
             "forecastJobId": sr.forecast_job_id,
             "strategyId": sr.strategy.strategy_id,
+            "strategyIds": sr.strategy_ids_json or [sr.strategy.strategy_id],
             "createdAt": sr.created_at.isoformat(),
             "outputUri": sr.output_uri,
             "errorMessage": sr.error_message,
@@ -421,11 +681,22 @@ class TradeSimRunCreateView(APIView):
                 status=status.HTTP_409_CONFLICT,
             )
 
+        signal_column = data.get("signal_column")
+        if signal_column and signal_column not in (signal_run.strategy_ids_json or []):
+            return Response(
+                {"detail": f"signal_column not in SignalRun strategies: {signal_column}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         sim_run = TradeSimRun.objects.create(
             tenant_id=tenant_id,
             account=account,
             signal_run=signal_run,
+            signal_column=signal_column,
             execution_model=data.get("execution_model", "NEXT_BAR_CLOSE"),
+            execution_config_json=data.get("execution_config", {}),
+            risk_rules_json=data.get("risk_rules", {}),
+            priority=data["priority"],
             status="PENDING",
         )
 
@@ -456,9 +727,13 @@ class TradeSimRunDetailView(APIView):
         out = {
             "tradeSimRunId": sim_run.trade_sim_run_id,
             "status": sim_run.status,
+            "priority": sim_run.priority,
             "executionModel": sim_run.execution_model,
+            "signalColumn": sim_run.signal_column,
             "createdAt": sim_run.created_at.isoformat(),
             "outputUri": sim_run.output_uri,
+            "outputChecksum": sim_run.output_checksum,
+            "metrics": sim_run.metrics_json or {},
             "errorMessage": sim_run.error_message,
         }
         return Response(TradeSimRunSerializer(out).data, status=200)
@@ -479,18 +754,31 @@ class TradeSimRunResultView(APIView):
                 status=status.HTTP_409_CONFLICT,
             )
 
-        payload = sim_run.result
-        if not payload and sim_run.output_uri:
-            try:
-                with open(sim_run.output_uri, "r", encoding="utf-8") as f:
-                    payload = json.load(f)
-            except Exception as e:
-                return Response({"detail": f"Failed to load artifact: {e}"}, status=500)
+        try:
+            query = parse_curve_query(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        key = None
+        if any(query.values()):
+            key = equity_curve_cache_key(
+                "sim", tenant_id, sim_run.trade_sim_run_id, sim_run.updated_at.isoformat(), query
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, status=200)
 
-        if not payload:
+        if not sim_run.output_uri:
             return Response({"detail": "Missing simulation result"}, status=500)
+        try:
+            payload = load_sim_payload(sim_run.output_uri, query if key else None)
+        except Exception as e:
+            return Response({"detail": f"Failed to load artifact: {e}"}, status=500)
 
-        return Response(TradeSimResultSerializer(payload).data, status=200)
+        data = TradeSimResultSerializer(payload).data
+        if key is not None:
+            cache.set(key, data, settings.EQUITY_CURVE_CACHE_SECONDS)
+        return Response(data, status=200)
 
 # HW2:
 class DatasetUploadView(APIView):
@@ -530,6 +818,7 @@ class DatasetUploadView(APIView):
                 "timestamp": mapping.get("timestamp"),
                 "target": mapping.get("target"),
             },
+            priority=ser.validated_data["priority"],
             status=DatasetVersionStatus.VALIDATING,
         )
 
@@ -589,6 +878,7 @@ class DatasetCommitView(APIView):
                 "timestamp": mapping.get("timestamp"),
                 "target": mapping.get("target"),
             },
+            priority=ser.validated_data["priority"],
             status=DatasetVersionStatus.VALIDATING,
         )
 
@@ -611,6 +901,7 @@ class DatasetVersionDetailView(APIView):
         out = {
             "datasetVersionId": dsv.dataset_version_id,
             "status": dsv.status,
+            "priority": dsv.priority,
             "checksum": dsv.checksum,
             "schema": dsv.schema_json,
             "profile": dsv.profile_json or {},
@@ -657,6 +948,7 @@ class ForecastListCreateView(APIView):
             model_type=data["modelType"],
             params_json=data.get("params", {}),
             horizon=data["horizon"],
+            priority=data["priority"],
             status=JobStatus.PENDING,
         )
         return Response({"forecastJobId": job.forecast_job_id, "status": job.status}, status=201)
@@ -1,6 +1,44 @@
+import asyncio
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from .cache import response_cache_key
+from .transport import CircuitBreaker, ConnectionPool, RetryPolicy
+
+
+class LLMProviderError(RuntimeError):
+    def __init__(self, status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"provider returned HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500
+
+
 class StubLLMAdapter:
     model_name = "stub-llm-v1"
 
+    async def agenerate(self, prompt: str) -> str:
+        return self.generate(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # line by line, the way a provider sends deltas
+        yield from self.generate(prompt).splitlines(keepends=True)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        for chunk in self.stream(prompt):
+            yield chunk
+
+    def generate_batch(self, prompts: List[str]) -> List[Union[str, Exception]]:
+        return [self.generate(prompt) for prompt in prompts]
+
     def generate(self, prompt: str) -> str:
         title = "Backtest Analysis Report"
         findings = [
@@ -60,3 +98,346 @@ class OpenAIAdapter:
             input=prompt,
         )
         return resp.output_text
+
+    async def agenerate(self, prompt: str) -> str:
+        # the injected client is blocking
+        return await asyncio.to_thread(self.generate, prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        events = self.client.responses.create(
+            model=self.model_name,
+            input=prompt,
+            stream=True,
+        )
+        for event in events:
+            if getattr(event, "type", None) == "response.output_text.delta":
+                yield event.delta
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        # pulls each event of the blocking stream on a thread
+        chunks = self.stream(prompt)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+class HTTPLLMAdapter:
+    """
+    Any provider speaking the OpenAI chat completions wire format
+    (POST <base_url>/chat/completions), over http.client;
+    agenerate/astream run the same calls on a thread and share the pool.
+    Streams are the provider's server-sent events, yielded as content
+    deltas.
+
+    Connections are kept alive and pooled. `timeout` is each call's
+    deadline, retries included; for streams it bounds the wait for the
+    response and then each gap between reads. 429 and 5xx answers and
+    connection errors are retried under `retry` (jittered exponential
+    backoff, at least the provider's Retry-After) while the deadline
+    allows. `breaker` counts 5xx, connection errors and timeouts, and
+    fails calls fast once it opens. A stream is only retried before its
+    first delta.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model_name: str,
+        api_key: Optional[str] = None,
+        timeout: float = 60.0,
+        pool_size: int = 4,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        url = urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.path = url.path.rstrip("/") + "/chat/completions"
+        self.model_name = model_name
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.pool = ConnectionPool(self.host, self.port, self.https, pool_size)
+
+    def _request(self, prompt: str, stream: bool = False) -> Tuple[bytes, dict]:
+        payload = {"model": self.model_name, "messages": [{"role": "user", "content": prompt}]}
+        if stream:
+            payload["stream"] = True
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return body, headers
+
+    @staticmethod
+    def _message(body: bytes) -> str:
+        return json.loads(body)["choices"][0]["message"]["content"]
+
+    def _error(self, status: int, body: bytes, retry_after: Optional[str]) -> "LLMProviderError":
+        """
+        Records a non-2xx answer with the breaker: 5xx counts as the
+        provider failing, anything else means it is up.
+        """
+        if status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return LLMProviderError(status, body.decode("utf-8", errors="replace"), _retry_after(retry_after))
+
+    def _backoff(self, attempt: int, error: Exception, deadline: float) -> Optional[float]:
+        """
+        Seconds to sleep before the next attempt, or None to give up.
+        """
+        if isinstance(error, LLMProviderError) and not error.retryable:
+            return None
+        if attempt >= self.retry.max_attempts:
+            return None
+        delay = max(self.retry.delay(attempt), getattr(error, "retry_after", None) or 0.0)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    # blocking -------------------------------------------------------------------
+
+    def _attempt(self, prompt: str, stream: bool, deadline: float):
+        body, headers = self._request(prompt, stream)
+        fresh = False
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("deadline exceeded")
+            conn, reused = self.pool.acquire(remaining, fresh)
+            try:
+                conn.request("POST", self.path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except ConnectionError:
+                conn.close()
+                if not reused:
+                    raise
+                # the server dropped the idle connection: not a provider failure
+                fresh = True
+            except BaseException:
+                conn.close()
+                raise
+
+    def _post(self, prompt: str, stream: bool):
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self.breaker.before_call()
+            try:
+                conn, resp = self._attempt(prompt, stream, deadline)
+                if 200 <= resp.status < 300:
+                    self.breaker.record_success()
+                    return conn, resp
+                try:
+                    body = resp.read()
+                except BaseException:
+                    conn.close()
+                    raise
+                self.pool.release(conn, not resp.will_close)
+            except (OSError, http.client.HTTPException) as e:
+                self.breaker.record_failure()
+                if isinstance(e, TimeoutError):
+                    raise
+                error = e
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            else:
+                error = self._error(resp.status, body, resp.getheader("Retry-After"))
+
+            delay = self._backoff(attempt, error, deadline)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+
+    def generate(self, prompt: str) -> str:
+        conn, resp = self._post(prompt, stream=False)
+        try:
+            body = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.pool.release(conn, not resp.will_close)
+        return self._message(body)
+
+    def generate_batch(self, prompts: List[str]) -> List[Union[str, Exception]]:
+        """
+        Chat completions takes one prompt per call, so a batch is sent as
+        concurrent calls over the pooled connections. A prompt that failed
+        gets its exception in place of the text.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(self.pool.max_idle, len(prompts)))) as pool:
+            return list(pool.map(lambda prompt: _outcome(self.generate, prompt), prompts))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        conn, resp = self._post(prompt, stream=True)
+        try:
+            for line in resp:
+                delta = sse_delta(line)
+                if delta is None:
+                    break
+                if delta:
+                    yield delta
+            resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.pool.release(conn, not resp.will_close)
+
+    # asyncio --------------------------------------------------------------------
+
+    async def agenerate(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        # pulls each delta of the blocking stream on a thread
+        chunks = self.stream(prompt)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    # only the delay-seconds form; HTTP dates fall back to the backoff
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def sse_delta(line: bytes) -> Optional[str]:
+    """
+    The content delta carried by one line of a streamed chat completion:
+    "" for lines without one (blank lines, comments, role-only deltas),
+    None at the closing `data: [DONE]`.
+    """
+    line = line.strip()
+    if not line.startswith(b"data:"):
+        return ""
+    data = line[5:].strip()
+    if data == b"[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+class CachingLLMAdapter:
+    """
+    Wraps an adapter with an LLMResponseCache. Prompts that are
+    byte-identical for the same model and template version are answered
+    from the cache instead of calling the provider.
+    """
+
+    def __init__(self, adapter, cache, template_version: str = "v1"):
+        self.adapter = adapter
+        self.cache = cache
+        self.template_version = template_version
+        self.model_name = getattr(adapter, "model_name", "unknown")
+
+    def generate(self, prompt: str) -> str:
+        key = response_cache_key(prompt, self.model_name, self.template_version)
+        content = self.cache.get(key)
+        if content is None:
+            content = self.adapter.generate(prompt)
+            self.cache.put(key, content, model=self.model_name, templateVersion=self.template_version)
+        return content
+
+    async def agenerate(self, prompt: str) -> str:
+        key = response_cache_key(prompt, self.model_name, self.template_version)
+        content = self.cache.get(key)
+        if content is None:
+            content = await self.adapter.agenerate(prompt)
+            self.cache.put(key, content, model=self.model_name, templateVersion=self.template_version)
+        return content
+
+    def generate_batch(self, prompts: List[str]) -> List[Union[str, Exception]]:
+        """
+        Hits are answered from the cache; only the misses go to the wrapped
+        adapter, as one batch.
+        """
+        keys = [response_cache_key(p, self.model_name, self.template_version) for p in prompts]
+        results = [self.cache.get(key) for key in keys]
+        misses = [i for i, content in enumerate(results) if content is None]
+        if misses:
+            for i, content in zip(misses, generate_batch(self.adapter, [prompts[i] for i in misses])):
+                results[i] = content
+                if not isinstance(content, Exception):
+                    self.cache.put(keys[i], content, model=self.model_name, templateVersion=self.template_version)
+        return results
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        A hit comes back as one chunk; a miss streams from the wrapped
+        adapter and is cached once the stream completes.
+        """
+        key = response_cache_key(prompt, self.model_name, self.template_version)
+        content = self.cache.get(key)
+        if content is not None:
+            yield content
+            return
+        parts = []
+        for chunk in iter_chunks(self.adapter, prompt):
+            parts.append(chunk)
+            yield chunk
+        self.cache.put(key, "".join(parts), model=self.model_name, templateVersion=self.template_version)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        key = response_cache_key(prompt, self.model_name, self.template_version)
+        content = self.cache.get(key)
+        if content is not None:
+            yield content
+            return
+        parts = []
+        async for chunk in aiter_chunks(self.adapter, prompt):
+            parts.append(chunk)
+            yield chunk
+        self.cache.put(key, "".join(parts), model=self.model_name, templateVersion=self.template_version)
+
+
+def iter_chunks(adapter, prompt: str) -> Iterator[str]:
+    """
+    adapter.stream(prompt), or the whole generate() result as one chunk for
+    adapters that cannot stream.
+    """
+    if hasattr(adapter, "stream"):
+        yield from adapter.stream(prompt)
+    else:
+        yield adapter.generate(prompt)
+
+
+async def aiter_chunks(adapter, prompt: str) -> AsyncIterator[str]:
+    if hasattr(adapter, "astream"):
+        async for chunk in adapter.astream(prompt):
+            yield chunk
+    else:
+        yield await adapter.agenerate(prompt)
+
+
+def _outcome(fn, prompt: str) -> Union[str, Exception]:
+    try:
+        return fn(prompt)
+    except Exception as exc:
+        return exc
+
+
+def generate_batch(adapter, prompts: List[str]) -> List[Union[str, Exception]]:
+    """
+    adapter.generate_batch(prompts), or one generate() per prompt for
+    adapters without a batch interface. Either way the results are in
+    prompt order, with a failed prompt's exception in place of its text.
+    """
+    if hasattr(adapter, "generate_batch"):
+        return adapter.generate_batch(prompts)
+    return [_outcome(adapter.generate, prompt) for prompt in prompts]
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+
+def response_cache_key(prompt: str, model_name: str, template_version: str) -> str:
+    raw = json.dumps([model_name, template_version, prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Generated texts on disk, one JSON file per key under
+    <cache_dir>/<key[:2]>/<key>.json. A file's mtime is its last use: hits
+    touch it, and when the directory grows past max_bytes the least
+    recently used files are deleted first. Entries older than ttl_seconds
+    are dropped on read. Safe to share between worker processes (writes
+    are atomic renames); the size bookkeeping is per process and resynced
+    by the eviction scan.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._size = sum(p.stat().st_size for p in self._entries())
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.json")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry.get("createdAt", 0) > self.ttl_seconds:
+            self.expired += 1
+            self.misses += 1
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["content"]
+
+    def put(self, key: str, content: str, **meta) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"createdAt": time.time(), **meta, "content": content}, ensure_ascii=False)
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        old = path.stat().st_size if path.exists() else 0
+        os.replace(tmp, path)
+        self._size += path.stat().st_size - old
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        self._size -= size
+
+    def evict(self) -> None:
+        """
+        Deletes least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort(key=lambda e: e[0])
+
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hitRate": self.hits / lookups if lookups else None,
+            "sizeBytes": self._size,
+        }
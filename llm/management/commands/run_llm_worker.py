@@ -1,15 +1,35 @@
+import asyncio
+import os
 import time
+from contextlib import nullcontext
+from dataclasses import replace
+from datetime import timedelta
 from pathlib import Path
+from typing import List, Optional, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
-from forecasting.models import BacktestRun, BacktestStatus
-from llm.adapters import StubLLMAdapter
+from forecasting.models import BacktestRun, BacktestStatus, JobPriority
+from forecasting.services.digest import load_backtest_digest
+from forecasting.services.scheduler import Queue, claim
+from llm.adapters import (
+    CachingLLMAdapter,
+    HTTPLLMAdapter,
+    StubLLMAdapter,
+    aiter_chunks,
+    generate_batch,
+    iter_chunks,
+)
+from llm.cache import LLMResponseCache
+from llm.transport import CircuitBreaker, RetryPolicy
 from llm.models import LLMTask, LLMTaskType, Report, JobStatus
-from llm.prompt_builder import build_backtest_diagnosis_prompt, build_backtest_report_prompt
+from llm.prompt_builder import build_backtest_context, estimate_tokens, get_template
+from llm.ratelimit import admit, record_usage, release
 
 
 def build_backtest_summary(bt: BacktestRun) -> dict:
@@ -26,98 +46,313 @@ def build_backtest_summary(bt: BacktestRun) -> dict:
     }
 
 
-def build_backtest_prompt(bt: BacktestRun, task_type: str) -> str:
-    summary = build_backtest_summary(bt)
-    if task_type == LLMTaskType.GENERATE_REPORT:
-        return build_backtest_report_prompt(summary)
-    if task_type == LLMTaskType.EXPLAIN_BACKTEST:
-        return build_backtest_report_prompt(summary)
-    if task_type == LLMTaskType.DIAGNOSE_RESULT:
-        return build_backtest_diagnosis_prompt(summary)
-    raise ValueError(f"Unsupported task_type={task_type}")
+def build_backtest_prompt(
+    bt: BacktestRun, task_type: str, version: str = "v1", model_name: str = StubLLMAdapter.model_name
+) -> str:
+    template = get_template(task_type, version)
+    context = build_backtest_context(build_backtest_summary(bt), load_backtest_digest(bt))
+    return template.render(context, model_name)
 
 
-def write_report(task_id: str, content: str) -> Path:
+def begin_report(task: LLMTask) -> Path:
+    """
+    Creates the task's empty report artifact and publishes it as
+    output_uri right away, so the stream endpoint can follow the report
+    while chunks are appended.
+    """
     report_dir = settings.ARTIFACT_DIR / "reports"
     report_dir.mkdir(parents=True, exist_ok=True)
 
-    path = report_dir / f"{task_id}_report.md"
-    path.write_text(content, encoding="utf-8")
+    path = report_dir / f"{task.llm_task_id}_report.md"
+    path.write_text("", encoding="utf-8")
+    task.output_uri = str(path)
+    task.save(update_fields=["output_uri"])
     return path
 
 
-def claim_next_pending_task():
+LLM_QUEUE = Queue(
+    name="llm",
+    model=LLMTask,
+    pending=lambda: Q(status=JobStatus.PENDING) & (Q(not_before__isnull=True) | Q(not_before__lte=timezone.now())),
+    running=lambda: Q(status=JobStatus.RUNNING),
+)
+# batch mode splits the queue: interactive tasks one by one, BATCH in batches
+LLM_INTERACTIVE_QUEUE = replace(LLM_QUEUE, pending=lambda: LLM_QUEUE.pending() & Q(priority=JobPriority.INTERACTIVE))
+LLM_BATCH_QUEUE = replace(LLM_QUEUE, pending=lambda: LLM_QUEUE.pending() & Q(priority=JobPriority.BATCH))
+
+
+def _claim_task(pk):
+    """
+    Claims task `pk` if still pending and its tenant is within its rate
+    limits; otherwise the task stays pending with not_before set to when
+    the tenant's buckets will have refilled, and None is returned so the
+    scheduler moves on to other tenants.
+    """
     with transaction.atomic():
-        task = (
-            LLMTask.objects.select_for_update()
-            .filter(status=JobStatus.PENDING)
-            .order_by("created_at")
-            .first()
-        )
+        task = LLMTask.objects.select_for_update().filter(pk=pk, status=JobStatus.PENDING).first()
         if not task:
             return None
 
+        now = timezone.now()
+        wait = admit(task, now)
+        if wait:
+            task.not_before = now + timedelta(seconds=wait)
+            task.save(update_fields=["not_before"])
+            return None
+
         task.status = JobStatus.RUNNING
-        task.started_at = timezone.now()
+        task.started_at = now
+        task.not_before = None
         task.error_message = None
-        task.save(update_fields=["status", "started_at", "error_message"])
+        task.save(update_fields=["status", "started_at", "not_before", "reserved_tokens", "error_message"])
         return task
 
 
+def claim_next_pending_task(queue: Queue = LLM_QUEUE):
+    return claim(queue, _claim_task)
+
+
+def claim_batch(max_size: int, window_seconds: float) -> List[LLMTask]:
+    """
+    Claims up to `max_size` pending BATCH priority tasks, fair across
+    tenants, once `max_size` of them are waiting or the oldest has waited
+    `window_seconds`; until then claims nothing and returns [].
+    """
+    pending = LLMTask.objects.filter(LLM_BATCH_QUEUE.pending())
+    oldest = pending.order_by("created_at").values_list("created_at", flat=True).first()
+    if oldest is None:
+        return []
+    if (timezone.now() - oldest).total_seconds() < window_seconds and pending.count() < max_size:
+        return []
+
+    tasks = []
+    while len(tasks) < max_size:
+        task = claim_next_pending_task(LLM_BATCH_QUEUE)
+        if task is None:
+            break
+        tasks.append(task)
+    return tasks
+
+
 def validate_backtest_ready(bt: BacktestRun) -> None:
     allowed_statuses = {BacktestStatus.METRICS_DONE, BacktestStatus.REPORT_DONE}
     if bt.status not in allowed_statuses:
         raise ValueError(f"BacktestRun {bt.backtest_run_id} is not ready for LLM analysis")
 
 
-def process_task(task: LLMTask, adapter=None) -> LLMTask:
+def build_http_adapter(base_url: str, model_name: str, api_key=None) -> HTTPLLMAdapter:
+    cfg = settings.LLM_HTTP_ADAPTER
+    return HTTPLLMAdapter(
+        base_url,
+        model_name,
+        api_key=api_key,
+        timeout=cfg.get("timeout", 60.0),
+        pool_size=cfg.get("pool_size", 4),
+        retry=RetryPolicy(**cfg.get("retry", {})),
+        breaker=CircuitBreaker(**cfg.get("breaker", {})),
+    )
+
+
+def build_response_cache():
+    cfg = settings.LLM_RESPONSE_CACHE
+    if not cfg:
+        return None
+    return LLMResponseCache(cfg["dir"], cfg.get("max_bytes", 256 * 1024 * 1024), cfg.get("ttl_seconds"))
+
+
+def prepare_task(task: LLMTask, model_name: str = StubLLMAdapter.model_name) -> str:
+    """
+    The prompt for a claimed task, fitted to `model_name`'s token budget;
+    raises if its source is not ready.
+    """
+    if task.source_type != "BACKTEST":
+        raise ValueError(f"Unsupported source_type={task.source_type}")
+
+    bt = BacktestRun.objects.get(
+        backtest_run_id=task.source_id,
+        tenant_id=task.tenant_id,
+    )
+    validate_backtest_ready(bt)
+    return build_backtest_prompt(bt, task.task_type, task.prompt_template_version, model_name)
+
+
+def complete_task(task: LLMTask, model_name: str, prompt: str = "") -> LLMTask:
+    completion = Path(task.output_uri).read_text(encoding="utf-8") if task.output_uri else ""
+    record_usage(task, estimate_tokens(prompt), estimate_tokens(completion))
+
+    task.model_name = model_name or task.model_name
+    task.status = JobStatus.SUCCEEDED
+    task.finished_at = timezone.now()
+    task.save(update_fields=["model_name", "status", "finished_at"])
+
+    Report.objects.create(
+        report_id=Report.new_report_id(),
+        tenant_id=task.tenant_id,
+        source_type=task.source_type,
+        source_id=task.source_id,
+        llm_task_id=task.llm_task_id,
+        title=build_report_title(task.task_type),
+        format="MARKDOWN",
+        uri=task.output_uri,
+        summary_text=build_report_summary(task.task_type),
+    )
+    return task
+
+
+def fail_task(task: LLMTask, exc: BaseException) -> None:
+    task.status = JobStatus.FAILED
+    task.error_message = f"{type(exc).__name__}: {exc}"
+    task.finished_at = timezone.now()
+    task.save(update_fields=["status", "error_message", "finished_at"])
+    release(task)
+
+
+def _wrap_adapter(task: LLMTask, adapter, cache):
     adapter = adapter or StubLLMAdapter()
+    if cache is not None:
+        adapter = CachingLLMAdapter(adapter, cache, task.prompt_template_version)
+    return adapter
 
-    try:
-        if task.source_type != "BACKTEST":
-            raise ValueError(f"Unsupported source_type={task.source_type}")
 
-        bt = BacktestRun.objects.get(
-            backtest_run_id=task.source_id,
-            tenant_id=task.tenant_id,
-        )
-        validate_backtest_ready(bt)
-
-        prompt = build_backtest_prompt(bt, task.task_type)
-        content = adapter.generate(prompt)
-        path = write_report(task.llm_task_id, content)
-
-        task.model_name = getattr(adapter, "model_name", task.model_name)
-        task.output_uri = str(path)
-        task.status = JobStatus.SUCCEEDED
-        task.finished_at = timezone.now()
-        task.save(update_fields=["model_name", "output_uri", "status", "finished_at"])
-
-        Report.objects.create(
-            report_id=Report.new_report_id(),
-            tenant_id=task.tenant_id,
-            source_type=task.source_type,
-            source_id=task.source_id,
-            llm_task_id=task.llm_task_id,
-            title=build_report_title(task.task_type),
-            format="MARKDOWN",
-            uri=str(path),
-            summary_text=build_report_summary(task.task_type),
-        )
-        return task
+def process_task(task: LLMTask, adapter=None, cache=None) -> LLMTask:
+    adapter = _wrap_adapter(task, adapter, cache)
+    try:
+        prompt = prepare_task(task, getattr(adapter, "model_name", ""))
+        path = begin_report(task)
+        with path.open("a", encoding="utf-8") as f:
+            for chunk in iter_chunks(adapter, prompt):
+                f.write(chunk)
+                f.flush()
+        return complete_task(task, getattr(adapter, "model_name", None), prompt)
     except Exception as exc:
-        task.status = JobStatus.FAILED
-        task.error_message = f"{type(exc).__name__}: {exc}"
-        task.finished_at = timezone.now()
-        task.save(update_fields=["status", "error_message", "finished_at"])
+        fail_task(task, exc)
         raise
 
 
-def process_next_task(adapter=None):
+def process_next_task(adapter=None, cache=None):
     task = claim_next_pending_task()
     if not task:
         return None
-    return process_task(task, adapter=adapter)
+    return process_task(task, adapter=adapter, cache=cache)
+
+
+def _finish_batched(task: LLMTask, prompt: str, result, model_name: str) -> Optional[Exception]:
+    try:
+        if isinstance(result, Exception):
+            raise result
+        begin_report(task).write_text(result, encoding="utf-8")
+        complete_task(task, model_name, prompt)
+        return None
+    except Exception as exc:
+        fail_task(task, exc)
+        return exc
+
+
+def process_batch(tasks: List[LLMTask], adapter=None, cache=None) -> List[Tuple[LLMTask, Optional[Exception]]]:
+    """
+    Claimed tasks through one generate_batch call per prompt template
+    version (the response cache is keyed by it), each text fanned back out
+    to its task's report. Tasks fail one by one: a prompt that cannot be
+    built or a generation that failed fails only its own task. Returns
+    (task, exception or None) per task, in order.
+    """
+    adapter = adapter or StubLLMAdapter()
+    outcomes = {}
+    groups = {}
+    for task in tasks:
+        try:
+            prompt = prepare_task(task, getattr(adapter, "model_name", ""))
+        except Exception as exc:
+            fail_task(task, exc)
+            outcomes[task.pk] = exc
+            continue
+        groups.setdefault(task.prompt_template_version, []).append((task, prompt))
+
+    for group in groups.values():
+        wrapped = _wrap_adapter(group[0][0], adapter, cache)
+        prompts = [prompt for _, prompt in group]
+        try:
+            results = generate_batch(wrapped, prompts)
+        except Exception as exc:
+            results = [exc] * len(group)
+        model_name = getattr(wrapped, "model_name", None)
+        for (task, prompt), result in zip(group, results):
+            outcomes[task.pk] = _finish_batched(task, prompt, result, model_name)
+    return [(task, outcomes[task.pk]) for task in tasks]
+
+
+async def aprocess_task(task: LLMTask, adapter=None, cache=None, semaphore=None) -> LLMTask:
+    """
+    process_task for the asyncio worker: the generation is streamed (under
+    `semaphore`, if given) while every DB step runs on asgiref's
+    thread-sensitive executor, one thread shared by all tasks, so the event
+    loop never blocks on them and DB writes stay serialized. Chunk appends
+    are small and done inline.
+    """
+    adapter = _wrap_adapter(task, adapter, cache)
+    try:
+        prompt = await sync_to_async(prepare_task)(task, getattr(adapter, "model_name", ""))
+        path = await sync_to_async(begin_report)(task)
+        async with semaphore or nullcontext():
+            with path.open("a", encoding="utf-8") as f:
+                async for chunk in aiter_chunks(adapter, prompt):
+                    f.write(chunk)
+                    f.flush()
+        return await sync_to_async(complete_task)(task, getattr(adapter, "model_name", None), prompt)
+    except Exception as exc:
+        await sync_to_async(fail_task)(task, exc)
+        raise
+
+
+async def serve_concurrently(
+    adapter=None,
+    cache=None,
+    concurrency: int = 4,
+    poll_interval: float = 0.5,
+    idle_exit: bool = False,
+    on_done=None,
+) -> int:
+    """
+    Keeps up to `concurrency` tasks in flight: whenever slots are free it
+    claims a batch of that many pending tasks (fair across tenants, same
+    as the sync loop) and starts them. Returns the number of tasks
+    finished; with idle_exit it returns once nothing is pending or running,
+    otherwise it polls forever. on_done(task, exc) is called per task.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    claim_task = sync_to_async(claim_next_pending_task)
+    in_flight = set()
+    finished = 0
+
+    async def run(task):
+        exc = None
+        try:
+            await aprocess_task(task, adapter=adapter, cache=cache, semaphore=semaphore)
+        except Exception as e:
+            exc = e
+        if on_done is not None:
+            on_done(task, exc)
+
+    while True:
+        while len(in_flight) < concurrency:
+            task = await claim_task()
+            if task is None:
+                break
+            in_flight.add(asyncio.ensure_future(run(task)))
+
+        if not in_flight:
+            if idle_exit:
+                return finished
+            await asyncio.sleep(poll_interval)
+            continue
+
+        done, in_flight = await asyncio.wait(
+            in_flight,
+            # with free slots, wake up to poll for new tasks
+            timeout=None if len(in_flight) >= concurrency else poll_interval,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        finished += len(done)
 
 
 def build_report_title(task_type: str) -> str:
@@ -139,19 +374,80 @@ def build_report_summary(task_type: str) -> str:
 class Command(BaseCommand):
     help = "Run LLM worker loop"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.LLM_WORKER_CONCURRENCY,
+            help="generations in flight at once; above 1 runs the asyncio worker",
+        )
+        parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint instead of the stub")
+        parser.add_argument("--model", default=None)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.LLM_WORKER_BATCH["max_size"],
+            help="send BATCH priority tasks to the provider in batches of up to this many",
+        )
+        parser.add_argument(
+            "--batch-window",
+            type=float,
+            default=settings.LLM_WORKER_BATCH["window_seconds"],
+            help="seconds the oldest BATCH task waits for a batch to fill",
+        )
+
     def handle(self, *args, **options):
+        batching = options["batch_size"] > 1
+        if batching and options["concurrency"] > 1:
+            raise CommandError("--batch-size is only supported with --concurrency 1")
+
         self.stdout.write(self.style.SUCCESS("LLM worker started. Polling DB..."))
-        adapter = StubLLMAdapter()
+        if options["base_url"]:
+            adapter = build_http_adapter(
+                options["base_url"], options["model"] or "gpt-4o-mini", api_key=os.environ.get("LLM_API_KEY")
+            )
+        else:
+            adapter = StubLLMAdapter()
+        cache = build_response_cache()
+
+        if options["concurrency"] > 1:
+            asyncio.run(
+                serve_concurrently(
+                    adapter=adapter,
+                    cache=cache,
+                    concurrency=options["concurrency"],
+                    on_done=lambda task, exc: self._report(task, cache, exc),
+                )
+            )
+            return
 
         while True:
-            task = claim_next_pending_task()
-            if not task:
-                time.sleep(0.5)
+            task = claim_next_pending_task(LLM_INTERACTIVE_QUEUE if batching else LLM_QUEUE)
+            if task:
+                try:
+                    process_task(task, adapter=adapter, cache=cache)
+                    self._report(task, cache)
+                except Exception as exc:
+                    self._report(task, cache, exc)
+                continue
+
+            batch = claim_batch(options["batch_size"], options["batch_window"]) if batching else []
+            if batch:
+                self.stdout.write(f"BATCH: {len(batch)} task(s)")
+                for task, exc in process_batch(batch, adapter=adapter, cache=cache):
+                    self._report(task, cache, exc)
                 continue
 
-            try:
-                process_task(task, adapter=adapter)
-                self.stdout.write(f"SUCCEEDED:{task.llm_task_id}")
-            except Exception:
-                task.refresh_from_db()
-                self.stderr.write(f"FAILED:{task.llm_task_id} ->{task.error_message}")
+            time.sleep(0.5)
+
+    def _report(self, task: LLMTask, cache, exc=None) -> None:
+        if exc is not None:
+            self.stderr.write(f"FAILED:{task.llm_task_id} ->{task.error_message}")
+        elif cache is not None:
+            stats = cache.stats()
+            self.stdout.write(
+                f"SUCCEEDED:{task.llm_task_id} "
+                f"(cache hits={stats['hits']} misses={stats['misses']} hitRate={stats['hitRate']:.2f})"
+            )
+        else:
+            self.stdout.write(f"SUCCEEDED:{task.llm_task_id}")
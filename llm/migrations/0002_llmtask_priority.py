@@ -0,0 +1,22 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llmtask",
+            name="priority",
+            field=models.CharField(
+                choices=[("INTERACTIVE", "Interactive"), ("BATCH", "Batch")],
+                default="INTERACTIVE",
+                max_length=16,
+            ),
+        ),
+    ]
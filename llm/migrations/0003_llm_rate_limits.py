@@ -0,0 +1,67 @@
+# Generated by Django 5.0.8 on 2026-10-19 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm", "0002_llmtask_priority"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMRateBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.CharField(max_length=64, unique=True)),
+                ("requests", models.FloatField()),
+                ("tokens", models.FloatField()),
+                ("refilled_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LLMUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant_id", models.CharField(max_length=64)),
+                ("day", models.DateField()),
+                ("requests", models.IntegerField(default=0)),
+                ("prompt_tokens", models.IntegerField(default=0)),
+                ("completion_tokens", models.IntegerField(default=0)),
+                ("deferrals", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="llmtask",
+            name="not_before",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmtask",
+            name="reserved_tokens",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name="llmusage",
+            constraint=models.UniqueConstraint(
+                fields=("tenant_id", "day"), name="uq_llm_usage_tenant_day"
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 import uuid
 
+from forecasting.models import JobPriority
+
 
 class JobStatus(models.TextChoices):
     PENDING = "PENDING"
@@ -38,8 +40,13 @@ class LLMTask(models.Model):
     model_name = models.CharField(max_length=64, default="stub-llm-v1")
 
     status = models.CharField(max_length=16, choices=JobStatus.choices, default=JobStatus.PENDING)
+    priority = models.CharField(max_length=16, choices=JobPriority.choices, default=JobPriority.INTERACTIVE)
     output_uri = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
+    # set when the tenant was over its rate limit: not claimed before then
+    not_before = models.DateTimeField(null=True, blank=True)
+    # estimated tokens taken from the tenant's bucket when it was claimed
+    reserved_tokens = models.IntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
@@ -50,6 +57,37 @@ class LLMTask(models.Model):
         return f"llm_{uuid.uuid4().hex[:12]}"
 
 
+class LLMRateBucket(models.Model):
+    """
+    A tenant's token buckets (llm.ratelimit): request and token levels as
+    of refilled_at. The token level goes negative when tasks used more
+    than was reserved for them.
+    """
+    tenant_id = models.CharField(max_length=64, unique=True)
+    requests = models.FloatField()
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+
+
+class LLMUsage(models.Model):
+    """
+    What a tenant's LLM tasks used per day: requests admitted, estimated
+    prompt and completion tokens of the tasks that succeeded, and how many
+    times a task was deferred by the rate limits.
+    """
+    tenant_id = models.CharField(max_length=64)
+    day = models.DateField()
+    requests = models.IntegerField(default=0)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    deferrals = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tenant_id", "day"], name="uq_llm_usage_tenant_day")
+        ]
+
+
 class Report(models.Model):
     report_id = models.CharField(max_length=64, unique=True, db_index=True)
     tenant_id = models.CharField(max_length=64, db_index=True)
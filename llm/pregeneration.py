@@ -0,0 +1,76 @@
+from typing import List, Optional
+
+from django.conf import settings
+
+from forecasting.models import BacktestRun, JobPriority
+
+from .models import JobStatus, LLMSourceType, LLMTask
+
+
+def pregeneration_policy(tenant_id: str) -> dict:
+    """
+    settings.LLM_PREGENERATE[tenant_id] over its "default": the task_types
+    to generate for every backtest that reaches METRICS_DONE (empty: the
+    tenant has not opted in) and their prompt_template_version.
+    """
+    cfg = settings.LLM_PREGENERATE
+    return {"task_types": [], "prompt_template_version": "v1", **cfg.get("default", {}), **cfg.get(tenant_id, {})}
+
+
+def backtest_input_refs(bt: BacktestRun) -> dict:
+    return {
+        "backtestRunId": bt.backtest_run_id,
+        "datasetVersionId": bt.dataset_version.dataset_version_id,
+        "strategyId": bt.strategy.strategy_id,
+    }
+
+
+def find_pregenerated(
+    tenant_id: str, source_type: str, source_id: str, task_type: str, version: str
+) -> Optional[LLMTask]:
+    """
+    The pregenerated task for (source, task type, template version) that
+    has not failed, if any.
+    """
+    return (
+        LLMTask.objects.filter(
+            tenant_id=tenant_id,
+            source_type=source_type,
+            source_id=source_id,
+            task_type=task_type,
+            prompt_template_version=version,
+            input_refs_json__pregenerated=True,
+        )
+        .exclude(status=JobStatus.FAILED)
+        .order_by("-created_at")
+        .first()
+    )
+
+
+def enqueue_pregenerated(bt: BacktestRun) -> List[LLMTask]:
+    """
+    Creates the BATCH priority LLM tasks the tenant's policy asks for on a
+    backtest with metrics, skipping those already queued or done, so the
+    report is usually ready by the time a user asks for it. Returns the
+    tasks created.
+    """
+    policy = pregeneration_policy(bt.tenant_id)
+    version = policy["prompt_template_version"]
+    created = []
+    for task_type in policy["task_types"]:
+        if find_pregenerated(bt.tenant_id, LLMSourceType.BACKTEST, bt.backtest_run_id, task_type, version):
+            continue
+        created.append(
+            LLMTask.objects.create(
+                llm_task_id=LLMTask.new_task_id(),
+                tenant_id=bt.tenant_id,
+                task_type=task_type,
+                source_type=LLMSourceType.BACKTEST,
+                source_id=bt.backtest_run_id,
+                prompt_template_version=version,
+                priority=JobPriority.BATCH,
+                status=JobStatus.PENDING,
+                input_refs_json={**backtest_input_refs(bt), "pregenerated": True},
+            )
+        )
+    return created
@@ -1,24 +1,109 @@
-def build_backtest_context(backtest_summary: dict) -> str:
-    return f"""
-Backtest Summary:
-- backtestRunId:{backtest_summary.get('backtestRunId')}
-- datasetVersionId:{backtest_summary.get('datasetVersionId')}
-- strategyId:{backtest_summary.get('strategyId')}
-- totalReturn:{backtest_summary.get('totalReturn')}
-- maxDrawdown:{backtest_summary.get('maxDrawdown')}
-- sharpe:{backtest_summary.get('sharpe')}
-- tradeCount:{backtest_summary.get('tradeCount')}
-- winRate:{backtest_summary.get('winRate')}
-""".strip()
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .models import LLMTaskType
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough BPE token count without a tokenizer: one token per 4 characters
+    of each word, one per punctuation mark. Errs high on long numbers,
+    which is the safe side for a budget.
+    """
+    return sum(math.ceil(len(w) / 4) for w in _WORDS.findall(text))
+
+
+def token_budget(model_name: str) -> int:
+    """
+    Prompt tokens allowed for `model_name`: settings.LLM_PROMPT_TOKEN_BUDGETS
+    by model, falling back to its "default".
+    """
+    budgets = settings.LLM_PROMPT_TOKEN_BUDGETS
+    return int(budgets.get(model_name, budgets["default"]))
+
+
+class ContextSection(NamedTuple):
+    """
+    A titled block of context lines. Over budget, sections with the
+    highest `priority` number are cut first; priority 0 is cut last.
+    """
+    title: str
+    lines: List[str]
+    priority: int = 0
+
+
+def render_section(title: str, lines: List[str], omitted: int = 0) -> str:
+    out = [f"{title}:", *lines]
+    if omitted:
+        out.append(f"- ... {omitted} more line(s) omitted")
+    return "\n".join(out)
+
+
+class PromptBudgetError(ValueError):
+    pass
+
+
+def fit_context(sections: List[ContextSection], budget: int) -> str:
+    """
+    The sections rendered in order, cut to at most `budget` tokens. Cuts
+    go by priority (highest number first) and keep each section's leading
+    lines, noting how many were left out; a section cut to nothing keeps
+    only its title and that note.
+    """
+    kept = [len(s.lines) for s in sections]
+
+    def render(i: int) -> str:
+        s = sections[i]
+        return render_section(s.title, s.lines[: kept[i]], len(s.lines) - kept[i])
+
+    sizes = [estimate_tokens(render(i)) for i in range(len(sections))]
+    over = sum(sizes) - budget
+    for i in sorted(range(len(sections)), key=lambda i: -sections[i].priority):
+        if over <= 0:
+            break
+        while kept[i] > 0 and over > 0:
+            kept[i] -= 1
+            size = estimate_tokens(render(i))
+            over += size - sizes[i]
+            sizes[i] = size
+    if over > 0:
+        raise PromptBudgetError(f"prompt context needs {over} token(s) more than its budget")
+    return "\n\n".join(render(i) for i in range(len(sections)))
 
 
-def build_backtest_report_prompt(backtest_summary: dict) -> str:
-    return f"""
-You are a trading analysis assistant.
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A prompt is the static `prefix` (instructions, byte-identical for
+    every task of this type and version, so provider-side prompt caching
+    applies) followed by the task's context, trimmed to what the model's
+    budget leaves after the prefix.
+    """
+    task_type: str
+    version: str
+    prefix: str
+    prefix_tokens: int = field(init=False)
 
-Please generate a concise backtest report.
+    def __post_init__(self):
+        object.__setattr__(self, "prefix_tokens", estimate_tokens(self.prefix))
 
-{build_backtest_context(backtest_summary)}
+    def render(self, sections: List[ContextSection], model_name: str) -> str:
+        context = fit_context(sections, token_budget(model_name) - self.prefix_tokens)
+        return f"{self.prefix}\n\n{context}"
+
+
+_ASSISTANT = "You are a trading analysis assistant."
+
+_REPORT_V1 = f"""
+{_ASSISTANT}
+
+Please generate a concise backtest report from the context below.
 
 Please provide:
 1. Executive summary
@@ -27,16 +112,108 @@ Please provide:
 4. Suggestions for next iteration
 """.strip()
 
+_DIAGNOSIS_V1 = f"""
+{_ASSISTANT} You focus on diagnosing backtest weaknesses.
 
-def build_backtest_diagnosis_prompt(backtest_summary: dict) -> str:
-    return f"""
-You are a trading analysis assistant focused on diagnosing backtest weaknesses.
-
-Please diagnose the backtest result with emphasis on:
+Please diagnose the backtest result in the context below with emphasis on:
 1. Whether drawdown is too large
 2. Whether trade frequency may be too high
 3. Whether performance may be concentrated in a small number of favorable windows
 4. Concrete next-step fixes
-
-{build_backtest_context(backtest_summary)}
 """.strip()
+
+_SOURCES = [
+    (LLMTaskType.GENERATE_REPORT, "v1", _REPORT_V1),
+    (LLMTaskType.EXPLAIN_BACKTEST, "v1", _REPORT_V1),
+    (LLMTaskType.DIAGNOSE_RESULT, "v1", _DIAGNOSIS_V1),
+]
+
+# built once at import: (task type, version) -> template
+TEMPLATES: Dict[Tuple[str, str], PromptTemplate] = {
+    (task_type, version): PromptTemplate(task_type, version, prefix)
+    for task_type, version, prefix in _SOURCES
+}
+
+
+def get_template(task_type: str, version: str) -> PromptTemplate:
+    try:
+        return TEMPLATES[(task_type, version)]
+    except KeyError:
+        raise ValueError(f"No prompt template for taskType={task_type} version={version}") from None
+
+
+def _pct(value) -> str:
+    return "n/a" if value is None else f"{value:+.2%}"
+
+
+def digest_sections(digest: dict) -> List[ContextSection]:
+    """
+    A backtest digest (forecasting.services.digest) as context sections,
+    least important last: drawdowns and trades, then regimes, then the
+    return tables.
+    """
+    sections = []
+    windows = [
+        f"- {_pct(w['depth'])}: peak {w['peak']}, trough {w['trough']}, "
+        + (f"recovered {w['recovery']}" if w["recovery"] else "not recovered")
+        + f" ({w['bars']} bars)"
+        for w in digest.get("drawdowns") or []
+    ]
+    if windows:
+        sections.append(ContextSection("Deepest Drawdowns", windows, priority=1))
+    trades = digest.get("trades")
+    if trades:
+        sections.append(ContextSection("Trade Statistics", [f"- {k}:{v}" for k, v in trades.items()], priority=1))
+    regimes = [
+        f"- {r['regime']}: {r['share']:.0%} of bars in {r['stretches']} stretch(es), "
+        f"market {_pct(r['marketReturn'])}, strategy {_pct(r['strategyReturn'])}"
+        for r in digest.get("regimes") or []
+    ]
+    if regimes:
+        sections.append(ContextSection("Market Regimes", regimes, priority=2))
+    returns = digest.get("returns")
+    if returns:
+        lines = [
+            f"- {returns['months']} months, {returns['positiveMonths']:.0%} positive; "
+            f"best {returns['bestMonth']['month']} {_pct(returns['bestMonth']['return'])}, "
+            f"worst {returns['worstMonth']['month']} {_pct(returns['worstMonth']['return'])}",
+            "- yearly: " + ", ".join(f"{y} {_pct(v)}" for y, v in returns["yearly"].items()),
+        ]
+        lines += [
+            f"- {year} Jan-Dec: " + " ".join("." if v is None else f"{v:+.1%}" for v in months)
+            for year, months in sorted(returns["monthly"].items(), reverse=True)
+        ]
+        sections.append(ContextSection("Monthly Returns", lines, priority=3))
+    return sections
+
+
+SUMMARY_KEYS = [
+    "backtestRunId",
+    "datasetVersionId",
+    "strategyId",
+    "totalReturn",
+    "maxDrawdown",
+    "sharpe",
+    "tradeCount",
+    "winRate",
+]
+
+
+def build_backtest_context(backtest_summary: dict, digest: Optional[dict] = None) -> List[ContextSection]:
+    """
+    The summary first and never dropped, then the digest's sections when
+    there is one. Metrics missing from the stored summary are taken from
+    the digest, which recomputes them from the simulation arrays.
+    """
+    summary = dict(backtest_summary)
+    lines = []
+    if digest:
+        recomputed = {**digest.get("metrics", {}), **(digest.get("trades") or {})}
+        for key in SUMMARY_KEYS:
+            if summary.get(key) is None and recomputed.get(key) is not None:
+                summary[key] = recomputed[key]
+        lines.append(f"- period:{digest.get('start')} .. {digest.get('end')} ({digest.get('bars')} bars)")
+        extra = ["annualizedReturn", "volatility", "sortino", "calmar", "maxDrawdownDuration", "exposure", "turnover"]
+        lines += [f"- {k}:{digest['metrics'][k]}" for k in extra if digest["metrics"].get(k) is not None]
+    lines = [f"- {k}:{summary.get(k)}" for k in SUMMARY_KEYS] + lines
+    return [ContextSection("Backtest Summary", lines), *(digest_sections(digest) if digest else [])]
@@ -0,0 +1,149 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LLMRateBucket, LLMTask, LLMUsage
+
+
+def rate_policy(tenant_id: str) -> dict:
+    """
+    settings.LLM_RATE_LIMITS[tenant_id] over its "default":
+    requests_per_minute and tokens_per_minute (bucket refill rates; a
+    bucket holds one minute's worth), daily_tokens, and task_tokens, the
+    estimate reserved for a task before the tenant has usage to average.
+    None is unlimited.
+    """
+    cfg = settings.LLM_RATE_LIMITS
+    return {
+        "requests_per_minute": None,
+        "tokens_per_minute": None,
+        "daily_tokens": None,
+        "task_tokens": 2000,
+        **cfg.get("default", {}),
+        **cfg.get(tenant_id, {}),
+    }
+
+
+def add_usage(tenant_id: str, day, **counts) -> None:
+    """
+    Adds `counts` (requests=1, prompt_tokens=..., ...) to the tenant's
+    LLMUsage row for `day`.
+    """
+    LLMUsage.objects.get_or_create(tenant_id=tenant_id, day=day)
+    LLMUsage.objects.filter(tenant_id=tenant_id, day=day).update(**{k: F(k) + v for k, v in counts.items()})
+
+
+def estimate_task_tokens(tenant_id: str, day, policy: dict) -> int:
+    """
+    Tokens to reserve for one of the tenant's tasks: its tokens used per
+    request that day, else (no usage booked yet) policy["task_tokens"].
+    """
+    usage = LLMUsage.objects.filter(tenant_id=tenant_id, day=day).first()
+    used = usage.prompt_tokens + usage.completion_tokens if usage else 0
+    if not used:
+        return int(policy["task_tokens"])
+    return max(1, round(used / usage.requests))
+
+
+def _bucket(tenant_id: str, policy: dict, now) -> LLMRateBucket:
+    """
+    The tenant's bucket row, locked and refilled up to `now`.
+    """
+    rpm, tpm = policy["requests_per_minute"], policy["tokens_per_minute"]
+    bucket, created = LLMRateBucket.objects.select_for_update().get_or_create(
+        tenant_id=tenant_id,
+        defaults={"requests": rpm or 0.0, "tokens": tpm or 0.0, "refilled_at": now},
+    )
+    if not created:
+        minutes = max((now - bucket.refilled_at).total_seconds(), 0.0) / 60.0
+        if rpm is not None:
+            bucket.requests = min(float(rpm), bucket.requests + minutes * rpm)
+        if tpm is not None:
+            bucket.tokens = min(float(tpm), bucket.tokens + minutes * tpm)
+        bucket.refilled_at = now
+    return bucket
+
+
+def admit(task: LLMTask, now=None) -> float:
+    """
+    Takes one request and the task's estimated tokens from its tenant's
+    buckets and returns 0, or returns the seconds until the tenant is back
+    under its limits and takes nothing (a deferral). Tokens are admitted
+    while the bucket is not in debt, so one task may overdraw it; the
+    reservation is stored on the task and settled by record_usage or
+    release. Over the daily budget, the wait is until the next day. Call
+    inside the transaction that claims the task.
+    """
+    now = now or timezone.now()
+    day = timezone.localdate(now)
+    policy = rate_policy(task.tenant_id)
+    rpm, tpm, daily = policy["requests_per_minute"], policy["tokens_per_minute"], policy["daily_tokens"]
+
+    wait = 0.0
+    if daily is not None:
+        used = LLMUsage.objects.filter(tenant_id=task.tenant_id, day=day).values_list(
+            F("prompt_tokens") + F("completion_tokens"), flat=True
+        ).first()
+        if (used or 0) >= daily:
+            midnight = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+            wait = (midnight - now).total_seconds()
+
+    bucket = None
+    if not wait and (rpm is not None or tpm is not None):
+        bucket = _bucket(task.tenant_id, policy, now)
+        if rpm is not None and bucket.requests < 1:
+            wait = max(wait, (1 - bucket.requests) / rpm * 60.0)
+        if tpm is not None and bucket.tokens < 0:
+            wait = max(wait, -bucket.tokens / tpm * 60.0)
+
+    if wait:
+        if bucket is not None:
+            bucket.save()
+        add_usage(task.tenant_id, day, deferrals=1)
+        return wait
+
+    task.reserved_tokens = estimate_task_tokens(task.tenant_id, day, policy)
+    if bucket is not None:
+        if rpm is not None:
+            bucket.requests -= 1
+        if tpm is not None:
+            bucket.tokens -= task.reserved_tokens
+        bucket.save()
+    add_usage(task.tenant_id, day, requests=1)
+    return 0.0
+
+
+def _settle(task: LLMTask, used_tokens: int) -> None:
+    tpm = rate_policy(task.tenant_id)["tokens_per_minute"]
+    if tpm is None:
+        return
+    bucket = LLMRateBucket.objects.select_for_update().filter(tenant_id=task.tenant_id).first()
+    if bucket is not None:
+        bucket.tokens = min(float(tpm), bucket.tokens + task.reserved_tokens - used_tokens)
+        bucket.save(update_fields=["tokens"])
+
+
+def record_usage(task: LLMTask, prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Books a succeeded task's tokens to today's usage and settles its
+    reservation against what it actually used.
+    """
+    with transaction.atomic():
+        add_usage(
+            task.tenant_id,
+            timezone.localdate(),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        _settle(task, prompt_tokens + completion_tokens)
+
+
+def release(task: LLMTask) -> None:
+    """
+    Returns a failed task's reserved tokens to its tenant's bucket.
+    """
+    with transaction.atomic():
+        _settle(task, 0)
@@ -1,11 +1,14 @@
 from rest_framework import serializers
 
+from forecasting.models import JobPriority
+
 
 class LLMTaskCreateSerializer(serializers.Serializer):
     taskType = serializers.CharField()
     sourceType = serializers.CharField()
     sourceId = serializers.CharField()
     promptTemplateVersion = serializers.CharField(required=False, default="v1")
+    priority = serializers.ChoiceField(choices=JobPriority.choices, required=False, default=JobPriority.INTERACTIVE)
 
 
 class LLMTaskCreateResponseSerializer(serializers.Serializer):
@@ -22,6 +25,7 @@ class LLMTaskSerializer(serializers.Serializer):
     modelName = serializers.CharField()
     outputUri = serializers.CharField(allow_null=True)
     errorMessage = serializers.CharField(allow_null=True)
+    notBefore = serializers.CharField(allow_null=True)
     createdAt = serializers.CharField()
     startedAt = serializers.CharField(allow_null=True)
     finishedAt = serializers.CharField(allow_null=True)
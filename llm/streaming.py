@@ -0,0 +1,110 @@
+import asyncio
+import codecs
+import json
+import time
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import JobStatus, LLMTask
+
+KEEPALIVE_SECONDS = 15.0
+
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ReportCursor:
+    """
+    A stream's position in a task's report artifact. Each poll() looks at
+    the task once and returns the events to send and whether the stream is
+    over; report_events and areport_events only differ in how they wait
+    between polls.
+    """
+
+    def __init__(self, task_pk: int, offset: int = 0):
+        self.task_pk = task_pk
+        self.pos = offset
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.last_write = time.monotonic()
+
+    def poll(self) -> Tuple[List[str], bool]:
+        # status before content: once SUCCEEDED is seen the file is complete
+        task = LLMTask.objects.filter(pk=self.task_pk).values("status", "output_uri", "error_message").first()
+        if task is None:
+            return [sse_event("error", {"detail": "Task not found"})], True
+
+        data = b""
+        if task["output_uri"]:
+            try:
+                with open(task["output_uri"], "rb") as f:
+                    f.seek(self.pos)
+                    data = f.read()
+            except OSError:
+                pass
+        self.pos += len(data)
+        text = self.decoder.decode(data)
+        # a multi-byte character cut by the writer stays buffered
+        done_offset = self.pos - len(self.decoder.getstate()[0])
+
+        events = []
+        if text:
+            events.append(sse_event("chunk", {"text": text}, done_offset))
+            self.last_write = time.monotonic()
+        if task["status"] == JobStatus.SUCCEEDED:
+            events.append(sse_event("done", {"status": task["status"]}, done_offset))
+            return events, True
+        if task["status"] == JobStatus.FAILED:
+            events.append(sse_event("error", {"status": task["status"], "detail": task["error_message"]}, done_offset))
+            return events, True
+        if time.monotonic() - self.last_write >= KEEPALIVE_SECONDS:
+            events.append(": keep-alive\n\n")
+            self.last_write = time.monotonic()
+        return events, False
+
+
+def report_events(task_pk: int, offset: int = 0, max_seconds: Optional[float] = None) -> Iterator[str]:
+    """
+    Server-sent events following a task's report artifact as the worker
+    appends to it: a "chunk" event per poll that found new text, then
+    "done" once the task succeeded or "error" once it failed. Event ids
+    are byte offsets into the artifact, so a client reconnecting with
+    Last-Event-ID resumes where it left off. The stream ends after
+    max_seconds (default LLM_STREAM_MAX_SECONDS); clients reconnect to
+    keep following.
+
+    This one sleeps between polls and so holds a worker thread for its
+    whole life; under ASGI use areport_events.
+    """
+    cursor = ReportCursor(task_pk, offset)
+    deadline = time.monotonic() + (max_seconds or settings.LLM_STREAM_MAX_SECONDS)
+    while True:
+        events, finished = cursor.poll()
+        yield from events
+        if finished or time.monotonic() >= deadline:
+            return
+        time.sleep(settings.LLM_STREAM_POLL_SECONDS)
+
+
+async def areport_events(task_pk: int, offset: int = 0, max_seconds: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    report_events for ASGI: waits on the event loop, so an open stream
+    costs no thread, and a client that disconnects cancels it at the next
+    wait.
+    """
+    cursor = ReportCursor(task_pk, offset)
+    poll = sync_to_async(cursor.poll)
+    deadline = time.monotonic() + (max_seconds or settings.LLM_STREAM_MAX_SECONDS)
+    while True:
+        events, finished = await poll()
+        for event in events:
+            yield event
+        if finished or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(settings.LLM_STREAM_POLL_SECONDS)
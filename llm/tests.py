@@ -1,7 +1,21 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from datetime import time as dt_time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from unittest import mock
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.test import TestCase, override_settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from rest_framework.test import APIClient
 
 from forecasting.models import (
@@ -12,12 +26,29 @@ from forecasting.models import (
     DatasetVersionStatus,
     Strategy,
 )
-from llm.management.commands.run_llm_worker import process_next_task
-from llm.models import JobStatus, LLMSourceType, LLMTask, LLMTaskType, Report
+from llm.adapters import CachingLLMAdapter, HTTPLLMAdapter, LLMProviderError, StubLLMAdapter, generate_batch
+from llm.cache import LLMResponseCache
+from llm.management.commands.run_llm_worker import (
+    build_backtest_prompt,
+    claim_batch,
+    process_batch,
+    process_next_task,
+    serve_concurrently,
+)
+from llm.pregeneration import enqueue_pregenerated
+from llm.prompt_builder import (
+    ContextSection,
+    PromptBudgetError,
+    estimate_tokens,
+    fit_context,
+    get_template,
+)
+from llm.streaming import ReportCursor
+from llm.transport import CircuitBreaker, CircuitOpenError, RetryPolicy
+from llm.models import JobStatus, LLMRateBucket, LLMSourceType, LLMTask, LLMTaskType, LLMUsage, Report
 
 
-@override_settings(ARTIFACT_DIR=settings.BASE_DIR / "test_artifacts")
-class LLMWorkerTests(TestCase):
+class LLMFixtures:
     def setUp(self):
         self.tenant_id = "tenant_demo_1"
         self.dataset = Dataset.objects.create(
@@ -76,6 +107,13 @@ class LLMWorkerTests(TestCase):
             source_id=source_id,
         )
 
+
+@override_settings(ARTIFACT_DIR=settings.BASE_DIR / "test_artifacts")
+class LLMTestBase(LLMFixtures, TestCase):
+    pass
+
+
+class LLMWorkerTests(LLMTestBase):
     def test_process_next_task_marks_success_and_writes_artifact(self):
         self.create_backtest()
         task = self.create_task("bt_test")
@@ -140,6 +178,33 @@ class LLMWorkerTests(TestCase):
         self.assertIn("Backtest Analysis Report", result_response.data["content"])
         self.assertIsNotNone(result_response.data["reportId"])
 
+    def test_create_task_api_returns_the_pregenerated_task(self):
+        bt = self.create_backtest()
+        with override_settings(LLM_PREGENERATE={self.tenant_id: {"task_types": ["GENERATE_REPORT"]}}):
+            [pregenerated] = enqueue_pregenerated(bt)
+        payload = {"taskType": "GENERATE_REPORT", "sourceType": "BACKTEST", "sourceId": "bt_test"}
+
+        # still queued: handed out and moved up to the requester's priority
+        resp = self.client.post("/api/v1/llm/tasks", payload, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, {"llmTaskId": pregenerated.llm_task_id, "status": "PENDING"})
+        pregenerated.refresh_from_db()
+        self.assertEqual(pregenerated.priority, "INTERACTIVE")
+
+        process_next_task()
+        resp = self.client.post("/api/v1/llm/tasks", payload, format="json")
+        self.assertEqual(resp.data, {"llmTaskId": pregenerated.llm_task_id, "status": "SUCCEEDED"})
+        self.assertEqual(LLMTask.objects.count(), 1)
+
+        other = self.client.post("/api/v1/llm/tasks", {**payload, "taskType": "DIAGNOSE_RESULT"}, format="json")
+        self.assertEqual(other.status_code, 201)
+
+        # a failed pregeneration is not handed out
+        LLMTask.objects.filter(pk=pregenerated.pk).update(status=JobStatus.FAILED)
+        retried = self.client.post("/api/v1/llm/tasks", payload, format="json")
+        self.assertEqual(retried.status_code, 201)
+        self.assertNotEqual(retried.data["llmTaskId"], pregenerated.llm_task_id)
+
     def test_create_task_api_rejects_unready_backtest(self):
         self.create_backtest(status=BacktestStatus.CREATED)
 
@@ -209,3 +274,882 @@ class LLMWorkerTests(TestCase):
         self.assertEqual(result_response.status_code, 200)
         self.assertIn("Backtest Result Diagnosis", result_response.data["content"])
         self.assertIn("drawdown", result_response.data["content"].lower())
+
+
+class PromptTemplateTests(LLMTestBase):
+    def test_templates_are_keyed_by_task_type_and_version(self):
+        report = get_template(LLMTaskType.GENERATE_REPORT, "v1")
+        diagnosis = get_template(LLMTaskType.DIAGNOSE_RESULT, "v1")
+        self.assertIn("backtest report", report.prefix)
+        self.assertIn("diagnos", diagnosis.prefix)
+        self.assertEqual(report.prefix_tokens, estimate_tokens(report.prefix))
+        with self.assertRaises(ValueError):
+            get_template(LLMTaskType.GENERATE_REPORT, "v9")
+
+    def test_create_task_api_rejects_unknown_template_version(self):
+        self.create_backtest()
+        response = self.client.post(
+            "/api/v1/llm/tasks",
+            {"taskType": "GENERATE_REPORT", "sourceType": "BACKTEST", "sourceId": "bt_test", "promptTemplateVersion": "v9"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("version=v9", response.data["detail"])
+
+    def test_static_prefix_comes_first(self):
+        template = get_template(LLMTaskType.DIAGNOSE_RESULT, "v1")
+        a = template.render([ContextSection("Backtest Summary", ["- backtestRunId:bt_a"])], "stub-llm-v1")
+        b = template.render([ContextSection("Backtest Summary", ["- backtestRunId:bt_b"])], "stub-llm-v1")
+        self.assertTrue(a.startswith(template.prefix + "\n\n"))
+        self.assertTrue(b.startswith(template.prefix + "\n\n"))
+        self.assertTrue(a.endswith("bt_a"))
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("sharp ratio: 1.25"), 2 + 2 + 1 + 1 + 1 + 1)
+
+    def test_lowest_priority_context_is_trimmed_first(self):
+        summary = ContextSection("Summary", [f"- metric{i}: {i}" for i in range(5)])
+        trades = ContextSection("Trades", [f"- trade {i}: buy 100 @ {i}" for i in range(200)], priority=2)
+        months = ContextSection("Months", [f"- 2024-{m:02d}: 0.01" for m in range(1, 13)], priority=1)
+        full = fit_context([summary, trades, months], 10_000)
+        self.assertNotIn("omitted", full)
+
+        budget = estimate_tokens(fit_context([summary, months], 10_000)) + 40
+        fitted = fit_context([summary, trades, months], budget)
+        self.assertLessEqual(estimate_tokens(fitted), budget)
+        self.assertIn("- metric4: 4", fitted)
+        self.assertIn("- 2024-12: 0.01", fitted)
+        self.assertIn("- trade 0: buy 100 @ 0", fitted)
+        self.assertIn("more line(s) omitted", fitted)
+        # section order is kept
+        self.assertLess(fitted.index("Trades:"), fitted.index("Months:"))
+
+        with self.assertRaises(PromptBudgetError):
+            fit_context([summary], 3)
+
+    def test_budget_follows_the_model(self):
+        template = get_template(LLMTaskType.GENERATE_REPORT, "v1")
+        sections = [ContextSection("Trades", [f"- trade {i}" for i in range(100)], priority=1)]
+        budgets = {"default": template.prefix_tokens + 60, "big-model": 100_000}
+        with override_settings(LLM_PROMPT_TOKEN_BUDGETS=budgets):
+            self.assertIn("omitted", template.render(sections, "stub-llm-v1"))
+            self.assertNotIn("omitted", template.render(sections, "big-model"))
+
+
+    def test_prompt_carries_the_backtest_digest(self):
+        bt = self.create_backtest()
+        bt.metrics_json = {**bt.metrics_json, "sharpe": None}
+        bt.save()
+        digest = {
+            "bars": 500,
+            "start": "2024-01-01 00:00:00",
+            "end": "2025-05-15 00:00:00",
+            "metrics": {"sharpe": 1.23, "volatility": 0.18},
+            "drawdowns": [
+                {"peak": "2024-03-01", "trough": "2024-04-02", "recovery": None, "depth": -0.2, "bars": 40},
+            ],
+            "returns": {
+                "monthly": {"2025": [0.01, -0.02, None, None, None, None, None, None, None, None, None, None]},
+                "yearly": {"2024": 0.08, "2025": -0.01},
+                "months": 17,
+                "positiveMonths": 0.6,
+                "bestMonth": {"month": "2024-07", "return": 0.05},
+                "worstMonth": {"month": "2025-02", "return": -0.02},
+            },
+            "trades": {"roundTrips": 12, "winRate": 0.5},
+            "regimes": [
+                {"regime": "up/low-vol", "share": 0.6, "stretches": 3, "marketReturn": 0.1, "strategyReturn": 0.04},
+            ],
+        }
+        with mock.patch("llm.management.commands.run_llm_worker.load_backtest_digest", return_value=digest):
+            prompt = build_backtest_prompt(bt, LLMTaskType.DIAGNOSE_RESULT)
+
+        self.assertIn("- sharpe:1.23", prompt)
+        self.assertIn("- winRate:0.56", prompt)
+        self.assertIn("- -20.00%: peak 2024-03-01, trough 2024-04-02, not recovered (40 bars)", prompt)
+        self.assertIn("- 2025 Jan-Dec: +1.0% -2.0% .", prompt)
+        self.assertIn("up/low-vol: 60% of bars in 3 stretch(es)", prompt)
+
+        # a tighter budget cuts the return tables before anything else
+        budgets = {"default": estimate_tokens(prompt) - 10}
+        with override_settings(LLM_PROMPT_TOKEN_BUDGETS=budgets), \
+                mock.patch("llm.management.commands.run_llm_worker.load_backtest_digest", return_value=digest):
+            tight = build_backtest_prompt(bt, LLMTaskType.DIAGNOSE_RESULT)
+        self.assertLessEqual(estimate_tokens(tight), budgets["default"])
+        self.assertNotIn("Jan-Dec", tight)
+        self.assertIn("more line(s) omitted", tight)
+        self.assertEqual(tight.split("Monthly Returns:")[0], prompt.split("Monthly Returns:")[0])
+
+
+class LLMRateLimitTests(LLMTestBase):
+    def limits(self, **policy):
+        return override_settings(LLM_RATE_LIMITS={"default": {}, self.tenant_id: policy})
+
+    def rewind_bucket(self, seconds):
+        LLMRateBucket.objects.update(refilled_at=timezone.now() - timedelta(seconds=seconds))
+        LLMTask.objects.update(not_before=None)
+
+    def test_over_request_limit_defers_instead_of_failing(self):
+        self.create_backtest()
+        first = self.create_task("bt_test", llm_task_id="llm_a")
+        second = self.create_task("bt_test", llm_task_id="llm_b")
+
+        with self.limits(requests_per_minute=1):
+            self.assertEqual(process_next_task().llm_task_id, first.llm_task_id)
+            self.assertIsNone(process_next_task())
+
+            second.refresh_from_db()
+            self.assertEqual(second.status, JobStatus.PENDING)
+            wait = (second.not_before - timezone.now()).total_seconds()
+            self.assertGreater(wait, 50)
+            self.assertLessEqual(wait, 60)
+            # deferred tasks are not candidates until not_before
+            self.assertIsNone(process_next_task())
+
+            self.rewind_bucket(60)
+            self.assertEqual(process_next_task().llm_task_id, second.llm_task_id)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, JobStatus.SUCCEEDED)
+        self.assertIsNone(second.not_before)
+        usage = LLMUsage.objects.get(tenant_id=self.tenant_id, day=timezone.localdate())
+        self.assertEqual(usage.requests, 2)
+        self.assertEqual(usage.deferrals, 1)
+        self.assertGreater(usage.prompt_tokens, 0)
+        self.assertGreater(usage.completion_tokens, 0)
+
+    def test_token_bucket_settles_reservations_against_usage(self):
+        self.create_backtest()
+        self.create_task("bt_test", llm_task_id="llm_a")
+        self.create_task("bt_test", llm_task_id="llm_b")
+
+        with self.limits(tokens_per_minute=100, task_tokens=50):
+            process_next_task()
+            usage = LLMUsage.objects.get(tenant_id=self.tenant_id)
+            used = usage.prompt_tokens + usage.completion_tokens
+            self.assertGreater(used, 100)
+            # the prompt alone overdraws the bucket: next task waits for the debt to refill
+            self.assertAlmostEqual(LLMRateBucket.objects.get().tokens, 100 - used, places=3)
+            self.assertIsNone(process_next_task())
+            task = LLMTask.objects.get(llm_task_id="llm_b")
+            self.assertGreater((task.not_before - timezone.now()).total_seconds(), (used - 100) / 100 * 60 - 5)
+
+            self.rewind_bucket(3600)
+            process_next_task()
+        task.refresh_from_db()
+        self.assertEqual(task.status, JobStatus.SUCCEEDED)
+        # later reservations are the tenant's average so far
+        self.assertEqual(task.reserved_tokens, used)
+
+    def test_failed_task_returns_its_reservation(self):
+        self.create_backtest(status=BacktestStatus.CREATED)
+        self.create_task("bt_test")
+
+        with self.limits(tokens_per_minute=100, task_tokens=80):
+            with self.assertRaises(ValueError):
+                process_next_task()
+        self.assertAlmostEqual(LLMRateBucket.objects.get().tokens, 100, places=3)
+        self.assertEqual(LLMUsage.objects.get().requests, 1)
+
+    def test_daily_budget_defers_to_the_next_day(self):
+        self.create_backtest()
+        self.create_task("bt_test", llm_task_id="llm_a")
+        later = self.create_task("bt_test", llm_task_id="llm_b")
+
+        with self.limits(daily_tokens=1):
+            process_next_task()
+            self.assertIsNone(process_next_task())
+        later.refresh_from_db()
+        self.assertEqual(timezone.localtime(later.not_before).date(), timezone.localdate() + timedelta(days=1))
+        self.assertEqual(timezone.localtime(later.not_before).time(), dt_time.min)
+
+    def test_limited_tenant_does_not_hold_up_others(self):
+        self.create_backtest()
+        self.create_task("bt_test", llm_task_id="llm_a")
+        self.create_task("bt_test", llm_task_id="llm_b")
+        BacktestRun.objects.create(
+            backtest_run_id="bt_other",
+            tenant_id="tenant_other",
+            dataset_version=self.dataset_version,
+            strategy=self.strategy,
+            status=BacktestStatus.METRICS_DONE,
+        )
+        LLMTask.objects.create(
+            llm_task_id="llm_other",
+            tenant_id="tenant_other",
+            task_type=LLMTaskType.GENERATE_REPORT,
+            source_type=LLMSourceType.BACKTEST,
+            source_id="bt_other",
+        )
+
+        with self.limits(requests_per_minute=1):
+            done = [process_next_task(), process_next_task(), process_next_task()]
+        self.assertEqual(
+            sorted(t.llm_task_id for t in done if t), ["llm_a", "llm_other"],
+        )
+        self.assertEqual(LLMTask.objects.get(llm_task_id="llm_b").status, JobStatus.PENDING)
+
+
+class CountingAdapter(StubLLMAdapter):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        return super().generate(prompt)
+
+
+class LLMResponseCacheTests(LLMTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = settings.ARTIFACT_DIR / "llm_cache"
+
+    def test_identical_prompts_hit_the_cache(self):
+        self.create_backtest()
+        self.create_task("bt_test", llm_task_id="llm_a")
+        self.create_task("bt_test", llm_task_id="llm_b")
+        self.create_task("bt_test", task_type=LLMTaskType.DIAGNOSE_RESULT, llm_task_id="llm_c")
+        adapter, cache = CountingAdapter(), LLMResponseCache(self.cache_dir)
+
+        for _ in range(3):
+            process_next_task(adapter=adapter, cache=cache)
+
+        self.assertEqual(adapter.calls, 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertAlmostEqual(cache.stats()["hitRate"], 1 / 3)
+        a, b = (LLMTask.objects.get(llm_task_id=i) for i in ("llm_a", "llm_b"))
+        self.assertEqual(Path(a.output_uri).read_text(), Path(b.output_uri).read_text())
+
+    def test_template_version_is_part_of_the_key(self):
+        adapter, cache = CountingAdapter(), LLMResponseCache(self.cache_dir)
+        CachingLLMAdapter(adapter, cache, "v1").generate("prompt")
+        CachingLLMAdapter(adapter, cache, "v2").generate("prompt")
+        cached = CachingLLMAdapter(adapter, cache, "v1")
+        cached.generate("prompt")
+        self.assertEqual(adapter.calls, 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LLMResponseCache(self.cache_dir, max_bytes=10**6)
+        for key in ("aa1", "bb2", "cc3"):
+            cache.put(key, "x" * 300)
+        # aa1 used most recently, bb2 least
+        sizes = {}
+        for key, age in (("aa1", 0), ("bb2", 30), ("cc3", 20)):
+            path = self.cache_dir / key[:2] / f"{key}.json"
+            os.utime(path, (time.time() - age, time.time() - age))
+            sizes[key] = path.stat().st_size
+
+        cache.max_bytes = sizes["aa1"] + sizes["cc3"]
+        cache.evict()
+        self.assertIsNone(cache.get("bb2"))
+        self.assertEqual(cache.get("aa1"), "x" * 300)
+        self.assertEqual(cache.get("cc3"), "x" * 300)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["sizeBytes"], cache.max_bytes)
+
+    def test_expired_entries_are_dropped(self):
+        cache = LLMResponseCache(self.cache_dir, ttl_seconds=60)
+        cache.put("key", "text")
+        self.assertEqual(cache.get("key"), "text")
+        with mock.patch("llm.cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["expired"], 1)
+        self.assertFalse(list(self.cache_dir.glob("*/*.json")))
+
+
+class StubBatchAdapter(StubLLMAdapter):
+    """
+    Records each batch it is sent; prompts containing `fail_on` come back
+    as an error.
+    """
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def generate(self, prompt: str) -> str:
+        raise AssertionError("batched tasks must not be generated one by one")
+
+    def generate_batch(self, prompts):
+        self.batches.append(list(prompts))
+        return [
+            LLMProviderError(500, "boom") if self.fail_on and self.fail_on in p else StubLLMAdapter.generate(self, p)
+            for p in prompts
+        ]
+
+
+class LLMBatchTests(LLMTestBase):
+    def create_batch_tasks(self, n, **fields):
+        return [
+            LLMTask.objects.create(
+                llm_task_id=f"llm_batch_{i}",
+                tenant_id=self.tenant_id,
+                task_type=LLMTaskType.DIAGNOSE_RESULT if i % 2 else LLMTaskType.GENERATE_REPORT,
+                source_type=LLMSourceType.BACKTEST,
+                source_id="bt_test",
+                priority="BATCH",
+                **fields,
+            )
+            for i in range(n)
+        ]
+
+    def test_claim_batch_waits_for_size_or_window(self):
+        self.create_backtest()
+        interactive = self.create_task("bt_test")
+        self.create_batch_tasks(2)
+
+        self.assertEqual(claim_batch(max_size=3, window_seconds=60), [])
+        self.assertEqual(LLMTask.objects.filter(status=JobStatus.RUNNING).count(), 0)
+
+        self.assertEqual(len(claim_batch(max_size=2, window_seconds=60)), 2)
+        LLMTask.objects.filter(priority="BATCH").update(status=JobStatus.PENDING)
+
+        LLMTask.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        batch = claim_batch(max_size=3, window_seconds=60)
+        self.assertEqual(sorted(t.llm_task_id for t in batch), ["llm_batch_0", "llm_batch_1"])
+        interactive.refresh_from_db()
+        self.assertEqual(interactive.status, JobStatus.PENDING)
+
+    def test_batch_is_sent_once_and_fanned_out_to_reports(self):
+        self.create_backtest()
+        self.create_batch_tasks(3)
+        adapter = StubBatchAdapter()
+
+        outcomes = process_batch(claim_batch(max_size=3, window_seconds=0), adapter=adapter)
+
+        self.assertEqual([exc for _, exc in outcomes], [None] * 3)
+        self.assertEqual([len(b) for b in adapter.batches], [3])
+        for task, _ in outcomes:
+            task.refresh_from_db()
+            self.assertEqual(task.status, JobStatus.SUCCEEDED)
+            report = Report.objects.get(llm_task_id=task.llm_task_id)
+            diagnosis = task.task_type == LLMTaskType.DIAGNOSE_RESULT
+            title = "Backtest Result Diagnosis" if diagnosis else "Backtest Analysis Report"
+            self.assertIn(title, Path(report.uri).read_text(encoding="utf-8"))
+        self.assertEqual(LLMUsage.objects.get().requests, 3)
+
+    def test_failures_stay_with_their_task(self):
+        self.create_backtest()
+        self.create_batch_tasks(3)
+        # not a backtest of this tenant: its prompt cannot be built
+        LLMTask.objects.filter(llm_task_id="llm_batch_2").update(source_id="bt_missing")
+        adapter = StubBatchAdapter(fail_on="diagnos")
+
+        outcomes = dict((t.llm_task_id, exc) for t, exc in process_batch(claim_batch(3, 0), adapter=adapter))
+
+        self.assertIsNone(outcomes["llm_batch_0"])
+        self.assertIsInstance(outcomes["llm_batch_1"], LLMProviderError)
+        self.assertIsInstance(outcomes["llm_batch_2"], BacktestRun.DoesNotExist)
+        self.assertEqual([len(b) for b in adapter.batches], [2])
+        statuses = dict(LLMTask.objects.values_list("llm_task_id", "status"))
+        self.assertEqual(statuses, {
+            "llm_batch_0": JobStatus.SUCCEEDED,
+            "llm_batch_1": JobStatus.FAILED,
+            "llm_batch_2": JobStatus.FAILED,
+        })
+        self.assertIn("HTTP 500", LLMTask.objects.get(llm_task_id="llm_batch_1").error_message)
+
+    def test_cached_prompts_are_left_out_of_the_batch(self):
+        self.create_backtest()
+        cache = LLMResponseCache(settings.ARTIFACT_DIR / "llm_cache", max_bytes=10 * 1024 * 1024)
+        self.create_batch_tasks(2)
+        adapter = StubBatchAdapter()
+        process_batch(claim_batch(2, 0), adapter=adapter, cache=cache)
+
+        LLMTask.objects.all().delete()
+        self.create_batch_tasks(3)
+        outcomes = process_batch(claim_batch(3, 0), adapter=adapter, cache=cache)
+
+        self.assertEqual([exc for _, exc in outcomes], [None] * 3)
+        # same backtest and task types as before: every prompt is a cache hit
+        self.assertEqual([len(b) for b in adapter.batches], [2])
+
+    def test_adapters_without_a_batch_interface_generate_one_by_one(self):
+        class OneByOne:
+            def generate(self, prompt):
+                if prompt == "bad":
+                    raise ValueError("bad prompt")
+                return prompt.upper()
+
+        results = generate_batch(OneByOne(), ["a", "bad", "c"])
+        self.assertEqual(results[0::2], ["A", "C"])
+        self.assertIsInstance(results[1], ValueError)
+
+
+class ChunkedAdapter(StubLLMAdapter):
+    """
+    Streams fixed chunks and records what the report artifact held each
+    time the worker asked for the next one.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.seen = []
+
+    def stream(self, prompt):
+        for chunk in self.chunks:
+            task = LLMTask.objects.get(llm_task_id="llm_test")
+            self.seen.append((task.status, Path(task.output_uri).read_text(encoding="utf-8")))
+            yield chunk
+
+
+def parse_events(response):
+    events = []
+    for block in b"".join(response.streaming_content).decode("utf-8").split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+class LLMStreamingTests(LLMTestBase):
+    def test_worker_appends_chunks_to_the_report_as_they_arrive(self):
+        self.create_backtest()
+        task = self.create_task("bt_test")
+        adapter = ChunkedAdapter(["# Title\n", "first line\n", "second line\n"])
+
+        process_next_task(adapter=adapter)
+
+        self.assertEqual(
+            adapter.seen,
+            [
+                (JobStatus.RUNNING, ""),
+                (JobStatus.RUNNING, "# Title\n"),
+                (JobStatus.RUNNING, "# Title\nfirst line\n"),
+            ],
+        )
+        task.refresh_from_db()
+        self.assertEqual(task.status, JobStatus.SUCCEEDED)
+        self.assertEqual(Path(task.output_uri).read_text(encoding="utf-8"), "# Title\nfirst line\nsecond line\n")
+        self.assertEqual(Report.objects.get(llm_task_id=task.llm_task_id).uri, task.output_uri)
+
+    def running_task_with_report(self, text):
+        task = self.create_task("bt_test")
+        path = settings.ARTIFACT_DIR / "reports" / f"{task.llm_task_id}_report.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        task.status = JobStatus.RUNNING
+        task.output_uri = str(path)
+        task.save()
+        return task, path
+
+    def test_stream_endpoint_follows_the_report_until_done(self):
+        task, path = self.running_task_with_report("# Part é")
+
+        def worker_progress(_):
+            with path.open("a", encoding="utf-8") as f:
+                f.write(" two")
+            LLMTask.objects.filter(pk=task.pk).update(status=JobStatus.SUCCEEDED)
+
+        # the response is lazy: the events are produced while it is read
+        with mock.patch("llm.streaming.time.sleep", side_effect=worker_progress):
+            response = self.client.get(f"/api/v1/llm/tasks/{task.llm_task_id}/stream", HTTP_ACCEPT="text/event-stream")
+            events = parse_events(response)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        full = len("# Part é two".encode("utf-8"))
+        self.assertEqual(
+            events,
+            [
+                ("chunk", str(full - 4), {"text": "# Part é"}),
+                ("chunk", str(full), {"text": " two"}),
+                ("done", str(full), {"status": "SUCCEEDED"}),
+            ],
+        )
+
+    def test_stream_endpoint_resumes_from_last_event_id(self):
+        task, path = self.running_task_with_report("# Title\nbody\n")
+        LLMTask.objects.filter(pk=task.pk).update(status=JobStatus.SUCCEEDED)
+
+        response = self.client.get(f"/api/v1/llm/tasks/{task.llm_task_id}/stream", HTTP_LAST_EVENT_ID="8")
+
+        self.assertEqual(
+            parse_events(response),
+            [("chunk", "13", {"text": "body\n"}), ("done", "13", {"status": "SUCCEEDED"})],
+        )
+
+    def test_stream_endpoint_reports_failure(self):
+        task, _ = self.running_task_with_report("# Half")
+        LLMTask.objects.filter(pk=task.pk).update(status=JobStatus.FAILED, error_message="RuntimeError: boom")
+
+        response = self.client.get(f"/api/v1/llm/tasks/{task.llm_task_id}/stream")
+
+        events = parse_events(response)
+        self.assertEqual(events[0], ("chunk", "6", {"text": "# Half"}))
+        self.assertEqual(events[-1][0], "error")
+        self.assertEqual(events[-1][2]["detail"], "RuntimeError: boom")
+
+    def test_stream_endpoint_rejects_bad_offset_and_unknown_task(self):
+        task, _ = self.running_task_with_report("")
+        bad = self.client.get(f"/api/v1/llm/tasks/{task.llm_task_id}/stream?offset=-1")
+        self.assertEqual(bad.status_code, 400)
+        missing = self.client.get("/api/v1/llm/tasks/llm_nope/stream", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(missing.status_code, 404)
+
+    async def asgi_stream(self, task, disconnect_after=None):
+        """
+        Requests the stream through the ASGI handler. With disconnect_after
+        the client hangs up once it has that many body messages. Returns
+        the body messages received.
+        """
+        bodies = []
+        hang_up = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await hang_up.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                bodies.append(message["body"])
+                if disconnect_after is not None and len(bodies) >= disconnect_after:
+                    hang_up.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/api/v1/llm/tasks/{task.llm_task_id}/stream",
+            "query_string": b"",
+            "headers": [(b"authorization", b"Bearer demo-key-1"), (b"host", b"testserver")],
+            "server": ("testserver", 80),
+        }
+        # as the test client does: keep the test transaction's connection open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            await asyncio.wait_for(ASGIHandler()(scope, receive, send), timeout=10)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        return bodies
+
+    async def test_asgi_stream_sends_the_report_then_done(self):
+        task, _ = await sync_to_async(self.running_task_with_report)("# Title\n")
+        await sync_to_async(LLMTask.objects.filter(pk=task.pk).update)(status=JobStatus.SUCCEEDED)
+
+        bodies = await self.asgi_stream(task)
+
+        self.assertEqual(
+            bodies,
+            [
+                b'event: chunk\nid: 8\ndata: {"text": "# Title\\n"}\n\n',
+                b'event: done\nid: 8\ndata: {"status": "SUCCEEDED"}\n\n',
+            ],
+        )
+
+    @override_settings(LLM_STREAM_POLL_SECONDS=0.01)
+    async def test_asgi_stream_stops_when_the_client_disconnects(self):
+        task, _ = await sync_to_async(self.running_task_with_report)("# Half")
+
+        with mock.patch.object(ReportCursor, "poll", autospec=True, side_effect=ReportCursor.poll) as poll:
+            bodies = await self.asgi_stream(task, disconnect_after=1)
+            polls = poll.call_count
+            await asyncio.sleep(0.1)
+
+            # the task never finishes; the stream ended with the client
+            self.assertEqual(poll.call_count, polls)
+        self.assertEqual(bodies, [b'event: chunk\nid: 6\ndata: {"text": "# Half"}\n\n'])
+
+
+class FakeCompletionServer:
+    """
+    Local stand-in for an OpenAI-compatible endpoint: answers
+    POST /v1/chat/completions after `latency` seconds and records the peak
+    number of requests it was serving at once. Streamed requests get the
+    answer as server-sent events, one line per event, `chunk_delay` apart.
+    Requests are answered with the `statuses` script in order, then with
+    `status`. Connections are kept alive except after a stream.
+    """
+
+    def __init__(self, latency=0.3, status=200, chunk_delay=0.0, statuses=(), retry_after=None):
+        self.latency = latency
+        self.status = status
+        self.statuses = list(statuses)
+        self.retry_after = retry_after
+        self.chunk_delay = chunk_delay
+        self.active = 0
+        self.peak = 0
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests += 1
+                    fake.active += 1
+                    fake.peak = max(fake.peak, fake.active)
+                    status = fake.statuses.pop(0) if fake.statuses else fake.status
+                try:
+                    time.sleep(fake.latency)
+                    content = f"# Report\n\n{len(body['messages'][0]['content'])}"
+                    if status == 200 and body.get("stream"):
+                        self.send_events(content.splitlines(keepends=True))
+                        return
+                finally:
+                    with fake.lock:
+                        fake.active -= 1
+                if status != 200:
+                    payload = b'{"error": "overloaded"}'
+                else:
+                    payload = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429 and fake.retry_after is not None:
+                    self.send_header("Retry-After", str(fake.retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_events(self, chunks):
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in chunks:
+                    event = {"choices": [{"delta": {"content": chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(fake.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        # clients that hit their deadline hang up mid-response
+        self.server.handle_error = lambda request, client_address: None
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(ARTIFACT_DIR=settings.BASE_DIR / "test_artifacts")
+class ConcurrentLLMWorkerTests(LLMFixtures, TransactionTestCase):
+    # the worker's DB calls run on another thread, so rows must be committed
+
+    def test_http_adapter_sync_and_async(self):
+        with FakeCompletionServer(latency=0) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model")
+            self.assertEqual(adapter.generate("abc"), "# Report\n\n3")
+            self.assertEqual(asyncio.run(adapter.agenerate("abcd")), "# Report\n\n4")
+
+    def test_http_adapter_raises_on_error_status(self):
+        with FakeCompletionServer(latency=0, status=503) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model")
+            with self.assertRaises(LLMProviderError) as ctx:
+                asyncio.run(adapter.agenerate("abc"))
+            self.assertEqual(ctx.exception.status, 503)
+
+    def test_generations_overlap_up_to_the_concurrency_limit(self):
+        self.create_backtest()
+        for i in range(6):
+            self.create_task("bt_test", llm_task_id=f"llm_{i}")
+
+        with FakeCompletionServer(latency=0.3) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model")
+            started = time.monotonic()
+            finished = asyncio.run(serve_concurrently(adapter=adapter, concurrency=3, idle_exit=True))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(finished, 6)
+        self.assertEqual(server.requests, 6)
+        self.assertEqual(server.peak, 3)
+        # sequential would take 6 x 0.3s
+        self.assertLess(elapsed, 1.5)
+        for task in LLMTask.objects.all():
+            self.assertEqual(task.status, JobStatus.SUCCEEDED)
+            self.assertEqual(task.model_name, "fake-model")
+            self.assertTrue(Path(task.output_uri).read_text().startswith("# Report"))
+        self.assertEqual(Report.objects.count(), 6)
+
+    def test_failed_generation_marks_only_its_task(self):
+        self.create_backtest()
+        self.create_task("bt_test", llm_task_id="llm_ok")
+        self.create_task("bt_missing", llm_task_id="llm_bad")
+        outcomes = {}
+
+        with FakeCompletionServer(latency=0.05) as server:
+            asyncio.run(
+                serve_concurrently(
+                    adapter=HTTPLLMAdapter(server.base_url, "fake-model"),
+                    concurrency=2,
+                    idle_exit=True,
+                    on_done=lambda task, exc: outcomes.setdefault(task.llm_task_id, exc),
+                )
+            )
+
+        self.assertIsNone(outcomes["llm_ok"])
+        self.assertIsNotNone(outcomes["llm_bad"])
+        self.assertEqual(LLMTask.objects.get(llm_task_id="llm_ok").status, JobStatus.SUCCEEDED)
+        bad = LLMTask.objects.get(llm_task_id="llm_bad")
+        self.assertEqual(bad.status, JobStatus.FAILED)
+        self.assertIn("DoesNotExist", bad.error_message)
+
+    def test_http_stream_delivers_the_first_chunk_early(self):
+        with FakeCompletionServer(latency=0, chunk_delay=0.3) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model")
+
+            async def consume():
+                started = time.monotonic()
+                arrivals = []
+                async for chunk in adapter.astream("abc"):
+                    arrivals.append((time.monotonic() - started, chunk))
+                return arrivals
+
+            arrivals = asyncio.run(consume())
+            self.assertEqual("".join(adapter.stream("abc")), "# Report\n\n3")
+
+        self.assertEqual("".join(chunk for _, chunk in arrivals), "# Report\n\n3")
+        self.assertEqual(len(arrivals), 3)
+        self.assertLess(arrivals[0][0], 0.2)
+        self.assertGreater(arrivals[-1][0], 0.5)
+
+
+FAST_RETRY = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+
+
+class HTTPLLMAdapterTests(SimpleTestCase):
+    def test_connections_are_kept_alive_and_reused(self):
+        with FakeCompletionServer(latency=0) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model")
+            for _ in range(3):
+                self.assertEqual(adapter.generate("abc"), "# Report\n\n3")
+            self.assertEqual(server.connections, 1)
+
+            async def three():
+                return [await adapter.agenerate("abcd") for _ in range(3)]
+
+            # the async calls run on threads over the same pool
+            self.assertEqual(asyncio.run(three()), ["# Report\n\n4"] * 3)
+            self.assertEqual(server.connections, 1)
+
+    def test_batch_is_sent_concurrently_over_the_pool(self):
+        with FakeCompletionServer(latency=0.2) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model", pool_size=4)
+            results = adapter.generate_batch(["a", "ab", "abc", "abcd"])
+            self.assertEqual(results, [f"# Report\n\n{n}" for n in range(1, 5)])
+            self.assertGreater(server.peak, 1)
+
+    def test_a_dropped_idle_connection_is_replaced(self):
+        with FakeCompletionServer(latency=0) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model", breaker=CircuitBreaker(failure_threshold=1))
+            adapter.generate("abc")
+            # the server closes the idle keep-alive socket
+            adapter.pool._idle[0].sock.shutdown(socket.SHUT_RDWR)
+            self.assertEqual(adapter.generate("abc"), "# Report\n\n3")
+            self.assertEqual(adapter.breaker.state, "closed")
+
+    def test_retries_429_and_5xx_with_backoff(self):
+        for call in (lambda a: a.generate("abc"), lambda a: asyncio.run(a.agenerate("abc"))):
+            with FakeCompletionServer(latency=0, statuses=[503, 429]) as server:
+                adapter = HTTPLLMAdapter(server.base_url, "fake-model", retry=FAST_RETRY)
+                self.assertEqual(call(adapter), "# Report\n\n3")
+                self.assertEqual(server.requests, 3)
+
+    def test_client_errors_are_not_retried(self):
+        with FakeCompletionServer(latency=0, status=400) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model", retry=FAST_RETRY)
+            with self.assertRaises(LLMProviderError) as ctx:
+                adapter.generate("abc")
+            self.assertEqual(ctx.exception.status, 400)
+            self.assertEqual(server.requests, 1)
+            self.assertEqual(adapter.breaker.state, "closed")
+
+    def test_retry_after_beyond_the_deadline_gives_up_at_once(self):
+        with FakeCompletionServer(latency=0, status=429, retry_after=30) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model", timeout=2.0, retry=FAST_RETRY)
+            started = time.monotonic()
+            with self.assertRaises(LLMProviderError) as ctx:
+                adapter.generate("abc")
+            self.assertEqual(ctx.exception.retry_after, 30.0)
+            self.assertEqual(server.requests, 1)
+            self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_deadline_bounds_a_slow_provider(self):
+        for call in (lambda a: a.generate("abc"), lambda a: asyncio.run(a.agenerate("abc"))):
+            with FakeCompletionServer(latency=0.6) as server:
+                adapter = HTTPLLMAdapter(server.base_url, "fake-model", timeout=0.2, retry=FAST_RETRY)
+                started = time.monotonic()
+                with self.assertRaises(TimeoutError):
+                    call(adapter)
+                self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_circuit_opens_fails_fast_and_recovers_after_a_probe(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+        with FakeCompletionServer(latency=0, statuses=[500, 500]) as server:
+            adapter = HTTPLLMAdapter(
+                server.base_url, "fake-model", retry=RetryPolicy(max_attempts=1), breaker=breaker
+            )
+            for _ in range(2):
+                with self.assertRaises(LLMProviderError):
+                    adapter.generate("abc")
+            self.assertEqual(breaker.state, "open")
+
+            with self.assertRaises(CircuitOpenError):
+                adapter.generate("abc")
+            with self.assertRaises(CircuitOpenError):
+                asyncio.run(adapter.agenerate("abc"))
+            self.assertEqual(server.requests, 2)
+
+            now[0] = 11.0
+            self.assertEqual(breaker.state, "half_open")
+            self.assertEqual(adapter.generate("abc"), "# Report\n\n3")
+            self.assertEqual(breaker.state, "closed")
+            self.assertEqual(server.requests, 3)
+
+    def test_a_failed_probe_reopens_the_circuit(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 10.0
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        now[0] = 15.0
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_an_interrupted_probe_hands_the_probe_back(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 11.0
+        with FakeCompletionServer(latency=0) as server:
+            adapter = HTTPLLMAdapter(server.base_url, "fake-model", breaker=breaker)
+            with mock.patch.object(adapter, "_attempt", side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    adapter.generate("abc")
+            self.assertEqual(breaker.state, "half_open")
+            self.assertEqual(adapter.generate("abc"), "# Report\n\n3")
+            self.assertEqual(breaker.state, "closed")
@@ -0,0 +1,147 @@
+import http.client
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    multiplier: float = 2.0
+
+    def delay(self, attempt: int, rng: Optional[random.Random] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (1-based): exponential
+        backoff capped at max_delay, with equal jitter.
+        """
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return ceiling / 2 + (rng or random).uniform(0, ceiling / 2)
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, retry_in: Optional[float]):
+        detail = f", retry in {retry_in:.1f}s" if retry_in else ""
+        super().__init__(f"provider circuit is open{detail}")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a provider is down. failure_threshold
+    consecutive failures open the circuit; for reset_seconds every call
+    raises CircuitOpenError without touching the network. After that one
+    probe call is let through (half open): success closes the circuit,
+    failure opens it again. Thread-safe; share one per provider.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or self.clock() - self._opened_at < self.reset_seconds:
+                return "open"
+            return "half_open"
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError while the circuit is open. True when this
+        call is the half-open probe.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            waited = self.clock() - self._opened_at
+            if waited < self.reset_seconds:
+                raise CircuitOpenError(self.reset_seconds - waited)
+            if self._probing:
+                raise CircuitOpenError(None)
+            self._probing = True
+            return True
+
+    def release_probe(self) -> None:
+        """
+        Ends a probe that was interrupted before the provider answered
+        (cancelled, interrupted, a bug): it says nothing about the
+        provider, so the next call probes again.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+                self._probing = False
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive http.client connections to one host. acquire() hands
+    out an idle one (or opens a new one) with its socket timeout set;
+    release() keeps it for reuse if the response was fully read and the
+    server did not ask to close, up to max_idle connections.
+    """
+
+    def __init__(self, host: str, port: int, https: bool = False, max_idle: int = 4):
+        self.host = host
+        self.port = port
+        self.https = https
+        self.max_idle = max_idle
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float, fresh: bool = False) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        (connection, reused).
+        """
+        conn = None
+        if not fresh:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return conn_cls(self.host, self.port, timeout=timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import LLMTaskDetailView, LLMTaskListCreateView, LLMTaskResultView
+from .views import LLMTaskDetailView, LLMTaskListCreateView, LLMTaskResultView, LLMTaskStreamView
 
 
 urlpatterns = [
     path("tasks", LLMTaskListCreateView.as_view()),
     path("tasks/<str:llm_task_id>", LLMTaskDetailView.as_view()),
     path("tasks/<str:llm_task_id>/result", LLMTaskResultView.as_view()),
+    path("tasks/<str:llm_task_id>/stream", LLMTaskStreamView.as_view()),
 ]
@@ -1,15 +1,23 @@
+import json
 from pathlib import Path
 
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from forecasting.models import BacktestRun, BacktestStatus
+from forecasting.models import BacktestRun, BacktestStatus, JobPriority
 from .models import LLMTask, Report, JobStatus
+from .pregeneration import backtest_input_refs, find_pregenerated
+from .prompt_builder import get_template
 from .serializers import (
     LLMTaskCreateSerializer,
     LLMTaskCreateResponseSerializer,
 )
+from .streaming import areport_events, report_events
 
 
 class LLMTaskListCreateView(APIView):
@@ -23,6 +31,11 @@ class LLMTaskListCreateView(APIView):
         source_type = data["sourceType"]
         source_id = data["sourceId"]
 
+        try:
+            get_template(data["taskType"], data["promptTemplateVersion"])
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         if source_type != "BACKTEST":
             return Response(
                 {"detail": "Only sourceType=BACKTEST is supported"},
@@ -45,19 +58,31 @@ class LLMTaskListCreateView(APIView):
                 status=status.HTTP_409_CONFLICT,
             )
 
+        # usually already generated when the backtest finished
+        task = find_pregenerated(
+            tenant_id, source_type, source_id, data["taskType"], data["promptTemplateVersion"]
+        )
+        if task:
+            if task.status == JobStatus.PENDING and data["priority"] == JobPriority.INTERACTIVE:
+                task.priority = JobPriority.INTERACTIVE
+                task.save(update_fields=["priority"])
+            return Response(
+                LLMTaskCreateResponseSerializer(
+                    {"llmTaskId": task.llm_task_id, "status": task.status}
+                ).data,
+                status=status.HTTP_200_OK,
+            )
+
         task = LLMTask.objects.create(
             llm_task_id=LLMTask.new_task_id(),
             tenant_id=tenant_id,
             task_type=data["taskType"],
             source_type=source_type,
             source_id=source_id,
-            prompt_template_version=data.get("promptTemplateVersion", "v1"),
+            prompt_template_version=data["promptTemplateVersion"],
+            priority=data["priority"],
             status=JobStatus.PENDING,
-            input_refs_json={
-                "backtestRunId": backtest.backtest_run_id,
-                "datasetVersionId": backtest.dataset_version.dataset_version_id,
-                "strategyId": backtest.strategy.strategy_id,
-            },
+            input_refs_json=backtest_input_refs(backtest),
         )
 
         return Response(
@@ -84,6 +109,7 @@ class LLMTaskDetailView(APIView):
             "modelName": task.model_name,
             "outputUri": task.output_uri,
             "errorMessage": task.error_message,
+            "notBefore": task.not_before,
             "createdAt": task.created_at,
             "startedAt": task.started_at,
             "finishedAt": task.finished_at,
@@ -113,3 +139,41 @@ class LLMTaskResultView(APIView):
             "format": "MARKDOWN",
             "content": content,
         })
+
+
+class EventStreamRenderer(BaseRenderer):
+    # lets clients send Accept: text/event-stream; only error bodies are
+    # rendered here, the stream itself bypasses rendering
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode("utf-8")
+
+
+class LLMTaskStreamView(APIView):
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, llm_task_id: str):
+        tenant_id = request.user.tenant_id
+        task = LLMTask.objects.filter(tenant_id=tenant_id, llm_task_id=llm_task_id).first()
+        if not task:
+            return Response({"detail": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = int(request.headers.get("Last-Event-ID") or request.query_params.get("offset") or 0)
+            if offset < 0:
+                raise ValueError
+        except ValueError:
+            return Response({"detail": "offset must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # under ASGI the stream waits on the event loop; a WSGI thread is
+        # held for as long as the stream is open, so those end sooner
+        if isinstance(request._request, ASGIRequest):
+            events = areport_events(task.pk, offset)
+        else:
+            events = report_events(task.pk, offset, settings.LLM_STREAM_WSGI_MAX_SECONDS)
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
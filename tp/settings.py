@@ -50,6 +50,88 @@ DEMO_API_KEYS = {
 ARTIFACT_DIR = BASE_DIR /"artifacts"
 ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
 
+# downsampled equity curves (?points= / ?from= / ?to= on result endpoints)
+EQUITY_CURVE_CACHE_SECONDS = 3600
+
+# backtests:sweep
+SWEEP_MAX_VARIANTS = 5000
+SWEEP_MAX_WORKERS = None  # process pool size, None = os.cpu_count()
+
+# backtests:compare
+BACKTEST_COMPARE_MAX_RUNS = 20
+
+# digest of a backtest for LLM prompts, cached per run and artifact
+BACKTEST_DIGEST_CACHE_SECONDS = 24 * 3600
+
+# backtest stage retries (services.retry.RetryPolicy fields), keyed by BacktestStage
+BACKTEST_RETRY_POLICIES = {
+    "default": {"max_attempts": 3, "base_delay": 2.0, "max_delay": 60.0},
+    "FORECAST": {"max_attempts": 5, "base_delay": 5.0, "max_delay": 300.0},
+}
+
+# services.scheduler: weighted fair queuing across tenants on every worker queue.
+# weight = share of dispatches; max_running = in-flight cap, a number or
+# {queue name: number} ("forecast", "backtest", "llm", ...), None = unlimited
+TENANT_SCHEDULING = {
+    "default": {"weight": 1, "max_running": None},
+}
+
+# BacktestRun mode=WALK_FORWARD
+WALK_FORWARD_MAX_WORKERS = None  # folds in parallel, None = os.cpu_count()
+
+# llm worker: on-disk LRU cache of generated texts, None disables it
+LLM_RESPONSE_CACHE = {
+    "dir": ARTIFACT_DIR / "llm_cache",
+    "max_bytes": 256 * 1024 * 1024,
+    "ttl_seconds": 7 * 24 * 3600,
+}
+
+# llm worker: generations in flight at once, above 1 runs the asyncio loop
+LLM_WORKER_CONCURRENCY = 1
+
+# llm worker: BATCH priority tasks go to the provider's batch interface in
+# batches of up to max_size, sent once that many are pending or the oldest
+# has waited window_seconds (sync loop only); max_size 1 = one by one
+LLM_WORKER_BATCH = {"max_size": 1, "window_seconds": 30.0}
+
+# llm prompts: estimated prompt tokens allowed per model name, "default"
+# for the rest; context is trimmed to fit
+LLM_PROMPT_TOKEN_BUDGETS = {
+    "default": 8000,
+}
+
+# llm worker: OpenAI-compatible HTTP provider (run_llm_worker --base-url);
+# timeout is each call's deadline, retries included
+LLM_HTTP_ADAPTER = {
+    "timeout": 60.0,
+    "pool_size": 8,
+    "retry": {"max_attempts": 4, "base_delay": 0.5, "max_delay": 8.0},
+    "breaker": {"failure_threshold": 5, "reset_seconds": 30.0},
+}
+
+# llm worker: per-tenant token buckets, checked when a task is claimed; a
+# tenant over its limits has the task deferred (not_before), not failed.
+# requests_per_minute / tokens_per_minute are refill rates (a bucket holds
+# one minute's worth), daily_tokens caps LLMUsage per day, task_tokens is
+# the estimate reserved per task until the tenant has usage; None = unlimited
+LLM_RATE_LIMITS = {
+    "default": {"requests_per_minute": None, "tokens_per_minute": None, "daily_tokens": None, "task_tokens": 2000},
+}
+
+# backtest worker: LLM tasks queued at BATCH priority as soon as a backtest
+# has metrics, per tenant over "default"; a later request for the same
+# (source, task type, template) gets that task. task_types [] = opted out
+LLM_PREGENERATE = {
+    "default": {"task_types": [], "prompt_template_version": "v1"},
+}
+
+# llm task stream endpoint: how often it polls the report artifact, and how
+# long one response follows it before the client has to reconnect. Under
+# WSGI each open stream holds a worker thread, so it is cut much sooner
+LLM_STREAM_POLL_SECONDS = 0.25
+LLM_STREAM_MAX_SECONDS = 300
+LLM_STREAM_WSGI_MAX_SECONDS = 30
+
 REST_FRAMEWORK = {
 "DEFAULT_AUTHENTICATION_CLASSES": [
 "forecasting.auth.ApiKeyAuthentication",